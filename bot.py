@@ -14,9 +14,6 @@ import threading
 from fastapi import FastAPI
 import uvicorn
 
-import pickledb
-import pymongo
-
 import discord
 from discord import Webhook
 from discord.ext import commands, tasks
@@ -25,7 +22,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import utils
-from utils import CONSTANTS, CachedDB, ErrorLogger
+from utils import CONSTANTS, CachedDB, DBClient, ErrorLogger, GuildFeatures, IndexManager, KVStore
 
 if not os.path.isfile(f"{os.path.realpath(os.path.dirname(__file__))}/config.json"):
     sys.exit("'config.json' not found! Please add it and try again.")
@@ -37,12 +34,11 @@ intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
-client = pymongo.MongoClient(os.getenv("MONGODB_URL"))
-db = client.potatobot
+db = DBClient.db
 
 os.makedirs("pickle", exist_ok=True)
-prefixDB = pickledb.load("pickle/prefix.db", False)
-statsDB = pickledb.load("pickle/stats.db", False)
+prefixDB = KVStore.KVStore("pickle/prefix.sqlite", legacy_path="pickle/prefix.db")
+statsDB = KVStore.KVStore("pickle/stats.sqlite", legacy_path="pickle/stats.db")
 
 class LoggingFormatter(logging.Formatter):
     black = "\x1b[30m"
@@ -101,11 +97,7 @@ class DiscordBot(commands.AutoShardedBot):
         self.statsDB = statsDB
 
     async def get_prefix(self, message):
-        guild_id = str(message.guild.id)
-        if prefixDB.exists(guild_id):
-            return prefixDB.get(guild_id)
-        else:
-            return config["prefix"]
+        return prefixDB.get(str(message.guild.id), config["prefix"])
 
     async def load_cogs(self) -> None:
         for file in os.listdir(f"{os.path.realpath(os.path.dirname(__file__))}/cogs"):
@@ -129,6 +121,14 @@ class DiscordBot(commands.AutoShardedBot):
     async def before_status_task(self) -> None:
         await self.wait_until_ready()
 
+    @tasks.loop(seconds=30)
+    async def flush_stores(self) -> None:
+        await KVStore.flush_all()
+
+    async def close(self) -> None:
+        await super().close()
+        await KVStore.flush_all()
+
 
     async def setup_hook(self) -> None:
         self.logger.info(f"Logged in as {self.user.name}")
@@ -140,7 +140,11 @@ class DiscordBot(commands.AutoShardedBot):
 
         self.logger.info("-------------------")
 
-        self.logger.info(f"Connection to db successful: {client.address}")
+        await DBClient.client.admin.command("ping")
+        self.logger.info(f"Connection to db successful: {DBClient.client.address}")
+
+        await IndexManager.ensure_indexes(DBClient.db)
+        await GuildFeatures.load_all()
 
         self.logger.info("-------------------")
 
@@ -165,6 +169,7 @@ class DiscordBot(commands.AutoShardedBot):
         self.logger.info("-------------------")
 
         self.status_task.start()
+        self.flush_stores.start()
 
     async def on_guild_remove(self, guild: discord.Guild):
         async with aiohttp.ClientSession() as session:
@@ -244,9 +249,7 @@ class DiscordBot(commands.AutoShardedBot):
                 f"Executed {executed_command} command by {context.author} (ID: {context.author.id}) in DMs"
             )
 
-        commands_ran = (statsDB.get("commands_ran") if statsDB.exists("commands_ran") else 0) + 1
-        statsDB.set("commands_ran", commands_ran)
-        statsDB.dump()
+        statsDB.incr("commands_ran")
 
     async def on_command_error(self, context: commands.Context, error) -> None:
         if isinstance(error, commands.CommandOnCooldown):
@@ -1,8 +1,5 @@
 # This project is licensed under the terms of the GPL v3.0 license. Copyright 2024 Cyteon
 
-FILTER_LIST = ["@everyone", "@here", "<@&", "discord.gg", "discord.com/invite", "ERROR_404_LOVE_FOUND"]
-WORD_BLACKLIST = ["Nigger", "Nigga"]
-
 import discord
 import requests
 import os
@@ -20,15 +17,14 @@ import logging
 import json
 
 from io import BytesIO
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
-from better_profanity import profanity
 from groq import Groq
 
 from discord import app_commands, Webhook
-from discord.ext import commands, tasks
+from discord.ext import commands
 from discord.ext.commands import Context
-from utils import CONSTANTS, DBClient, Checks, CachedDB
+from utils import CONSTANTS, DBClient, Checks, CachedDB, EventContext, MessageScanner
 
 from cryptography.fernet import Fernet
 
@@ -56,21 +52,8 @@ secret_key = os.getenv('FUSION_SECRET_KEY')
 
 ai_temp_disabled = False
 
-ai_channels = []
-c = db["ai_channels"]
-data = c.find_one({ "listOfChannels": True })
-logger.info("Initing AI channels")
-
-if data:
-    ai_channels = data["ai_channels"]
-    logger.info("AI Channels data Found")
-else:
-    logger.info("Creating AI Channels data")
-    data = {
-    	"listOfChannels": True,
-         "ai_channels": []
-    }
-    c.insert_one(data)
+# A set for the per-message membership check, stored as a list
+ai_channels = set()
 
 last_api_key = 1
 total_api_keys = os.getenv("GROQ_API_KEY_COUNT")
@@ -86,6 +69,10 @@ def get_api_key():
 
     return os.getenv("GROQ_API_KEY_" + str(last_api_key))
 
+def conversation_expiry():
+    # A date so the TTL index on ai_convos.expiresAt can drop the conversation
+    return datetime.now(timezone.utc) + timedelta(days=7)
+
 def prompt_ai(
         prompt="Hello",
         authorId = 0,
@@ -94,7 +81,7 @@ def prompt_ai(
         groq_client=Groq(api_key=get_api_key()),
         systemPrompt="none"
     ):
-    c = db["ai_convos"]
+    c = DBClient.sync_db["ai_convos"]
     data = {}
 
     messageArray = []
@@ -105,7 +92,7 @@ def prompt_ai(
         if data:
             messageArray = data["messageArray"]
         else:
-            data = { "isChannel": True, "id": channelId, "messageArray": [], "expiresAt": time.time()+604800 }
+            data = { "isChannel": True, "id": channelId, "messageArray": [], "expiresAt": conversation_expiry() }
 
             c.insert_one(data)
     elif authorId != 0:
@@ -114,7 +101,7 @@ def prompt_ai(
         if data:
             messageArray = data["messageArray"]
         else:
-            data = { "isChannel": False, "id": authorId, "messageArray": [], "expiresAt": time.time()+604800 }
+            data = { "isChannel": False, "id": authorId, "messageArray": [], "expiresAt": conversation_expiry() }
 
             c.insert_one(data)
 
@@ -185,7 +172,7 @@ def prompt_ai(
         }
     else:
         newdata = {
-                "$set": { "messageArray": messageArray, "expiresAt": time.time()+604800  }
+                "$set": { "messageArray": messageArray, "expiresAt": conversation_expiry()  }
         }
 
     if channelId != 0:
@@ -199,16 +186,19 @@ def prompt_ai(
 
     ai_response = ai_response.replace("</s>", " ") # It kept sending this somtimes
 
-    for word in WORD_BLACKLIST:
-        if word.lower() in ai_response.lower():
-            logger.error(f"AI Response contains blacklisted word: {word}")
+    matches = MessageScanner.find(ai_response)
+
+    for category, start, end in matches:
+        if category == MessageScanner.BLACKLIST:
+            logger.error(f"AI Response contains blacklisted word: {ai_response[start:end]}")
             return "The AIs response has been identified as containing blacklisted words, we are sorry for this inconvenience"
 
-    for word in FILTER_LIST:
-        if word == "discord.gg":
-            if systemInfo["support_server"] in ai_response:
-                continue
-        ai_response =  ai_response.replace(word, "[FILTERED]")
+    allow_invites = systemInfo["support_server"] in ai_response
+
+    ai_response = MessageScanner.replace(ai_response, [
+        (start, end) for category, start, end in matches
+        if category == MessageScanner.FILTER and not (allow_invites and ai_response[start:end].lower() == "discord.gg")
+    ], "[FILTERED]")
 
     return ai_response
 
@@ -259,13 +249,30 @@ class Text2ImageAPI:
 class Ai(commands.Cog, name="🤖 AI"):
     def __init__(self, bot) -> None:
         self.bot = bot
-        self.purge_conversations.start()
         self.ai_temp_disabled = False
         self.get_prefix = bot.get_prefix
         self.statsDB = bot.statsDB
         self.cooldown = commands.CooldownMapping.from_cooldown(5, 10, commands.BucketType.user)
         self.too_many_violations = commands.CooldownMapping.from_cooldown(3, 10, commands.BucketType.user)
 
+    async def cog_load(self) -> None:
+        global ai_channels
+
+        c = db["ai_channels"]
+        data = await c.find_one({ "listOfChannels": True })
+        logger.info("Initing AI channels")
+
+        if data:
+            ai_channels = set(data["ai_channels"])
+            logger.info("AI Channels data Found")
+        else:
+            logger.info("Creating AI Channels data")
+            data = {
+                "listOfChannels": True,
+                "ai_channels": []
+            }
+            await c.insert_one(data)
+
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message) -> None:
         if message.author == self.bot or message.author.bot:
@@ -289,11 +296,7 @@ class Ai(commands.Cog, name="🤖 AI"):
 
         users_global = db["users_global"]
 
-        user_data = await CachedDB.find_one(users_global, {"id": message.author.id})
-
-        if not user_data:
-            user_data = CONSTANTS.user_global_data_template(message.author.id)
-            users_global.insert_one(user_data)
+        user_data = await EventContext.for_message(message).global_user()
 
         if user_data:
             if user_data["ai_ignore"]:
@@ -329,44 +332,37 @@ class Ai(commands.Cog, name="🤖 AI"):
                     "$set": { "ai_ignore": True, "ai_ignore_reason": "Too many violations, max ratelimit hit."}
                 }
 
-                users_global.update_one(
-                    { "id": message.author.id }, newdata
-                )
+                await CachedDB.update_one(users_global, { "id": message.author.id }, newdata)
 
                 await message.reply(embed=embed)
 
             return
 
-        if profanity.contains_profanity(message.content):
+        found = MessageScanner.cached_categories(message.content)
+
+        if MessageScanner.PROFANITY in found:
             newdata ={
                 "$inc": { "inspect.nsfw_requests": 1}
             }
 
-            users_global.update_one(
-                { "id": message.author.id }, newdata
-            )
+            await CachedDB.update_one(users_global, { "id": message.author.id }, newdata)
 
-        for word in WORD_BLACKLIST:
-            if word.lower() in message.content.lower():
-                newdata = {
-                    "$inc": { "inspect.times_flagged": 1}
-                }
+        if MessageScanner.BLACKLIST in found:
+            newdata = {
+                "$inc": { "inspect.times_flagged": 1}
+            }
 
-                users_global.update_one(
-                    { "id": message.author.id }, newdata
-                )
+            await CachedDB.update_one(users_global, { "id": message.author.id }, newdata)
 
-                return await message.reply("Your message contains a blacklisted word, please refrain from using it.")
+            return await message.reply("Your message contains a blacklisted word, please refrain from using it.")
 
         if not "ai_requests" in user_data["inspect"]:
             newdata = {
                 "$set": { "inspect.ai_requests": 0}
             }
-            users_global.update_one(
-                { "id": message.author.id }, newdata
-            )
+            await CachedDB.update_one(users_global, { "id": message.author.id }, newdata)
 
-        if user_data["inspect"]["ai_requests"] == 0:
+        if user_data["inspect"].get("ai_requests", 0) == 0:
             embed = discord.Embed(
                 description="By interacting with the ai in any way you agree to the following:\n- We will log: amount of ai requests, times you get flagged, nsfw request count\n- We will also store all messages you send to the AI in order to give the AI memory, these messages will be deleted after 7 days of inactivity and will not be seen by anyone other than the ai itself."
             )
@@ -376,16 +372,9 @@ class Ai(commands.Cog, name="🤖 AI"):
             "$inc": { "inspect.ai_requests": 1}
         }
 
-        users_global.update_one(
-            { "id": message.author.id }, newdata
-        )
-
-        c = db["guilds"]
-        data = c.find_one({"id": message.guild.id})
+        await CachedDB.update_one(users_global, { "id": message.author.id }, newdata)
 
-        if not data:
-            data = CONSTANTS.guild_data_template(message.guild.id)
-            c.insert_one(data)
+        data = await EventContext.for_message(message).guild()
 
         if data["groq_api_key"] == "NONE":
             if not data["ai_access"]:
@@ -413,7 +402,7 @@ class Ai(commands.Cog, name="🤖 AI"):
             if data["system_prompt"] != "NONE":
                 systemPrompt = data["system_prompt"]
 
-            if profanity.contains_profanity(systemPrompt):
+            if MessageScanner.PROFANITY in MessageScanner.cached_categories(systemPrompt):
                 if hasattr(message.channel, "is_nsfw"):
                     if not message.channel.is_nsfw():
                         await message.reply("The system prompt contains profanity and this channel is not marked as NSFW. **Using default system prompt**")
@@ -425,9 +414,7 @@ class Ai(commands.Cog, name="🤖 AI"):
                 data = await loop.run_in_executor(None, functools.partial(prompt_ai, message.author.name + ": " + message.content, 0, message.channel.id, str(userInfo), groq_client=client, systemPrompt=systemPrompt))
                 await message.reply(data)
 
-                ai_requests = (self.statsDB.get("ai_requests") if self.statsDB.exists("ai_requests") else 0) + 1
-                self.statsDB.set("ai_requests", ai_requests)
-                self.statsDB.dump()
+                self.statsDB.incr("ai_requests")
 
         except Exception as e:
             err = f"An error in the AI has occured {e}"
@@ -435,11 +422,6 @@ class Ai(commands.Cog, name="🤖 AI"):
 
         logger.info(f"AI replied to {message.author} in {message.guild.name} ({message.guild.id})")
 
-    @tasks.loop(hours=1)
-    async def purge_conversations(self):
-        convos = db["ai_convos"]
-        result = convos.delete_many({"expiresAt": {"$lt": time.time()}})
-
     @commands.cooldown(10, 60, commands.BucketType.default)
     @commands.hybrid_command(
         name="ai",
@@ -457,27 +439,21 @@ class Ai(commands.Cog, name="🤖 AI"):
         await context.defer()
 
         users_global = db["users_global"]
-        user_data = users_global.find_one({"id": context.author.id})
-
-        if not user_data:
-            user_data = CONSTANTS.user_global_data_template(context.author.id)
-            users_global.insert_one(user_data)
+        user_data = await CachedDB.find_or_create(users_global, {"id": context.author.id}, CONSTANTS.user_global_data_template(context.author.id))
 
         if user_data:
             if user_data["ai_ignore"]:
                 await context.reply("**You are being ignored by the AI, reason: " + user_data["ai_ignore_reason"] + "**")
                 return
 
-        if profanity.contains_profanity(context.message.content):
+        if MessageScanner.PROFANITY in MessageScanner.categories(context.message.content):
             newdata ={
                 "$inc": { "inspect.nsfw_requests": 1}
             }
 
-            users_global.update_one(
-                { "id": context.author.id }, newdata
-            )
+            await CachedDB.update_one(users_global, { "id": context.author.id }, newdata)
 
-        if user_data["inspect"]["ai_requests"] == 0:
+        if user_data["inspect"].get("ai_requests", 0) == 0:
             embed = discord.Embed(
                 description="By interacting with the ai in any way you agree to the following:\n- We will log: amount of ai requests, times you get flagged, nsfw request count\n- We will also store all messages you send to the AI in order to give the AI memory, these messages will be deleted after 7 days of inactivity and will not be seen by anyone other than the ai itself."
             )
@@ -487,24 +463,20 @@ class Ai(commands.Cog, name="🤖 AI"):
             newdata = {
                 "$set": { "inspect.ai_requests": 0}
             }
-            users_global.update_one(
-                { "id": context.author.id }, newdata
-            )
+            await CachedDB.update_one(users_global, { "id": context.author.id }, newdata)
 
         newdata ={
             "$inc": { "inspect.ai_requests": 1}
         }
 
-        users_global.update_one(
-            { "id": context.author.id }, newdata
-        )
+        await CachedDB.update_one(users_global, { "id": context.author.id }, newdata)
 
         client = Groq(api_key=get_api_key())
 
         userInfo = { "user": context.author }
 
         c = db["users"]
-        userData = c.find_one({"id": context.author.id, "guild_id": context.guild.id}) if context.guild else {}
+        userData = await c.find_one({"id": context.author.id, "guild_id": context.guild.id}) if context.guild else {}
 
         userInfo["data"] = userData
 
@@ -514,9 +486,7 @@ class Ai(commands.Cog, name="🤖 AI"):
 
             await context.reply(data)
 
-            ai_requests = (self.statsDB.get("ai_requests") if self.statsDB.exists("ai_requests") else 0) + 1
-            self.statsDB.set("ai_requests", ai_requests)
-            self.statsDB.dump()
+            self.statsDB.incr("ai_requests")
         except Exception as e:
             err = f"An error in the AI has occured: {e}"
             await context.reply(err)
@@ -530,11 +500,7 @@ class Ai(commands.Cog, name="🤖 AI"):
     @commands.check(Checks.is_not_blacklisted)
     async def set_ai_channel(self, context: Context):
         c = db["guilds"]
-        data = c.find_one({"id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.guild_data_template(context.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         if data["groq_api_key"] == "NONE":
             if not data["ai_access"]:
@@ -557,16 +523,16 @@ class Ai(commands.Cog, name="🤖 AI"):
 
         await context.send(data)
 
-        ai_channels.append(context.channel.id)
+        ai_channels.add(context.channel.id)
 
         c = db["ai_channels"]
-        data = c.find_one({ "listOfChannels": True })
+        data = await c.find_one({ "listOfChannels": True })
 
         newdata = {
-                "$set": { "ai_channels": ai_channels }
+                "$set": { "ai_channels": list(ai_channels) }
         }
 
-        c.update_one(
+        await c.update_one(
             { "listOfChannels": True }, newdata
         )
 
@@ -580,15 +546,15 @@ class Ai(commands.Cog, name="🤖 AI"):
     async def unset_ai_channel(self, context: Context):
         c = db["ai_channels"]
 
-        ai_channels.remove(context.channel.id)
+        ai_channels.discard(context.channel.id)
 
         await context.channel.edit(slowmode_delay=0)
 
         newdata = {
-                "$set": { "ai_channels": ai_channels }
+                "$set": { "ai_channels": list(ai_channels) }
         }
 
-        c.update_one(
+        await c.update_one(
             { "listOfChannels": True }, newdata
         )
 
@@ -602,11 +568,7 @@ class Ai(commands.Cog, name="🤖 AI"):
     @commands.check(Checks.is_not_blacklisted)
     async def create_ai_thread(self, context: Context, *, prompt = "Hello") -> None:
         c = db["guilds"]
-        data = c.find_one({"id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.guild_data_template(context.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         if data["groq_api_key"] == "NONE":
             if not data["ai_access"]:
@@ -626,9 +588,7 @@ class Ai(commands.Cog, name="🤖 AI"):
         loop = asyncio.get_running_loop()
         data = await loop.run_in_executor(None, functools.partial(prompt_ai, prompt, groq_client=client))
 
-        ai_requests = (self.statsDB.get("ai_requests") if self.statsDB.exists("ai_requests") else 0) + 1
-        self.statsDB.set("ai_requests", ai_requests)
-        self.statsDB.dump()
+        self.statsDB.incr("ai_requests")
 
         newChannel = await context.channel.create_thread(
             name=f"AI Convo - {context.author}",
@@ -639,16 +599,16 @@ class Ai(commands.Cog, name="🤖 AI"):
         await newChannel.send(data)
         await msg.delete()
 
-        ai_channels.append(newChannel.id)
+        ai_channels.add(newChannel.id)
 
         c = db["ai_channels"]
-        data = c.find_one({ "listOfChannels": True })
+        data = await c.find_one({ "listOfChannels": True })
 
         newdata = {
-                "$set": { "ai_channels": ai_channels }
+                "$set": { "ai_channels": list(ai_channels) }
         }
 
-        c.update_one(
+        await c.update_one(
             { "listOfChannels": True }, newdata
         )
 
@@ -664,25 +624,19 @@ class Ai(commands.Cog, name="🤖 AI"):
     @app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
     async def ai_image(self, context: commands.Context, prompt: str) -> None:
         users_global = db["users_global"]
-        user_data = users_global.find_one({"id": context.author.id})
-
-        if not user_data:
-            user_data = CONSTANTS.user_global_data_template(context.author.id)
-            users_global.insert_one(user_data)
+        user_data = await CachedDB.find_or_create(users_global, {"id": context.author.id}, CONSTANTS.user_global_data_template(context.author.id))
 
         if user_data:
             if user_data["ai_ignore"]:
                 await context.reply("**You are being ignored by the AI, reason: " + user_data["ai_ignore_reason"] + "**")
                 return
 
-        if profanity.contains_profanity(prompt):
+        if MessageScanner.PROFANITY in MessageScanner.categories(prompt):
             newdata ={
                 "$inc": { "inspect.nsfw_requests": 1}
             }
 
-            users_global.update_one(
-                { "id": context.author.id }, newdata
-            )
+            await CachedDB.update_one(users_global, { "id": context.author.id }, newdata)
 
             if hasattr(context.channel, "is_nsfw"):
                 if not context.channel.is_nsfw():
@@ -692,11 +646,9 @@ class Ai(commands.Cog, name="🤖 AI"):
             newdata = {
                 "$set": { "inspect.ai_requests": 0}
             }
-            users_global.update_one(
-                { "id": context.author.id }, newdata
-            )
+            await CachedDB.update_one(users_global, { "id": context.author.id }, newdata)
 
-        if user_data["inspect"]["ai_requests"] == 0:
+        if user_data["inspect"].get("ai_requests", 0) == 0:
             embed = discord.Embed(
                 description="By interacting with the ai in any way you agree to the following:\n- We will log: amount of ai requests, times you get flagged, nsfw request count\n- We will also store all messages you send to the AI in order to give the AI memory, these messages will be deleted after 7 days of inactivity and will not be seen by anyone other than the ai itself."
             )
@@ -706,9 +658,7 @@ class Ai(commands.Cog, name="🤖 AI"):
             "$inc": { "inspect.ai_requests": 1}
         }
 
-        users_global.update_one(
-            { "id": context.author.id }, newdata
-        )
+        await CachedDB.update_one(users_global, { "id": context.author.id }, newdata)
 
         eta = int(time.time() + 20)
 
@@ -753,11 +703,7 @@ class Ai(commands.Cog, name="🤖 AI"):
         nsfw_options = ["nsfw-gen-v2"]
 
         users_global = db["users_global"]
-        user_data = users_global.find_one({"id": context.author.id})
-
-        if not user_data:
-            user_data = CONSTANTS.user_global_data_template(context.author.id)
-            users_global.insert_one(user_data)
+        user_data = await CachedDB.find_or_create(users_global, {"id": context.author.id}, CONSTANTS.user_global_data_template(context.author.id))
 
         if model not in options:
             return await context.send("Invalid model. Available models: " + ", ".join(options.keys()))
@@ -774,20 +720,14 @@ class Ai(commands.Cog, name="🤖 AI"):
 
         users_global = db["users_global"]
 
-        user_data = users_global.find_one({"id": context.author.id})
-
-        if not user_data:
-            user_data = CONSTANTS.user_global_data_template(context.author.id)
-            users_global.insert_one(user_data)
+        user_data = await CachedDB.find_or_create(users_global, {"id": context.author.id}, CONSTANTS.user_global_data_template(context.author.id))
 
-        if profanity.contains_profanity(prompt):
+        if MessageScanner.PROFANITY in MessageScanner.categories(prompt):
             newdata ={
                 "$inc": { "inspect.nsfw_requests": 1}
             }
 
-            users_global.update_one(
-                { "id": context.author.id }, newdata
-            )
+            await CachedDB.update_one(users_global, { "id": context.author.id }, newdata)
 
             if hasattr(context.channel, "is_nsfw"):
                 if not context.channel.is_nsfw():
@@ -797,11 +737,9 @@ class Ai(commands.Cog, name="🤖 AI"):
             newdata = {
                 "$set": { "inspect.ai_requests": 0}
             }
-            users_global.update_one(
-                { "id": context.author.id }, newdata
-            )
+            await CachedDB.update_one(users_global, { "id": context.author.id }, newdata)
 
-        if user_data["inspect"]["ai_requests"] == 0:
+        if user_data["inspect"].get("ai_requests", 0) == 0:
             embed = discord.Embed(
                 description="By interacting with the ai in any way you agree to the following:\n- We will log: amount of ai requests, times you get flagged, nsfw request count\n- We will also store all messages you send to the AI in order to give the AI memory, these messages will be deleted after 7 days of inactivity and will not be seen by anyone other than the ai itself."
             )
@@ -810,9 +748,7 @@ class Ai(commands.Cog, name="🤖 AI"):
             "$inc": { "inspect.ai_requests": 1}
         }
 
-        users_global.update_one(
-            { "id": context.author.id }, newdata
-        )
+        await CachedDB.update_one(users_global, { "id": context.author.id }, newdata)
 
         ETA = int(time.time() + 15)
         msg = await context.send(
@@ -859,7 +795,7 @@ class Ai(commands.Cog, name="🤖 AI"):
     @commands.has_permissions(manage_messages=True)
     async def system_prompt(self, context: Context, *, prompt: str = "") -> None:
         c = db["guilds"]
-        data = c.find_one({"id": context.guild.id})
+        data = await c.find_one({"id": context.guild.id})
 
         if prompt == "":
             if data:
@@ -868,7 +804,7 @@ class Ai(commands.Cog, name="🤖 AI"):
                 else:
                     return await context.send("No system prompt set.")
 
-        if profanity.contains_profanity(prompt):
+        if MessageScanner.PROFANITY in MessageScanner.categories(prompt):
             if not context.channel.is_nsfw():
                 prompt = "NONE"
                 await context.send("The system prompt contains profanity and this channel is not marked as NSFW. Please use an NSFW channel for NSFW prompts.")
@@ -877,8 +813,8 @@ class Ai(commands.Cog, name="🤖 AI"):
                 "$set": { "system_prompt": prompt }
         }
 
-        c.update_one(
-            { "id": context.guild.id }, newdata
+        await CachedDB.update_one(
+            c, { "id": context.guild.id }, newdata
         )
 
         await context.send("System prompt set to: " + prompt)
@@ -892,7 +828,7 @@ class Ai(commands.Cog, name="🤖 AI"):
     @commands.has_permissions(manage_messages=True)
     async def reset_ai(self, context: Context) -> None:
         c = db["ai_convos"]
-        c.delete_one({"id": context.channel.id})
+        await c.delete_one({"id": context.channel.id})
         await context.send("AI data reset for " + context.channel.mention)
 
     @commands.command(
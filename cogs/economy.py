@@ -11,7 +11,7 @@ from discord.ext import commands
 from discord.ext.commands import Context
 from discord.ui import Button, button, View
 
-from utils import CONSTANTS, DBClient, CachedDB, Checks
+from utils import CONSTANTS, DBClient, CachedDB, Checks, Leaderboard
 from ui.farm import FarmButton
 from ui.gambling import GamblingButton
 
@@ -34,11 +34,7 @@ class Economy(commands.Cog, name="🪙 Economy"):
             user = context.author
 
         c = db["users"]
-        data = c.find_one({"id": user.id, "guild_id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.user_data_template(user.id, context.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": user.id, "guild_id": context.guild.id}, CONSTANTS.user_data_template(user.id, context.guild.id))
         await context.send(f"**{user}** has ${data['wallet']} in their wallet")
 
     @commands.hybrid_command(
@@ -49,11 +45,7 @@ class Economy(commands.Cog, name="🪙 Economy"):
     @commands.check(Checks.is_not_blacklisted)
     async def daily(self, context: Context) -> None:
         c = db["users"]
-        data = await CachedDB.find_one(c, {"id": context.author.id, "guild_id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.user_data_template(context.author.id, context.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": context.author.id, "guild_id": context.guild.id}, CONSTANTS.user_data_template(context.author.id, context.guild.id))
         if time.time() - data["last_daily"] < 86400:
             eta = data["last_daily"] + 86400
             await context.send(
@@ -62,11 +54,7 @@ class Economy(commands.Cog, name="🪙 Economy"):
             return
 
         guild = db["guilds"]
-        guild_data = await CachedDB.find_one(guild, {"id": context.guild.id})
-
-        if not guild_data:
-            guild_data = CONSTANTS.guild_data_template(context.guild.id)
-            guild.insert_one(guild_data)
+        guild_data = await CachedDB.find_or_create(guild, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         data["wallet"] += guild_data["daily_cash"]
         newdata = {
@@ -91,7 +79,10 @@ class Economy(commands.Cog, name="🪙 Economy"):
 
         c = db["users"]
 
-        target_data = await CachedDB.find_one(c, {"id": user.id, "guild_id": context.guild.id})
+        target_data, author_data = await CachedDB.find_many(c, [
+            {"id": user.id, "guild_id": context.guild.id},
+            {"id": context.author.id, "guild_id": context.guild.id}
+        ])
 
         if not target_data:
             return await context.send("User has no money")
@@ -99,11 +90,8 @@ class Economy(commands.Cog, name="🪙 Economy"):
         if target_data["wallet"] == 0:
             return await context.send("User has no money")
 
-        author_data = await CachedDB.find_one(c, {"id": context.author.id, "guild_id": context.guild.id})
-
         if not author_data:
-            author_data = CONSTANTS.user_data_template(context.author.id, context.guild.id)
-            c.insert_one(author_data)
+            author_data = await CachedDB.find_or_create(c, {"id": context.author.id, "guild_id": context.guild.id}, CONSTANTS.user_data_template(context.author.id, context.guild.id))
 
         max_payout = target_data["wallet"] // 5
 
@@ -166,8 +154,7 @@ class Economy(commands.Cog, name="🪙 Economy"):
     )
     @commands.check(Checks.is_not_blacklisted)
     async def baltop(self, context: Context) -> None:
-        c = db["users"]
-        data = c.find({"guild_id": context.guild.id}).sort("wallet", -1).limit(10)
+        data = await Leaderboard.top(context.guild.id, Leaderboard.WALLET, 10)
 
         embed = discord.Embed(
             title="Top Balances",
@@ -176,8 +163,8 @@ class Economy(commands.Cog, name="🪙 Economy"):
         )
 
         i = 1
-        for _, user in enumerate(data, start=1):
-            member = context.guild.get_member(user["id"])
+        for user_id, user in data:
+            member = context.guild.get_member(user_id)
             if member != None:
                 if member.bot:
                     continue
@@ -188,6 +175,11 @@ class Economy(commands.Cog, name="🪙 Economy"):
                 )
                 i += 1
 
+        position = await Leaderboard.rank(context.guild.id, Leaderboard.WALLET, context.author.id)
+
+        if position:
+            embed.set_footer(text=f"You are #{position}")
+
         await context.send(embed=embed)
 
     @commands.hybrid_command(
@@ -206,20 +198,19 @@ class Economy(commands.Cog, name="🪙 Economy"):
             return
 
         c = db["users"]
-        data = await CachedDB.find_one(c, {"id": context.author.id, "guild_id": context.guild.id})
+        data, target_user_data = await CachedDB.find_many(c, [
+            {"id": context.author.id, "guild_id": context.guild.id},
+            {"id": user.id, "guild_id": context.guild.id}
+        ])
 
         if not data:
-            data = CONSTANTS.user_data_template(context.author.id, context.guild.id)
-            c.insert_one(data)
+            data = await CachedDB.find_or_create(c, {"id": context.author.id, "guild_id": context.guild.id}, CONSTANTS.user_data_template(context.author.id, context.guild.id))
         if data["wallet"] < amount:
             await context.send("You don't have enough money")
             return
 
-        target_user_data = c.find_one({"id": user.id, "guild_id": context.guild.id})
         if not target_user_data:
-            target_user_data = CONSTANTS.user_data_template(context.author.id, context.guild.id)
-
-            c.insert_one(target_user_data)
+            target_user_data = await CachedDB.find_or_create(c, {"id": user.id, "guild_id": context.guild.id}, CONSTANTS.user_data_template(user.id, context.guild.id))
         data["wallet"] -= amount
         target_user_data["wallet"] += amount
         newdata = {
@@ -244,12 +235,7 @@ class Economy(commands.Cog, name="🪙 Economy"):
     async def set(self, context: Context, user: discord.Member, amount: int) -> None:
         c = db["users"]
 
-        target_user_data = await CachedDB.find_one(c, {"id": user.id, "guild_id": context.guild.id})
-
-        if not target_user_data:
-            target_user_data = CONSTANTS.user_data_template(context.author.id, context.guild.id)
-
-            c.insert_one(target_user_data)
+        target_user_data = await CachedDB.find_or_create(c, {"id": user.id, "guild_id": context.guild.id}, CONSTANTS.user_data_template(user.id, context.guild.id))
 
         newdata = {
             "$set": {"wallet": amount}
@@ -271,11 +257,7 @@ class Economy(commands.Cog, name="🪙 Economy"):
             return
 
         c = db["users"]
-        data = await CachedDB.find_one(c, {"id": context.author.id, "guild_id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.user_data_template(context.author.id, context.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": context.author.id, "guild_id": context.guild.id}, CONSTANTS.user_data_template(context.author.id, context.guild.id))
         if data["wallet"] < amount:
             await context.send("You don't have enough money")
             return
@@ -300,11 +282,7 @@ class Economy(commands.Cog, name="🪙 Economy"):
     async def farm(self, context: Context) -> None:
 
         c = db["users"]
-        data = await CachedDB.find_one(c, {"id": context.author.id, "guild_id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.user_data_template(context.author.id, context.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": context.author.id, "guild_id": context.guild.id}, CONSTANTS.user_data_template(context.author.id, context.guild.id))
 
         if not "farm" in data:
             data["farm"] = {
@@ -316,9 +294,7 @@ class Economy(commands.Cog, name="🪙 Economy"):
             newdata = {
                 "$set": {"farm": data["farm"]}
             }
-            c.update_one(
-                {"id": context.author.id, "guild_id": context.guild.id}, newdata
-            )
+            await CachedDB.update_one(c, {"id": context.author.id, "guild_id": context.guild.id}, newdata)
 
         farmData = data["farm"]
 
@@ -363,9 +339,7 @@ class Economy(commands.Cog, name="🪙 Economy"):
         new_data = {
             "$set": {"farm": farmData}
         }
-        c.update_one(
-            {"id": context.author.id, "guild_id": context.guild.id}, new_data
-        )
+        await CachedDB.update_one(c, {"id": context.author.id, "guild_id": context.guild.id}, new_data)
 
 async def setup(bot) -> None:
     await bot.add_cog(Economy(bot))
@@ -1,22 +1,86 @@
 # This project is licensed under the terms of the GPL v3.0 license. Copyright 2024 Cyteon
 
+import asyncio
 import random
-import pymongo
 import os
+import logging
 
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord.ext.commands import Context
+from pymongo.errors import BulkWriteError, PyMongoError
 
 from easy_pil import *
 
-from utils import CONSTANTS, DBClient, Checks, CachedDB
+from utils import CONSTANTS, DBClient, Checks, CachedDB, EventContext, Leaderboard, XPCurve
 
 db = DBClient.db
+logger = logging.getLogger("discord_bot")
 
 class Level(commands.Cog, name="🚀 Level"):
     def __init__(self, bot) -> None:
         self.bot = bot
+        # XP earned but not written yet, keyed by (guild_id, user_id) and flushed as one bulk_write
+        self.pending_xp = {}
+        # The batch currently being written, still counted until the cache has caught up with it
+        self.flushing_xp = {}
+        # One flush at a time, the loop, level-curve and unload all flush
+        self.flush_lock = asyncio.Lock()
+        # Guilds whose levels are being recomputed for a new curve, nobody gains xp there until it's done
+        self.recomputing = set()
+        self.xp_cooldown = commands.CooldownMapping.from_cooldown(1, 5, commands.BucketType.member)
+
+    async def cog_load(self) -> None:
+        self.flush_xp.start()
+
+    async def cog_unload(self) -> None:
+        # Bot.close() removes every cog, so this also runs on shutdown.
+        # Stopped rather than cancelled, cancelling could cut a flush off halfway and lose its xp
+        self.flush_xp.stop()
+        await self.flush_pending_xp()
+
+    def unflushed_xp(self, guild_id, user_id):
+        key = (guild_id, user_id)
+        return self.flushing_xp.get(key, 0) + self.pending_xp.get(key, 0)
+
+    async def flush_pending_xp(self) -> None:
+        async with self.flush_lock:
+            if not self.pending_xp:
+                return
+
+            self.flushing_xp, self.pending_xp = self.pending_xp, {}
+
+            updates = [
+                ({"id": user_id, "guild_id": guild_id}, {"$inc": {"xp": xp}})
+                for (guild_id, user_id), xp in self.flushing_xp.items()
+            ]
+
+            failed = {}
+
+            try:
+                # Shielded, a cancelled caller still lets the write finish
+                await asyncio.shield(CachedDB.bulk_update(db["users"], updates))
+            except BulkWriteError as e:
+                # Unordered, so only the updates mongo rejected are missing
+                batch = list(self.flushing_xp.items())
+                failed = dict(batch[error["index"]] for error in e.details.get("writeErrors", []))
+                logger.error(f"Failed to flush xp for {len(failed)} of {len(updates)} users: {e}")
+            except PyMongoError as e:
+                failed = self.flushing_xp
+                logger.error(f"Failed to flush xp for {len(updates)} users: {e}")
+            except Exception as e:
+                # The write went through, only keeping the cache in step failed
+                logger.error(f"Failed to update the cache after flushing xp for {len(updates)} users: {e}")
+
+            # Kept for the next flush instead of being lost
+            for key, xp in failed.items():
+                self.pending_xp[key] = self.pending_xp.get(key, 0) + xp
+
+            self.flushing_xp = {}
+
+    @tasks.loop(seconds=5)
+    async def flush_xp(self) -> None:
+        await self.flush_pending_xp()
 
     @commands.hybrid_command(
         name="level",
@@ -33,9 +97,14 @@ class Level(commands.Cog, name="🚀 Level"):
         data = await CachedDB.find_one(c, {"id": user.id, "guild_id": context.guild.id})
 
         if data:
-            xp_for_next_level = CONSTANTS.LEVELS_AND_XP[data["level"] + 1]
+            guild_data = await CachedDB.find_one(db["guilds"], {"id": context.guild.id})
+            curve = XPCurve.for_guild(guild_data)
 
-            percentage = round(data["xp"] / xp_for_next_level * 100, 1)
+            # Buffered xp can carry past a level up that hasn't been written yet
+            level, xp = curve.add(data["level"], data["xp"], self.unflushed_xp(context.guild.id, user.id))
+            xp_for_next_level = curve.needed(level)
+
+            percentage = round(xp / xp_for_next_level * 100, 1) if xp_for_next_level else 100
 
             background = Editor(Canvas((900, 300), color="#141414"))
             profile_picture = await load_image_async(str(user.avatar.url))
@@ -54,7 +123,12 @@ class Level(commands.Cog, name="🚀 Level"):
             background.text((200, 40), user.name, font=poppins, color="#FFFFFF")
 
             background.rectangle((200, 100), width=350, height=2, fill="#FFFFFF")
-            background.text((200, 130), f"Level {data['level']} - {data['xp']}/{xp_for_next_level} XP", font=poppins_small, color="#FFFFFF")
+            background.text((200, 130), f"Level {level} - {xp}/{xp_for_next_level or 'MAX'} XP", font=poppins_small, color="#FFFFFF")
+
+            position = await Leaderboard.rank(context.guild.id, Leaderboard.LEVELS, user.id)
+
+            if position:
+                background.text((800, 120), f"#{position}", font=poppins, color="#141414", align="center")
 
             file = discord.File(fp=background.image_bytes, filename="level_card.png")
             await context.send(file=file)
@@ -70,8 +144,7 @@ class Level(commands.Cog, name="🚀 Level"):
     @commands.check(Checks.is_not_blacklisted)
     @commands.cooldown(1, 10, commands.BucketType.user)
     async def leaderboard(self, context: Context) -> None:
-        c = db["users"]
-        data = c.find({"guild_id": context.guild.id}).sort([("level", pymongo.DESCENDING), ("xp", pymongo.DESCENDING)]).limit(10)
+        data = await Leaderboard.top(context.guild.id, Leaderboard.LEVELS, 10)
 
         embed = discord.Embed(
             title="Leaderboard",
@@ -79,8 +152,8 @@ class Level(commands.Cog, name="🚀 Level"):
             color=discord.Color.gold()
         )
 
-        for index, user in enumerate(data, start=1):
-            member = context.guild.get_member(user["id"])
+        for index, (user_id, user) in enumerate(data, start=1):
+            member = context.guild.get_member(user_id)
             if member != None:
                 if member.bot:
                     continue
@@ -90,6 +163,11 @@ class Level(commands.Cog, name="🚀 Level"):
                     inline=False
                 )
 
+        position = await Leaderboard.rank(context.guild.id, Leaderboard.LEVELS, context.author.id)
+
+        if position:
+            embed.set_footer(text=f"You are #{position}")
+
         await context.send(embed=embed)
 
     @commands.Cog.listener()
@@ -97,37 +175,45 @@ class Level(commands.Cog, name="🚀 Level"):
         if message.author == self.bot or message.author.bot:
             return
 
+        if not message.guild:
+            return
+
+        if message.guild.id in self.recomputing:
+            return
+
+        if self.xp_cooldown.get_bucket(message).update_rate_limit():
+            return
+
         author = message.author
 
         c = db["users"]
-        data = await CachedDB.find_one(c, {"id": author.id, "guild_id": message.guild.id})
+        data = await EventContext.for_message(message).user()
 
-        if not data:
-            data = CONSTANTS.user_data_template(author.id, message.guild.id)
-            c.insert_one(data)
+        guild_data = await EventContext.for_message(message).guild()
+        curve = XPCurve.for_guild(guild_data)
 
-        if data["level"] >= CONSTANTS.MAX_LEVEL:
+        if data["level"] >= curve.max_level:
             return
 
-        if data["xp"] >= CONSTANTS.MAX_XP:
-            return
+        key = (message.guild.id, author.id)
+        gained = random.randint(1, 3)
 
-        data["xp"] += random.randint(1, 3)
+        level, xp = curve.add(data["level"], data["xp"], self.unflushed_xp(*key) + gained)
 
-        if data["xp"] >= CONSTANTS.LEVELS_AND_XP[data["level"] + 1]:
-            guilds = db["guilds"]
-            guild_data = await CachedDB.find_one(guilds, {"id": message.guild.id})
+        if level > data["level"]:
+            # Level ups are rare, so they're written straight away and take the buffered xp with them.
+            # xp is an $inc so a flush still in flight lands on top of it instead of being counted twice
+            self.pending_xp.pop(key, None)
 
-            if not guild_data:
-                guild_data = CONSTANTS.guild_data_template(message.guild.id)
-                guilds.insert_one(guild_data)
+            newdata = {"$inc": {"xp": xp - data["xp"] - self.flushing_xp.get(key, 0)}, "$set": {"level": level}}
 
-            data["level"] += 1
-            data["xp"] = 0
+            await CachedDB.update_one(c, {"id": author.id, "guild_id": message.guild.id}, newdata)
 
-            if str(data["level"]) in guild_data["level_roles"]:
-                role = message.guild.get_role(guild_data["level_roles"][str(data["level"])])
-                await message.author.add_roles(role)
+            # Every level passed on the way gets its role, not just the one landed on
+            for passed in range(data["level"] + 1, level + 1):
+                if str(passed) in guild_data["level_roles"]:
+                    role = message.guild.get_role(guild_data["level_roles"][str(passed)])
+                    await message.author.add_roles(role)
 
             channel = message.channel
             if guild_data:
@@ -137,13 +223,54 @@ class Level(commands.Cog, name="🚀 Level"):
 
                 if "should_announce_levelup" in guild_data:
                     if guild_data["should_announce_levelup"]:
-                        await channel.send(f"{author.mention} leveled up to level {data['level']}!")
+                        await channel.send(f"{author.mention} leveled up to level {level}!")
                 else:
-                    await channel.send(f"{author.mention} leveled up to level {data['level']}!")
+                    await channel.send(f"{author.mention} leveled up to level {level}!")
+        else:
+            self.pending_xp[key] = self.pending_xp.get(key, 0) + gained
+
+    @commands.hybrid_command(
+        name="level-curve",
+        description="Make levels take more or less xp, existing levels are recalculated (manage_guild permission)",
+        usage="level-curve <scale>"
+    )
+    @commands.check(Checks.is_not_blacklisted)
+    @commands.has_permissions(manage_guild=True)
+    async def level_curve(self, context: Context, scale: float) -> None:
+        if not XPCurve.MIN_SCALE <= scale <= XPCurve.MAX_SCALE:
+            return await context.send(f"Scale must be between {XPCurve.MIN_SCALE} and {XPCurve.MAX_SCALE}")
+
+        scale = round(scale, 2)
+
+        guilds = db["guilds"]
+        guild_data = await CachedDB.find_or_create(guilds, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
+
+        old_curve = XPCurve.for_guild(guild_data)
+        new_curve = XPCurve.scaled(scale)
+
+        if old_curve is new_curve:
+            return await context.send(f"The level curve is already at {scale}x")
 
-        newdata = {"$set": {"xp": data["xp"], "level": data["level"]}}
+        if context.guild.id in self.recomputing:
+            return await context.send("Levels are already being recalculated, try again once that's done")
 
-        await CachedDB.update_one(c, {"id": author.id, "guild_id": message.guild.id}, newdata)
+        await context.defer()
+
+        self.recomputing.add(context.guild.id)
+
+        try:
+            # Buffered xp has to land first or it would be added on top of the recalculated levels
+            await self.flush_pending_xp()
+            await CachedDB.update_one(guilds, {"id": context.guild.id}, {"$set": {"xp_curve_scale": scale}})
+
+            # Listeners of messages already in flight would otherwise still use the old curve and user documents
+            EventContext.forget_guild(context.guild.id)
+
+            changed = await XPCurve.recompute_guild(context.guild.id, old_curve, new_curve)
+        finally:
+            self.recomputing.discard(context.guild.id)
+
+        await context.send(f"Level curve set to {scale}x, recalculated levels for {changed} users")
 
     @commands.hybrid_command(
         name="create-level-roles",
@@ -156,11 +283,7 @@ class Level(commands.Cog, name="🚀 Level"):
         # create role for level 1/3/5/10/15/20
 
         guilds = db["guilds"]
-        guild_data = await CachedDB.find_one(guilds, {"id": context.guild.id})
-
-        if not guild_data:
-            guild_data = CONSTANTS.guild_data_template(context.guild.id)
-            guilds.insert_one(guild_data)
+        guild_data = await CachedDB.find_or_create(guilds, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         for level in [1, 3, 5, 10, 15, 20]:
             if str(level) not in guild_data["level_roles"]:
@@ -181,11 +304,7 @@ class Level(commands.Cog, name="🚀 Level"):
     @commands.has_permissions(manage_roles=True)
     async def delete_level_roles(self, context: Context):
         guilds = db["guilds"]
-        guild_data = await CachedDB.find_one(guilds, {"id": context.guild.id})
-
-        if not guild_data:
-            guild_data = CONSTANTS.guild_data_template(context.guild.id)
-            guilds.insert_one(guild_data)
+        guild_data = await CachedDB.find_or_create(guilds, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         for level in guild_data["level_roles"]:
             role = context.guild.get_role(guild_data["level_roles"][level])
@@ -7,7 +7,7 @@ import inspect
 import traceback
 import os
 import sys
-import pymongo
+import motor.motor_asyncio
 from datetime import datetime
 
 
@@ -285,19 +285,11 @@ class Owner(commands.Cog, name="owner"):
     async def enable_ai(self, context, server: int = 0):
         c = db["guilds"]
 
-        data = c.find_one(
-            {
-                "id": server if server != 0 else context.guild.id
-            }
-        )
-
-        if not data:
-            data = CONSTANTS.guild_data_template(context.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": server if server != 0 else context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         newdata = { "$set": { "ai_access": True } }
 
-        c.update_one({"id": context.guild.id}, newdata)
+        await CachedDB.update_one(c, {"id": context.guild.id}, newdata)
 
         await context.send("AI access have been enabled in this server")
 
@@ -311,19 +303,11 @@ class Owner(commands.Cog, name="owner"):
 
         c = db["guilds"]
 
-        data = c.find_one(
-            {
-                "id": server_id if server_id != 0 else context.guild.id
-            }
-        )
-
-        if not data:
-            data = CONSTANTS.guild_data_template(context.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": server_id if server_id != 0 else context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         newdata = { "$set": { "ai_access": False } }
 
-        c.update_one({"id": context.guild.id}, newdata)
+        await CachedDB.update_one(c, {"id": context.guild.id}, newdata)
 
         await context.send("AI access have been disabled in this server")
 
@@ -337,11 +321,7 @@ class Owner(commands.Cog, name="owner"):
     @app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
     async def blacklist(self, context, user: discord.User, *, reason: str = "No reason provided"):
         users_global = db["users_global"]
-        user_data = users_global.find_one({"id": user.id})
-
-        if user is None:
-            user_data = CONSTANTS.user_global_data_template(user.id)
-            users_global.insert_one(user_data)
+        user_data = await CachedDB.find_or_create(users_global, {"id": user.id}, CONSTANTS.user_global_data_template(user.id))
 
         newdata = {
             "$set": {
@@ -375,11 +355,7 @@ class Owner(commands.Cog, name="owner"):
     @app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
     async def unblacklist(self, context, user: discord.User):
         users_global = db["users_global"]
-        user_data = users_global.find_one({"id": user.id})
-
-        if user_data is None:
-            user_data = CONSTANTS.user_global_data_template(user.id)
-            users_global.insert_one(user_data)
+        user_data = await CachedDB.find_or_create(users_global, {"id": user.id}, CONSTANTS.user_global_data_template(user.id))
 
         newdata = {
             "$set": {
@@ -410,11 +386,7 @@ class Owner(commands.Cog, name="owner"):
     @commands.is_owner()
     async def ai_ignore(self, context, user: discord.User, *, reason: str = "No reason provided"):
         users_global = db["users_global"]
-        user_data = users_global.find_one({"id": user.id})
-
-        if user_data is None:
-            user_data = CONSTANTS.user_global_data_template(user.id)
-            user_data.insert_one(user_data)
+        user_data = await CachedDB.find_or_create(users_global, {"id": user.id}, CONSTANTS.user_global_data_template(user.id))
 
         newdata = {
             "$set": {
@@ -435,11 +407,7 @@ class Owner(commands.Cog, name="owner"):
     @commands.is_owner()
     async def ai_unignore(self, context, user: discord.User):
         users_global = db["users_global"]
-        user_data = users_global.find_one({"id": user.id})
-
-        if user_data is None:
-            user_data = CONSTANTS.user_global_data_template(user.id)
-            users_global.insert_one(user_data)
+        user_data = await CachedDB.find_or_create(users_global, {"id": user.id}, CONSTANTS.user_global_data_template(user.id))
 
         newdata = {
             "$set": {
@@ -460,11 +428,7 @@ class Owner(commands.Cog, name="owner"):
     @commands.is_owner()
     async def inspect(self, context, user: discord.User):
         users_global = db["users_global"]
-        user_data = users_global.find_one({"id": user.id})
-
-        if user_data is None:
-            user_data = CONSTANTS.user_global_data_template(user.id)
-            users_global.insert_one(user_data)
+        user_data = await CachedDB.find_or_create(users_global, {"id": user.id}, CONSTANTS.user_global_data_template(user.id))
 
         embed = discord.Embed(
             title=f"Inspecting {user}",
@@ -500,9 +464,9 @@ class Owner(commands.Cog, name="owner"):
             "$set": {"inspect.total_commands": 0, "inspect.times_flagged": 0, "inspect.nsfw_requests": 0, "inspect.ai_requests": 0}
         }
 
-        users_global.update_one({"id": user.id}, newdata)
+        await CachedDB.update_one(users_global, {"id": user.id}, newdata)
 
-        user_new = users_global.find_one({"id": user.id})
+        user_new = await users_global.find_one({"id": user.id})
 
         await context.send(f"Cleared inspect info for {user.mention}")
 
@@ -514,7 +478,7 @@ class Owner(commands.Cog, name="owner"):
     @commands.is_owner()
     async def top_flagged(self, context):
         users_global = db["users_global"]
-        users = users_global.find().sort("inspect.times_flagged", -1).limit(10)
+        users = await users_global.find().sort("inspect.times_flagged", -1).limit(10).to_list(length=10)
 
         embed = discord.Embed(
             title="Top Flagged Users",
@@ -537,7 +501,7 @@ class Owner(commands.Cog, name="owner"):
     @commands.is_owner()
     async def top_nsfw(self, context):
         users_global = db["users_global"]
-        users = users_global.find().sort("inspect.nsfw_requests", -1).limit(10)
+        users = await users_global.find().sort("inspect.nsfw_requests", -1).limit(10).to_list(length=10)
 
         embed = discord.Embed(
             title="Top NSFW Requesters",
@@ -560,7 +524,7 @@ class Owner(commands.Cog, name="owner"):
     @commands.is_owner()
     async def ai_announce(self, context, *, message: str):
         channels = db["ai_channels"]
-        listOfChannels = channels.find_one({"listOfChannels": True})
+        listOfChannels = await channels.find_one({"listOfChannels": True})
 
         embed = discord.Embed(description=message)
 
@@ -577,7 +541,7 @@ class Owner(commands.Cog, name="owner"):
     )
     @commands.is_owner()
     async def copy_db_to_backup(self, context):
-        backup_db = pymongo.MongoClient(os.getenv("MONGODB_BACKUP_URL")).potatobot
+        backup_db = motor.motor_asyncio.AsyncIOMotorClient(os.getenv("MONGODB_BACKUP_URL")).potatobot
 
         message = await context.send("""
         Status:
@@ -591,16 +555,16 @@ class Owner(commands.Cog, name="owner"):
             Copying reaction roles: :x:
         """)
 
-        backup_db["ai_convos"].drop()
-        backup_db["guilds"].drop()
-        backup_db["ai_channels"].drop()
-        backup_db["users"].drop()
-        backup_db["starboard"].drop()
-        backup_db["users_global"].drop()
-        backup_db["reactionroles"].drop()
+        await backup_db["ai_convos"].drop()
+        await backup_db["guilds"].drop()
+        await backup_db["ai_channels"].drop()
+        await backup_db["users"].drop()
+        await backup_db["starboard"].drop()
+        await backup_db["users_global"].drop()
+        await backup_db["reactionroles"].drop()
 
-        for guild in db["guilds"].find():
-            backup_db["guilds"].insert_one(guild)
+        async for guild in db["guilds"].find():
+            await backup_db["guilds"].insert_one(guild)
 
         await message.edit(content="""
         Status:
@@ -626,8 +590,8 @@ class Owner(commands.Cog, name="owner"):
             Copying reaction roles: :x:
         """)
 
-        for channel in db["ai_channels"].find():
-            backup_db["ai_channels"].insert_one(channel)
+        async for channel in db["ai_channels"].find():
+            await backup_db["ai_channels"].insert_one(channel)
 
         await message.edit(content="""
         Status:
@@ -641,8 +605,8 @@ class Owner(commands.Cog, name="owner"):
             Copying reaction roles: :x:
         """)
 
-        for user in db["users"].find():
-            backup_db["users"].insert_one(user)
+        async for user in db["users"].find():
+            await backup_db["users"].insert_one(user)
 
         await message.edit(content="""
         Status:
@@ -656,8 +620,8 @@ class Owner(commands.Cog, name="owner"):
             Copying reaction roles: :x:
         """)
 
-        for convo in db["ai_convos"].find():
-            backup_db["ai_convos"].insert_one(convo)
+        async for convo in db["ai_convos"].find():
+            await backup_db["ai_convos"].insert_one(convo)
 
         await message.edit(content="""
         Status:
@@ -671,8 +635,8 @@ class Owner(commands.Cog, name="owner"):
             Copying reaction roles: :x:
         """)
 
-        for user in db["users_global"].find():
-            backup_db["users_global"].insert_one(user)
+        async for user in db["users_global"].find():
+            await backup_db["users_global"].insert_one(user)
 
         await message.edit(content="""
         Status:
@@ -686,8 +650,8 @@ class Owner(commands.Cog, name="owner"):
             Copying reaction roles: :x:
         """)
 
-        for starboard in db["starboard"].find():
-            backup_db["starboard"].insert_one(starboard)
+        async for starboard in db["starboard"].find():
+            await backup_db["starboard"].insert_one(starboard)
 
         await message.edit(content="""
         Status:
@@ -701,8 +665,8 @@ class Owner(commands.Cog, name="owner"):
             Copying reaction roles: :tools:
         """)
 
-        for starboard in db["reactionroles"].find():
-            backup_db["reactionroles"].insert_one(starboard)
+        async for starboard in db["reactionroles"].find():
+            await backup_db["reactionroles"].insert_one(starboard)
 
         await message.edit(content="""
         Status:
@@ -725,14 +689,14 @@ class Owner(commands.Cog, name="owner"):
     @commands.is_owner()
     async def force_system_prompt(self, context: Context, *, prompt: str) -> None:
         c = db["guilds"]
-        data = c.find_one({"id": context.guild.id})
+        data = await c.find_one({"id": context.guild.id})
 
         newdata = {
                 "$set": { "system_prompt": prompt }
         }
 
-        c.update_one(
-            { "id": context.guild.id }, newdata
+        await CachedDB.update_one(
+            c, { "id": context.guild.id }, newdata
         )
 
         await context.send("System prompt set to: " + prompt)
@@ -762,11 +726,7 @@ class Owner(commands.Cog, name="owner"):
     @commands.is_owner()
     async def add(self, context: Context, user: discord.User, *, reason: str):
         users = db["users_global"]
-        user_data = users.find_one({"id": user.id})
-
-        if user_data is None:
-            user_data = CONSTANTS.user_global_data_template(user.id)
-            users.insert_one(user_data)
+        user_data = await CachedDB.find_or_create(users, {"id": user.id}, CONSTANTS.user_global_data_template(user.id))
 
         if not "strikes" in user_data:
             user_data["strikes"] = []
@@ -775,7 +735,7 @@ class Owner(commands.Cog, name="owner"):
 
         newdata = {"$set": {"strikes": user_data["strikes"]}}
 
-        users.update_one({"id": user.id}, newdata)
+        await CachedDB.update_one(users, {"id": user.id}, newdata)
 
         await context.send(f"{user.mention} has been striked for **{reason}** | This is strike {len(user_data['strikes'])}")
 
@@ -798,11 +758,7 @@ class Owner(commands.Cog, name="owner"):
     @commands.is_owner()
     async def remove(self, context: Context, user: discord.User, id: int):
         users = db["users_global"]
-        user_data = users.find_one({"id": user.id})
-
-        if user_data is None:
-            user_data = CONSTANTS.user_global_data_template(user.id)
-            users.insert_one(user_data)
+        user_data = await CachedDB.find_or_create(users, {"id": user.id}, CONSTANTS.user_global_data_template(user.id))
 
         if not "strikes" in user_data:
             user_data["strikes"] = []
@@ -816,7 +772,7 @@ class Owner(commands.Cog, name="owner"):
 
         newdata = {"$set": {"strikes": user_data["strikes"]}}
 
-        users.update_one({"id": user.id}, newdata)
+        await CachedDB.update_one(users, {"id": user.id}, newdata)
 
         await context.send(f"Strike **{id}** has been removed from {user.mention}")
 
@@ -839,11 +795,7 @@ class Owner(commands.Cog, name="owner"):
     @commands.is_owner()
     async def list(self, context: Context, user: discord.User):
         users = db["users_global"]
-        user_data = users.find_one({"id": user.id})
-
-        if user_data is None:
-            user_data = CONSTANTS.user_global_data_template(user.id)
-            users.insert_one(user_data)
+        user_data = await CachedDB.find_or_create(users, {"id": user.id}, CONSTANTS.user_global_data_template(user.id))
 
         if not "strikes" in user_data:
             user_data["strikes"] = []
@@ -18,7 +18,7 @@ class ReactionRoles(commands.Cog, name="🇺🇸 Reaction Roles"):
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload) -> None:
-        message_data = await CachedDB.find_one(db["reactionroles"], {"message_id": payload.message_id})
+        message_data = await CachedDB.find_one(db["reactionroles"], {"message_id": payload.message_id}, cache_missing=True)
         if not message_data:
             return
 
@@ -53,7 +53,7 @@ class ReactionRoles(commands.Cog, name="🇺🇸 Reaction Roles"):
 
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload) -> None:
-        message_data = await CachedDB.find_one(db["reactionroles"], {"message_id": payload.message_id})
+        message_data = await CachedDB.find_one(db["reactionroles"], {"message_id": payload.message_id}, cache_missing=True)
         if not message_data:
             return
 
@@ -157,7 +157,7 @@ class ReactionRoles(commands.Cog, name="🇺🇸 Reaction Roles"):
         message_data = await CachedDB.find_one(db["reactionroles"], {"message_id": message_id})
 
         if not message_data:
-            db["reactionroles"].insert_one({
+            await CachedDB.insert_one(db["reactionroles"], {
                 "message_id": message_id,
                 "roles": {emoji_id: str(role.id)}
             })
@@ -8,9 +8,9 @@ import os
 
 logger = logging.getLogger("discord_bot")
 
-from discord.ext import commands, tasks
+from discord.ext import commands
 from discord.ext.commands import Context
-from utils import CONSTANTS, DBClient, Checks, CachedDB
+from utils import CONSTANTS, DBClient, Checks, CachedDB, EventContext, GuildFeatures, SharedCounter, AuditLogIndex, ChannelLayout, BulkOverwrites, WebhookCache, Whitelist, MessageScanner
 
 KICK_TRESHOLD = 5
 BAN_TRESHOLD = 3
@@ -21,13 +21,12 @@ WEBHOOK_TRESHOLD = 40
 client = DBClient.client
 db = client.potatobot
 
-ban_cache = {}
-kick_cache = {}
-ping_cache = {}
-webhook_cache = {}
-delete_cache = {}
-
-deleted_channels = {}
+# Actions per (guild_id, user_id), or (guild_id, webhook_id), over the last 10 minutes, shared through redis
+ban_counter = SharedCounter.SharedCounter("ban", window=600)
+kick_counter = SharedCounter.SharedCounter("kick", window=600)
+ping_counter = SharedCounter.SharedCounter("ping", window=600)
+webhook_counter = SharedCounter.SharedCounter("webhook", window=600)
+delete_counter = SharedCounter.SharedCounter("delete", window=600)
 
 users_cant_be_moderated = []
 
@@ -35,234 +34,203 @@ class Security(commands.Cog, name="🛡️ Security"):
     def __init__(self, bot) -> None:
         self.bot = bot
         self.users_cant_be_moderated = users_cant_be_moderated
-        self.clear_cache.start()
-
-    @tasks.loop(minutes=10)
-    async def clear_cache(self) -> None:
-        ban_cache.clear()
-        kick_cache.clear()
-        ping_cache.clear()
-        webhook_cache.clear()
-        delete_cache.clear()
-
-        deleted_channels.clear()
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message) -> None:
         if message.author == self.bot.user:
             return
 
+        if not GuildFeatures.enabled(message.guild.id, GuildFeatures.ANTI_WEBHOOK_SPAM | GuildFeatures.ANTI_MASSPING):
+            return
+
         if message.author == message.guild.owner:
             return
 
         if message.webhook_id:
-            try:
-                webhook = await self.bot.fetch_webhook(message.webhook_id)
-            except discord.NotFound:
-                webhook = None
+            webhook = await WebhookCache.get(self.bot, message.webhook_id)
 
             if not webhook:
                 return
 
-            if message.webhook_id in webhook_cache:
-                webhook_cache[message.webhook_id] += 1
-
-                if "@everyone" in message.content.lower() or "@here" in message.content.lower():
-                    webhook_cache[message.webhook_id] += 11
+            messages = 1
 
-                if webhook_cache[message.webhook_id] > WEBHOOK_TRESHOLD:
-                    guilds = db["guilds"]
-                    data = guilds.find_one({"id": message.guild.id})
+            if MessageScanner.MASS_MENTION in MessageScanner.cached_categories(message.content):
+                messages += 11
 
-                    if not data:
-                        data = CONSTANTS.guild_data_template(message.guild.id)
-                        guilds.insert_one(data)
+            if await webhook_counter.add((message.guild.id, message.webhook_id), messages, WEBHOOK_TRESHOLD) > WEBHOOK_TRESHOLD:
+                data = await EventContext.for_message(message).guild()
 
-                    if not "security" in data:
-                        return
-
-                    if "anti_webhook_spam" not in data["security"]["antinuke"]:
-                        return
-
-                    if not data["security"]["antinuke"]["anti_webhook_spam"]:
-                        return
-
-                    await message.delete()
+                if not "security" in data:
+                    return
 
+                if "anti_webhook_spam" not in data["security"]["antinuke"]:
+                    return
 
-                    log_channel = message.guild.get_channel(data["log_channel"])
+                if not data["security"]["antinuke"]["anti_webhook_spam"]:
+                    return
 
-                    try:
-                        await webhook.delete()
+                await message.delete()
 
-                        embed = discord.Embed(
-                            title="AntiSpam Warning",
-                            description=f"Webhook **{message.webhook_id}** has been deleted for spamming",
-                            color=0x77dd77
-                        )
 
-                        if log_channel != None:
-                            await log_channel.send(embed=embed)
-                    except:
-                        embed = discord.Embed(
-                            title="AntiSpam Warning",
-                            description=f"Unable to delete webhook **{message.webhook_id}** for spamming, please delete it manually",
-                            color=0xff6961
-                        )
+                log_channel = message.guild.get_channel(data["log_channel"])
 
-                        if log_channel != None:
-                            await log_channel.send(embed=embed)
+                try:
+                    await webhook.delete()
+                    WebhookCache.mark_deleted(webhook.id)
 
+                    embed = discord.Embed(
+                        title="AntiSpam Warning",
+                        description=f"Webhook **{message.webhook_id}** has been deleted for spamming",
+                        color=0x77dd77
+                    )
 
+                    if log_channel != None:
+                        await log_channel.send(embed=embed)
+                except:
                     embed = discord.Embed(
                         title="AntiSpam Warning",
-                        description=f"Webhook **{message.webhook_id}** has triggered the antispam system, last message: `{message.content}`",
-                        color=0xfdfd96
+                        description=f"Unable to delete webhook **{message.webhook_id}** for spamming, please delete it manually",
+                        color=0xff6961
                     )
 
                     if log_channel != None:
                         await log_channel.send(embed=embed)
-            else:
-                webhook_cache[message.webhook_id] = 1
 
-        if message.author in ping_cache:
-            if len(message.role_mentions) > 0:
-                if message.author.guild_permissions.mention_everyone:
-                    ping_cache[message.author] += len(message.role_mentions) * 2
 
-            if "@everyone" in message.content.lower() or "@here" in message.content.lower():
-                if message.author.guild_permissions.mention_everyone:
-                    ping_cache[message.author] += 1
+                embed = discord.Embed(
+                    title="AntiSpam Warning",
+                    description=f"Webhook **{message.webhook_id}** has triggered the antispam system, last message: `{message.content}`",
+                    color=0xfdfd96
+                )
 
-            if ping_cache[message.author] > PING_TRESHOLD:
-                ping_cache[message.author] = 0
+                if log_channel != None:
+                    await log_channel.send(embed=embed)
 
-                users = db["users"]
-                user_data = await CachedDB.find_one(users, {"id": message.author.id, "guild_id": message.guild.id})
+        # Webhook authors have no permissions and can't be timed out
+        if not isinstance(message.author, discord.Member):
+            return
 
-                if not user_data:
-                    user_data = CONSTANTS.user_data_template(message.author.id, message.guild.id)
-                    users.insert_one(user_data)
+        pings = 0
 
-                if "whitelisted" in user_data:
-                    if user_data["whitelisted"]:
-                        return
+        if message.author.guild_permissions.mention_everyone:
+            pings += len(message.role_mentions) * 2
 
-                guilds = db["guilds"]
-                data = guilds.find_one({"id": message.guild.id})
+            if MessageScanner.MASS_MENTION in MessageScanner.cached_categories(message.content):
+                pings += 1
 
-                if not data:
-                    data = CONSTANTS.guild_data_template(message.guild.id)
-                    guilds.insert_one(data)
+        if not pings:
+            return
 
-                if not "security" in data:
-                    return
+        key = (message.guild.id, message.author.id)
 
-                if "anti_massping" not in data["security"]["antinuke"]:
-                    return
+        if await ping_counter.add(key, pings, PING_TRESHOLD) > PING_TRESHOLD:
+            await ping_counter.reset(key)
 
-                if not data["security"]["antinuke"]["anti_massping"]:
-                    return
+            if await Whitelist.is_whitelisted(message.guild.id, message.author.id):
+                return
 
-                await message.delete()
+            data = await EventContext.for_message(message).guild()
 
-                embed = discord.Embed(
-                    title="AntiSpam Warning",
-                    description=f"**{message.author.mention}** has triggered the antispam system, last message: `{message.content}`",
-                    color=0xfdfd96
-                )
+            if not "security" in data:
+                return
 
-                try:
-                    await message.channel.send(embed=embed)
-                except:
-                    pass
+            if "anti_massping" not in data["security"]["antinuke"]:
+                return
 
-                log_channel = message.guild.get_channel(data["log_channel"])
+            if not data["security"]["antinuke"]["anti_massping"]:
+                return
 
-                if log_channel != None:
-                    await log_channel.send(embed=embed)
+            await message.delete()
 
-                try:
-                    if message.author.id in self.users_cant_be_moderated:
-                        return
+            embed = discord.Embed(
+                title="AntiSpam Warning",
+                description=f"**{message.author.mention}** has triggered the antispam system, last message: `{message.content}`",
+                color=0xfdfd96
+            )
 
-                    try:
-                        embed = discord.Embed(
-                            title="You have been muted",
-                            description=f"You have been muted for an hour in **{message.guild.name}** for mass pinging",
-                            color=0xff6961
-                        )
+            try:
+                await message.channel.send(embed=embed)
+            except:
+                pass
 
-                        await message.author.send(embed=embed)
-                    except:
-                        pass
+            log_channel = message.guild.get_channel(data["log_channel"])
+
+            if log_channel != None:
+                await log_channel.send(embed=embed)
 
-                    await message.author.timeout(datetime.timedelta(hours=1), reason="Mass pinging")
-                    ban_cache[self.bot.user] = 0
+            try:
+                if message.author.id in self.users_cant_be_moderated:
+                    return
 
+                try:
                     embed = discord.Embed(
-                        title="User Muted",
-                        description=f"**{message.author.mention}** has been muted for mass pinging",
+                        title="You have been muted",
+                        description=f"You have been muted for an hour in **{message.guild.name}** for mass pinging",
                         color=0xff6961
                     )
 
-                    if log_channel != None:
-                        await log_channel.send(embed=embed)
-                except discord.Forbidden:
-                    self.users_cant_be_moderated.append(message.author.id)
-        else:
-            ping_cache[message.author] = 0
+                    await message.author.send(embed=embed)
+                except:
+                    pass
+
+                await message.author.timeout(datetime.timedelta(hours=1), reason="Mass pinging")
+
+                embed = discord.Embed(
+                    title="User Muted",
+                    description=f"**{message.author.mention}** has been muted for mass pinging",
+                    color=0xff6961
+                )
+
+                if log_channel != None:
+                    await log_channel.send(embed=embed)
+            except discord.Forbidden:
+                self.users_cant_be_moderated.append(message.author.id)
 
-            if "@everyone" in message.content.lower() or "@here" in message.content.lower():
-                if message.author.guild_permissions.mention_everyone:
-                    ping_cache[message.author] += 1
+    @commands.Cog.listener()
+    async def on_audit_log_entry_create(self, entry: discord.AuditLogEntry) -> None:
+        AuditLogIndex.record(entry)
+
+    @commands.Cog.listener()
+    async def on_webhooks_update(self, channel: discord.abc.GuildChannel) -> None:
+        if GuildFeatures.enabled(channel.guild.id, GuildFeatures.ANTI_WEBHOOK_SPAM):
+            await WebhookCache.refresh_channel(channel)
 
     @commands.Cog.listener()
     async def on_guild_role_create(self, role: discord.Role) -> None:
+        if not GuildFeatures.enabled(role.guild.id, GuildFeatures.ANTI_DANGER_PERMS):
+            return
+
         if role.permissions.administrator:
             guilds = db["guilds"]
-            guild = guilds.find_one({"id": role.guild.id})
-
-            if not guild:
-                guild = CONSTANTS.guild_data_template(role.guild.id)
-                guilds.insert_one(guild)
+            guild = await CachedDB.find_or_create(guilds, {"id": role.guild.id}, CONSTANTS.guild_data_template(role.guild.id))
 
             if guild and "security" in guild and "antinuke" in guild["security"]:
                 antinuke = guild["security"]["antinuke"]
                 if antinuke.get("anti_danger_perms", False):
                     discord_guild = role.guild
-                    user = None
+                    user = await AuditLogIndex.actor(discord_guild, discord.AuditLogAction.role_create, role.id)
 
-                    async for entry in discord_guild.audit_logs(action=discord.AuditLogAction.role_create, limit=2):
-                        if entry.target == role:
-                            user = entry.user
+                    if not user:
+                        return
 
                     if user == discord_guild.owner:
                         return
 
-                    users = db["users"]
-                    user_data = users.find_one({"id": user.id, "guild_id": role.guild.id})
-
-                    if not user_data:
-                        user_data = CONSTANTS.user_data_template(user.id, role.guild.id)
-                        users.insert_one(user_data)
-
-                    if "whitelisted" in user_data:
-                        if user_data["whitelisted"]:
-                            embed = discord.Embed(
-                                title="AntiNuke Warning",
-                                description=f"**{user.mention}** created a dangerous role",
-                                color=0xfdfd96
-                            )
-
-                            log_channel = role.guild.get_channel(guild["log_channel"])
+                    if await Whitelist.is_whitelisted(role.guild.id, user.id):
+                        embed = discord.Embed(
+                            title="AntiNuke Warning",
+                            description=f"**{user.mention}** created a dangerous role",
+                            color=0xfdfd96
+                        )
 
-                            if log_channel is None:
-                                return
+                        log_channel = role.guild.get_channel(guild["log_channel"])
 
-                            await log_channel.send(embed=embed)
+                        if log_channel is None:
                             return
 
+                        await log_channel.send(embed=embed)
+                        return
+
                     try:
                         await role.delete()
                     except discord.Forbidden:
@@ -288,25 +256,18 @@ class Security(commands.Cog, name="🛡️ Security"):
 
     @commands.Cog.listener()
     async def on_guild_role_update(self, before: discord.Role, after: discord.Role) -> None:
+        if not GuildFeatures.enabled(after.guild.id, GuildFeatures.ANTI_DANGER_PERMS):
+            return
+
         if after.permissions.administrator and not before.permissions.administrator:
             guilds = db["guilds"]
-            guild = guilds.find_one({"id": after.guild.id})
-
-            if not guild:
-                guild = CONSTANTS.guild_data_template(after.guild.id)
-                guilds.insert_one(guild)
+            guild = await CachedDB.find_or_create(guilds, {"id": after.guild.id}, CONSTANTS.guild_data_template(after.guild.id))
 
             if guild and "security" in guild and "antinuke" in guild["security"]:
                 antinuke = guild["security"]["antinuke"]
                 if antinuke.get("anti_danger_perms", False):
                     discord_guild = before.guild
-                    user = None
-
-                    async for entry in discord_guild.audit_logs(action=discord.AuditLogAction.role_update, limit=2):
-                        if entry.target == before or after:
-                            if user == discord_guild.owner:
-                                continue
-                            user = entry.user
+                    user = await AuditLogIndex.actor(discord_guild, discord.AuditLogAction.role_update, after.id)
 
                     if user == discord_guild.owner:
                         return
@@ -314,29 +275,21 @@ class Security(commands.Cog, name="🛡️ Security"):
                     if not user:
                         return
 
-                    users = db["users"]
-                    user_data = users.find_one({"id": user.id, "guild_id": after.guild.id})
-
-                    if not user_data:
-                        user_data = CONSTANTS.user_data_template(user.id, after.guild.id)
-                        users.insert_one(user_data)
-
-                    if "whitelisted" in user_data:
-                        if user_data["whitelisted"]:
-                            embed = discord.Embed(
-                                title="AntiNuke Warning",
-                                description=f"**{user.mention}** gave **{after.mention}** dangerous permissions",
-                                color=0xfdfd96
-                            )
-
-                            log_channel = after.guild.get_channel(guild["log_channel"])
+                    if await Whitelist.is_whitelisted(after.guild.id, user.id):
+                        embed = discord.Embed(
+                            title="AntiNuke Warning",
+                            description=f"**{user.mention}** gave **{after.mention}** dangerous permissions",
+                            color=0xfdfd96
+                        )
 
-                            if log_channel is None:
-                                return
+                        log_channel = after.guild.get_channel(guild["log_channel"])
 
-                            await log_channel.send(embed=embed)
+                        if log_channel is None:
                             return
 
+                        await log_channel.send(embed=embed)
+                        return
+
                     await after.edit(permissions=before.permissions)
 
                     log_channel = after.guild.get_channel(guild["log_channel"])
@@ -362,23 +315,16 @@ class Security(commands.Cog, name="🛡️ Security"):
 
     @commands.Cog.listener()
     async def on_member_ban(self, discord_guild: discord.Guild, banned_user: discord.User) -> None:
-        guilds = db["guilds"]
-        guild = guilds.find_one({"id": discord_guild.id})
+        if not GuildFeatures.enabled(discord_guild.id, GuildFeatures.ANTI_MASSBAN):
+            return
 
-        if not guild:
-            guild = CONSTANTS.guild_data_template(discord_guild.id)
-            guilds.insert_one(guild)
+        guilds = db["guilds"]
+        guild = await CachedDB.find_or_create(guilds, {"id": discord_guild.id}, CONSTANTS.guild_data_template(discord_guild.id))
 
         if guild and "security" in guild and "antinuke" in guild["security"]:
             antinuke = guild["security"]["antinuke"]
             if antinuke.get("anti_massban", False):
-                user = None
-
-                await asyncio.sleep(0.5)
-
-                async for entry in discord_guild.audit_logs(action=discord.AuditLogAction.ban, limit=2):
-                    if entry.target == banned_user:
-                        user = entry.user
+                user = await AuditLogIndex.actor(discord_guild, discord.AuditLogAction.ban, banned_user.id)
 
                 if not user:
                     return
@@ -386,29 +332,13 @@ class Security(commands.Cog, name="🛡️ Security"):
                 if user == discord_guild.owner:
                     return
 
-                users = db["users"]
-                user_data = users.find_one({"id": user.id, "guild_id": discord_guild.id})
-
-                if not user_data:
-                    user_data = CONSTANTS.user_data_template(user.id, discord_guild.id)
-                    users.insert_one(user_data)
-
-                if "whitelisted" in user_data:
-                    if user_data["whitelisted"]:
-                        return
-
-                over_limit = False
+                if await Whitelist.is_whitelisted(discord_guild.id, user.id):
+                    return
 
-                if user in ban_cache:
-                    ban_cache[user] += 1
-                    if ban_cache[user] > BAN_TRESHOLD:
-                        over_limit = True
-                else:
-                    ban_cache[user] = 1
+                over_limit = await ban_counter.add((discord_guild.id, user.id), threshold=BAN_TRESHOLD) > BAN_TRESHOLD
 
                 if over_limit:
                     await discord_guild.unban(banned_user, reason="Mass ban detected")
-                    ban_cache[self.bot.user] = 0
 
                     embed = discord.Embed(
                         title="AntiNuke Warning",
@@ -423,8 +353,7 @@ class Security(commands.Cog, name="🛡️ Security"):
 
                     try:
                         await discord_guild.ban(user, reason="AntiNuke Alert - Mass ban detected")
-                        ban_cache[self.bot.user] = 0
-
+    
                         embed = discord.Embed(
                             title="User Banned",
                             description=f"**{user.mention}** has been banned for trying to mass ban members!",
@@ -445,21 +374,16 @@ class Security(commands.Cog, name="🛡️ Security"):
 
     @commands.Cog.listener()
     async def on_member_remove(self, member: discord.Member) -> None:
-        guilds = db["guilds"]
-        guild = guilds.find_one({"id": member.guild.id})
+        if not GuildFeatures.enabled(member.guild.id, GuildFeatures.ANTI_MASSKICK):
+            return
 
-        if not guild:
-            guild = CONSTANTS.guild_data_template(member.guild.id)
-            guilds.insert_one(guild)
+        guilds = db["guilds"]
+        guild = await CachedDB.find_or_create(guilds, {"id": member.guild.id}, CONSTANTS.guild_data_template(member.guild.id))
 
         if guild and "security" in guild and "antinuke" in guild["security"]:
             antinuke = guild["security"]["antinuke"]
             if antinuke.get("anti_masskick", False):
-                user = None
-
-                async for entry in member.guild.audit_logs(action=discord.AuditLogAction.kick, limit=2):
-                    if entry.target == member:
-                        user = entry.user
+                user = await AuditLogIndex.actor(member.guild, discord.AuditLogAction.kick, member.id)
 
                 if not user:
                     return
@@ -467,25 +391,10 @@ class Security(commands.Cog, name="🛡️ Security"):
                 if user == member.guild.owner:
                     return
 
-                users = db["users"]
-                user_data = users.find_one({"id": user.id, "guild_id": member.guild.id})
-
-                if not user_data:
-                    user_data = CONSTANTS.user_data_template(user.id, member.guild.id)
-                    users.insert_one(user_data)
-
-                if "whitelisted" in user_data:
-                    if user_data["whitelisted"]:
-                        return
-
-                over_limit = False
+                if await Whitelist.is_whitelisted(member.guild.id, user.id):
+                    return
 
-                if user in kick_cache:
-                    kick_cache[user] += 1
-                    if kick_cache[user] > KICK_TRESHOLD:
-                        over_limit = True
-                else:
-                    kick_cache[user] = 1
+                over_limit = await kick_counter.add((member.guild.id, user.id), threshold=KICK_TRESHOLD) > KICK_TRESHOLD
 
                 if over_limit:
                     embed = discord.Embed(
@@ -501,8 +410,7 @@ class Security(commands.Cog, name="🛡️ Security"):
 
                     try:
                         await member.guild.ban(user, reason="AntiNuke Alert - Mass kick detected")
-                        ban_cache[self.bot.user] = 0
-
+    
                         embed = discord.Embed(
                             title="User Banned",
                             description=f"**{user.mention}** has been banned for trying to mass kick members!",
@@ -523,26 +431,20 @@ class Security(commands.Cog, name="🛡️ Security"):
 
     @commands.Cog.listener()
     async def on_guild_channel_delete(self, channel: discord.TextChannel) -> None:
-        guilds = db["guilds"]
-        guild = guilds.find_one({"id": channel.guild.id})
+        WebhookCache.forget_channel(channel.id)
 
-        if not guild:
-            guild = CONSTANTS.guild_data_template(channel.guild.id)
-            guilds.insert_one(guild)
+        if not GuildFeatures.enabled(channel.guild.id, GuildFeatures.ANTI_MASSDELETE):
+            return
+
+        guilds = db["guilds"]
+        guild = await CachedDB.find_or_create(guilds, {"id": channel.guild.id}, CONSTANTS.guild_data_template(channel.guild.id))
 
         if guild and "security" in guild and "antinuke" in guild["security"]:
             antinuke = guild["security"]["antinuke"]
             if antinuke.get("anti_massdelete", False):
-                user = None
-
-                async for entry in channel.guild.audit_logs(action=discord.AuditLogAction.channel_delete, limit=2):
-                    if entry.target.id == channel.id and entry.user:
-                        user = entry.user
+                ChannelLayout.mark_deleted(channel)
 
-                if channel.guild in deleted_channels:
-                    deleted_channels[channel.guild].append(channel)
-                else:
-                    deleted_channels[channel.guild] = [channel]
+                user = await AuditLogIndex.actor(channel.guild, discord.AuditLogAction.channel_delete, channel.id)
 
                 if not user:
                     return
@@ -550,26 +452,10 @@ class Security(commands.Cog, name="🛡️ Security"):
                 if user == channel.guild.owner:
                     pass
 
-                users = db["users"]
-                user_data = users.find_one({"id": user.id, "guild_id": channel.guild.id})
-
-                if not user_data:
-                    user_data = CONSTANTS.user_data_template(user.id, channel.guild.id)
-                    users.insert_one(user_data)
-
-
-                if "whitelisted" in user_data:
-                    if user_data["whitelisted"]:
-                        return
-
-                over_limit = False
+                if await Whitelist.is_whitelisted(channel.guild.id, user.id):
+                    return
 
-                if user in delete_cache:
-                    delete_cache[user] += 1
-                    if delete_cache[user] > DELETE_TRESHOLD:
-                        over_limit = True
-                else:
-                    delete_cache[user] = 1
+                over_limit = await delete_counter.add((channel.guild.id, user.id), threshold=DELETE_TRESHOLD) > DELETE_TRESHOLD
 
                 if over_limit:
 
@@ -577,8 +463,7 @@ class Security(commands.Cog, name="🛡️ Security"):
 
                     try:
                         await channel.guild.ban(user, reason="AntiNuke Alert - Mass delete detected")
-                        ban_cache[self.bot.user] = 0
-
+    
                         embed = discord.Embed(
                             title="User Banned",
                             description=f"**{user.mention}** has been banned for trying to mass delete channels!",
@@ -602,64 +487,92 @@ class Security(commands.Cog, name="🛡️ Security"):
                         except:
                             pass
 
-                    for del_channel in deleted_channels[channel.guild]:
-                        if not del_channel in deleted_channels[channel.guild]:
-                            return
+                    results = await ChannelLayout.restore(
+                        self.bot, channel.guild, ChannelLayout.take_deleted(channel.guild.id), "AntiNuke Alert - Mass delete detected"
+                    )
 
-                        deleted_channels[channel.guild].remove(del_channel)
+                    restored = [new_channel for _, new_channel in results if isinstance(new_channel, discord.abc.GuildChannel)]
+                    failed = [(stored, e) for stored, e in results if isinstance(e, Exception)]
 
-                        try:
-                            new_channel = await del_channel.clone(reason="AntiNuke Alert - Mass delete detected")
-                            ban_cache[self.bot.user] = 0
+                    if restored:
+                        embed = discord.Embed(
+                            title="Channels Restored",
+                            description=", ".join(new_channel.mention for new_channel in restored) + " have been restored!",
+                            color=0x77dd77
+                        )
 
-                            embed = discord.Embed(
-                                title="Channel Restored",
-                                description=f"**{new_channel.mention}** has been restored!",
-                                color=0x77dd77
-                            )
+                        if log_channel != None:
+                            await log_channel.send(embed=embed)
+
+                    for stored, e in failed:
+                        embed = discord.Embed(
+                            title="Error",
+                            description=f"An error occured while trying to restore channel **{stored['name']}**",
+                            color=0xff6961
+                        )
+
+                        embed.add_field(
+                            name="Error",
+                            value=f"```{e}```"
+                        )
+
+                        if log_channel != None:
+                            await log_channel.send(embed=embed)
 
-                            if log_channel != None:
-                                await log_channel.send(embed=embed)
+                    notices = []
 
+                    for new_channel in restored:
+                        if isinstance(new_channel, discord.TextChannel):
                             embed = discord.Embed(
                                 title="This channel was nuked",
                                 description=f"**{new_channel.mention}** was nuked by **{user.mention}**, channel is restored but message log is gone",
                                 color=0xff6961
                             )
 
-                            await new_channel.send(embed=embed)
+                            notices.append(new_channel.send(embed=embed))
 
-                            await new_channel.edit(position=del_channel.position)
+                    await asyncio.gather(*notices, return_exceptions=True)
 
-                        except Exception as e:
-                            embed = discord.Embed(
-                                title="Error",
-                                description=f"An error occured while trying to restore channel **{del_channel.name}**",
-                                color=0xff6961
-                            )
+    @commands.Cog.listener()
+    async def on_ready(self) -> None:
+        # Layouts from before any nuke, kept current by the channel listeners below
+        for guild in self.bot.guilds:
+            if GuildFeatures.enabled(guild.id, GuildFeatures.ANTI_MASSDELETE):
+                ChannelLayout.layout(guild)
 
-                            embed.add_field(
-                                name="Error",
-                                value=f"```{e}```"
-                            )
+        await BulkOverwrites.resume_all(self.bot)
 
-                            if log_channel != None:
-                                await log_channel.send(embed=embed)
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel) -> None:
+        ChannelLayout.update(channel)
 
-                    await asyncio.sleep(60)
-                    deleted_channels[channel.guild].clear()
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel) -> None:
+        ChannelLayout.update(after)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        ChannelLayout.forget_guild(guild.id)
 
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member):
-        guild = await CachedDB.find_one(db["guilds"], {"id": member.guild.id})
+        flags = GuildFeatures.LOCKDOWN
+
+        if member.bot:
+            # Bot joins are logged and unauthorized ones kicked, nothing to do when neither is set up
+            flags |= GuildFeatures.ANTI_UNAUTHORIZED_BOT | GuildFeatures.LOG_CHANNEL
+
+        if not GuildFeatures.enabled(member.guild.id, flags):
+            return
+
+        guild = await EventContext.for_member_join(member).guild()
 
         if not guild:
             return
 
         if member.bot:
             if not member.public_flags.verified_bot:
-                guilds = db["guilds"]
-                data = await CachedDB.find_one(guilds, {"id": member.guild.id})
+                data = await EventContext.for_member_join(member).guild()
 
                 if not data:
                     return
@@ -775,11 +688,7 @@ class Security(commands.Cog, name="🛡️ Security"):
             return
 
         users = db["users"]
-        user_data = users.find_one({"id": user.id, "guild_id": context.guild.id})
-
-        if not user:
-            user_data = CONSTANTS.user_data_template(user.id, context.guild.id)
-            users.insert_one(user_data)
+        await CachedDB.find_or_create(users, {"id": user.id, "guild_id": context.guild.id}, CONSTANTS.user_data_template(user.id, context.guild.id))
 
         newdata = {
             "$set": {
@@ -787,7 +696,7 @@ class Security(commands.Cog, name="🛡️ Security"):
             }
         }
 
-        users.update_one({"id": user.id, "guild_id": context.guild.id}, newdata)
+        await CachedDB.update_one(users, {"id": user.id, "guild_id": context.guild.id}, newdata)
 
         await context.send(f"Whitelisted {user.mention}")
 
@@ -805,11 +714,7 @@ class Security(commands.Cog, name="🛡️ Security"):
             return
 
         users = db["users"]
-        user_data = users.find_one({"id": user.id, "guild_id": context.guild.id})
-
-        if not user:
-            user_data = CONSTANTS.user_data_template(user.id, context.guild.id)
-            users.insert_one(user_data)
+        await CachedDB.find_or_create(users, {"id": user.id, "guild_id": context.guild.id}, CONSTANTS.user_data_template(user.id, context.guild.id))
 
         newdata = {
             "$set": {
@@ -817,7 +722,7 @@ class Security(commands.Cog, name="🛡️ Security"):
             }
         }
 
-        users.update_one({"id": user.id, "guild_id": context.guild.id}, newdata)
+        await CachedDB.update_one(users, {"id": user.id, "guild_id": context.guild.id}, newdata)
 
         await context.send(f"Unwhitelisted {user.mention}")
 
@@ -828,15 +733,15 @@ class Security(commands.Cog, name="🛡️ Security"):
     )
     @commands.check(Checks.is_not_blacklisted)
     async def list(self, context: Context) -> None:
-        users = db["users"]
-
-        whitelisted = users.find({"guild_id": context.guild.id, "whitelisted": True})
+        members = await Whitelist.members_of(context.guild.id)
 
         list = "```"
 
-        for user in whitelisted:
-            user = context.guild.get_member(user["id"])
-            list += f"{user.name}\n"
+        for user_id in members["whitelisted"]:
+            user = context.guild.get_member(user_id)
+
+            if user:
+                list += f"{user.name}\n"
 
         list += "```"
 
@@ -884,11 +789,7 @@ class Security(commands.Cog, name="🛡️ Security"):
             return
 
         users = db["users"]
-        user_data = users.find_one({"id": user.id, "guild_id": context.guild.id})
-
-        if not user:
-            user_data = CONSTANTS.user_data_template(user.id, context.guild.id)
-            users.insert_one(user_data)
+        await CachedDB.find_or_create(users, {"id": user.id, "guild_id": context.guild.id}, CONSTANTS.user_data_template(user.id, context.guild.id))
 
         newdata = {
             "$set": {
@@ -896,7 +797,7 @@ class Security(commands.Cog, name="🛡️ Security"):
             }
         }
 
-        users.update_one({"id": user.id, "guild_id": context.guild.id}, newdata)
+        await CachedDB.update_one(users, {"id": user.id, "guild_id": context.guild.id}, newdata)
 
         await context.send(f"Trusted {user.mention}")
 
@@ -914,11 +815,7 @@ class Security(commands.Cog, name="🛡️ Security"):
             return
 
         users = db["users"]
-        user_data = users.find_one({"id": user.id, "guild_id": context.guild.id})
-
-        if not user:
-            user_data = CONSTANTS.user_data_template(user.id, context.guild.id)
-            users.insert_one(user_data)
+        await CachedDB.find_or_create(users, {"id": user.id, "guild_id": context.guild.id}, CONSTANTS.user_data_template(user.id, context.guild.id))
 
         newdata = {
             "$set": {
@@ -926,7 +823,7 @@ class Security(commands.Cog, name="🛡️ Security"):
             }
         }
 
-        users.update_one({"id": user.id, "guild_id": context.guild.id}, newdata)
+        await CachedDB.update_one(users, {"id": user.id, "guild_id": context.guild.id}, newdata)
 
         await context.send(f"Untrusted {user.mention}")
 
@@ -937,15 +834,15 @@ class Security(commands.Cog, name="🛡️ Security"):
     )
     @commands.check(Checks.is_not_blacklisted)
     async def trusted_list(self, context: Context) -> None:
-        users = db["users"]
-
-        whitelisted = users.find({"guild_id": context.guild.id, "trusted": True})
+        members = await Whitelist.members_of(context.guild.id)
 
         list = "```"
 
-        for user in whitelisted:
-            user = context.guild.get_member(user["id"])
-            list += f"{user.name}\n"
+        for user_id in members["trusted"]:
+            user = context.guild.get_member(user_id)
+
+            if user:
+                list += f"{user.name}\n"
 
         list += "```"
 
@@ -992,26 +889,12 @@ class Security(commands.Cog, name="🛡️ Security"):
         guild_owner = context.guild.owner
 
         if context.author != guild_owner:
-            users = db["users"]
-            user_data = users.find_one({"id": context.author.id, "guild_id": context.guild.id})
-
-            if not user_data:
-                user_data = CONSTANTS.user_data_template(context.author.id, context.guild.id)
-                users.insert_one(user_data)
-
-            if "trusted" in user_data:
-                if not user_data["trusted"]:
-                    await context.send("You must be the guild owner or trusted to use this command!")
-                    return
-            else:
+            if not await Whitelist.is_trusted(context.guild.id, context.author.id):
+                await context.send("You must be the guild owner or trusted to use this command!")
                 return
 
         guilds = db["guilds"]
-        guild = guilds.find_one({"id": context.guild.id})
-
-        if not guild:
-            guild = CONSTANTS.guild_data_template(context.guild.id)
-            guilds.insert_one(guild)
+        guild = await CachedDB.find_or_create(guilds, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         if "security" not in guild:
             newdata = {
@@ -1031,7 +914,7 @@ class Security(commands.Cog, name="🛡️ Security"):
                 }
             }
 
-            guilds.update_one({"id": context.guild.id}, newdata)
+            await CachedDB.update_one(guilds, {"id": context.guild.id}, newdata)
         else:
             newdata = {
                 "$set": {
@@ -1039,7 +922,7 @@ class Security(commands.Cog, name="🛡️ Security"):
                 }
             }
 
-            guilds.update_one({"id": context.guild.id}, newdata)
+            await CachedDB.update_one(guilds, {"id": context.guild.id}, newdata)
 
         await context.send(f"Set `anti_danger_perms` to `{enabled}`")
 
@@ -1053,26 +936,12 @@ class Security(commands.Cog, name="🛡️ Security"):
         guild_owner = context.guild.owner
 
         if context.author != guild_owner:
-            users = db["users"]
-            user_data = users.find_one({"id": context.author.id, "guild_id": context.guild.id})
-
-            if not user_data:
-                user_data = CONSTANTS.user_data_template(context.author.id, context.guild.id)
-                users.insert_one(user_data)
-
-            if "trusted" in user_data:
-                if not user_data["trusted"]:
-                    await context.send("You must be the guild owner or trusted to use this command!")
-                    return
-            else:
+            if not await Whitelist.is_trusted(context.guild.id, context.author.id):
+                await context.send("You must be the guild owner or trusted to use this command!")
                 return
 
         guilds = db["guilds"]
-        guild = guilds.find_one({"id": context.guild.id})
-
-        if not guild:
-            guild = CONSTANTS.guild_data_template(context.guild.id)
-            guilds.insert_one(guild)
+        guild = await CachedDB.find_or_create(guilds, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         if "security" not in guild:
             newdata = {
@@ -1091,7 +960,7 @@ class Security(commands.Cog, name="🛡️ Security"):
                 }
             }
 
-            guilds.update_one({"id": context.guild.id}, newdata)
+            await CachedDB.update_one(guilds, {"id": context.guild.id}, newdata)
         else:
             newdata = {
                 "$set": {
@@ -1099,7 +968,7 @@ class Security(commands.Cog, name="🛡️ Security"):
                 }
             }
 
-            guilds.update_one({"id": context.guild.id}, newdata)
+            await CachedDB.update_one(guilds, {"id": context.guild.id}, newdata)
 
         await context.send(f"Set `anti_massban` to `{enabled}`")
 
@@ -1113,27 +982,13 @@ class Security(commands.Cog, name="🛡️ Security"):
         guild_owner = context.guild.owner
 
         if context.author != guild_owner:
-            users = db["users"]
-            user_data = users.find_one({"id": context.author.id, "guild_id": context.guild.id})
-
-            if not user_data:
-                user_data = CONSTANTS.user_data_template(context.author.id, context.guild.id)
-                users.insert_one(user_data)
-
-            if "trusted" in user_data:
-                if not user_data["trusted"]:
-                    await context.send("You must be the guild owner or trusted to use this command!")
-                    return
-            else:
+            if not await Whitelist.is_trusted(context.guild.id, context.author.id):
+                await context.send("You must be the guild owner or trusted to use this command!")
                 return
 
 
         guilds = db["guilds"]
-        guild = guilds.find_one({"id": context.guild.id})
-
-        if not guild:
-            guild = CONSTANTS.guild_data_template(context.guild.id)
-            guilds.insert_one(guild)
+        guild = await CachedDB.find_or_create(guilds, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         if "security" not in guild:
             newdata = {
@@ -1152,7 +1007,7 @@ class Security(commands.Cog, name="🛡️ Security"):
                 }
             }
 
-            guilds.update_one({"id": context.guild.id}, newdata)
+            await CachedDB.update_one(guilds, {"id": context.guild.id}, newdata)
         else:
             newdata = {
                 "$set": {
@@ -1160,7 +1015,7 @@ class Security(commands.Cog, name="🛡️ Security"):
                 }
             }
 
-            guilds.update_one({"id": context.guild.id}, newdata)
+            await CachedDB.update_one(guilds, {"id": context.guild.id}, newdata)
 
         await context.send(f"Set `anti_masskick` to `{enabled}`")
 
@@ -1174,26 +1029,12 @@ class Security(commands.Cog, name="🛡️ Security"):
         guild_owner = context.guild.owner
 
         if context.author != guild_owner:
-            users = db["users"]
-            user_data = users.find_one({"id": context.author.id, "guild_id": context.guild.id})
-
-            if not user_data:
-                user_data = CONSTANTS.user_data_template(context.author.id, context.guild.id)
-                users.insert_one(user_data)
-
-            if "trusted" in user_data:
-                if not user_data["trusted"]:
-                    await context.send("You must be the guild owner or trusted to use this command!")
-                    return
-            else:
+            if not await Whitelist.is_trusted(context.guild.id, context.author.id):
+                await context.send("You must be the guild owner or trusted to use this command!")
                 return
 
         guilds = db["guilds"]
-        guild = guilds.find_one({"id": context.guild.id})
-
-        if not guild:
-            guild = CONSTANTS.guild_data_template(context.guild.id)
-            guilds.insert_one(guild)
+        guild = await CachedDB.find_or_create(guilds, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         if "security" not in guild:
             newdata = {
@@ -1212,7 +1053,7 @@ class Security(commands.Cog, name="🛡️ Security"):
                 }
             }
 
-            guilds.update_one({"id": context.guild.id}, newdata)
+            await CachedDB.update_one(guilds, {"id": context.guild.id}, newdata)
         else:
             newdata = {
                 "$set": {
@@ -1220,7 +1061,7 @@ class Security(commands.Cog, name="🛡️ Security"):
                 }
             }
 
-            guilds.update_one({"id": context.guild.id}, newdata)
+            await CachedDB.update_one(guilds, {"id": context.guild.id}, newdata)
 
         await context.send(f"Set `anti_massdelete` to `{enabled}`")
 
@@ -1234,27 +1075,12 @@ class Security(commands.Cog, name="🛡️ Security"):
         guild_owner = context.guild.owner
 
         if context.author != guild_owner:
-
-            users = db["users"]
-            user_data = users.find_one({"id": context.author.id, "guild_id": context.guild.id})
-
-            if not user_data:
-                user_data = CONSTANTS.user_data_template(context.author.id, context.guild.id)
-                users.insert_one(user_data)
-
-            if "trusted" in user_data:
-                if not user_data["trusted"]:
-                    await context.send("You must be the guild owner or trusted to use this command!")
-                    return
-            else:
+            if not await Whitelist.is_trusted(context.guild.id, context.author.id):
+                await context.send("You must be the guild owner or trusted to use this command!")
                 return
 
         guilds = db["guilds"]
-        guild = guilds.find_one({"id": context.guild.id})
-
-        if not guild:
-            guild = CONSTANTS.guild_data_template(context.guild.id)
-            guilds.insert_one(guild)
+        guild = await CachedDB.find_or_create(guilds, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         if "security" not in guild:
             newdata = {
@@ -1273,7 +1099,7 @@ class Security(commands.Cog, name="🛡️ Security"):
                 }
             }
 
-            guilds.update_one({"id": context.guild.id}, newdata)
+            await CachedDB.update_one(guilds, {"id": context.guild.id}, newdata)
         else:
             newdata = {
                 "$set": {
@@ -1281,7 +1107,7 @@ class Security(commands.Cog, name="🛡️ Security"):
                 }
             }
 
-            guilds.update_one({"id": context.guild.id}, newdata)
+            await CachedDB.update_one(guilds, {"id": context.guild.id}, newdata)
 
         await context.send(f"Set `anti_massping` to `{enabled}`")
 
@@ -1295,27 +1121,12 @@ class Security(commands.Cog, name="🛡️ Security"):
         guild_owner = context.guild.owner
 
         if context.author != guild_owner:
-
-            users = db["users"]
-            user_data = users.find_one({"id": context.author.id, "guild_id": context.guild.id})
-
-            if not user_data:
-                user_data = CONSTANTS.user_data_template(context.author.id, context.guild.id)
-                users.insert_one(user_data)
-
-            if "trusted" in user_data:
-                if not user_data["trusted"]:
-                    await context.send("You must be the guild owner or trusted to use this command!")
-                    return
-            else:
+            if not await Whitelist.is_trusted(context.guild.id, context.author.id):
+                await context.send("You must be the guild owner or trusted to use this command!")
                 return
 
         guilds = db["guilds"]
-        guild = guilds.find_one({"id": context.guild.id})
-
-        if not guild:
-            guild = CONSTANTS.guild_data_template(context.guild.id)
-            guilds.insert_one(guild)
+        guild = await CachedDB.find_or_create(guilds, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         if "security" not in guild:
             newdata = {
@@ -1334,7 +1145,7 @@ class Security(commands.Cog, name="🛡️ Security"):
                 }
             }
 
-            guilds.update_one({"id": context.guild.id}, newdata)
+            await CachedDB.update_one(guilds, {"id": context.guild.id}, newdata)
         else:
             newdata = {
                 "$set": {
@@ -1342,7 +1153,7 @@ class Security(commands.Cog, name="🛡️ Security"):
                 }
             }
 
-            guilds.update_one({"id": context.guild.id}, newdata)
+            await CachedDB.update_one(guilds, {"id": context.guild.id}, newdata)
 
         await context.send(f"Set `anti_webhook_spam` to `{enabled}`")
 
@@ -1356,26 +1167,12 @@ class Security(commands.Cog, name="🛡️ Security"):
         guild_owner = context.guild.owner
 
         if context.author != guild_owner:
-            users = db["users"]
-            user_data = users.find_one({"id": context.author.id, "guild_id": context.guild.id})
-
-            if not user_data:
-                user_data = CONSTANTS.user_data_template(context.author.id, context.guild.id)
-                users.insert_one(user_data)
-
-            if "trusted" in user_data:
-                if not user_data["trusted"]:
-                    await context.send("You must be the guild owner or trusted to use this command!")
-                    return
-            else:
+            if not await Whitelist.is_trusted(context.guild.id, context.author.id):
+                await context.send("You must be the guild owner or trusted to use this command!")
                 return
 
         guilds = db["guilds"]
-        guild = guilds.find_one({"id": context.guild.id})
-
-        if not guild:
-            guild = CONSTANTS.guild_data_template(context.guild.id)
-            guilds.insert_one(guild)
+        guild = await CachedDB.find_or_create(guilds, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         if "security" not in guild:
             newdata = {
@@ -1394,7 +1191,7 @@ class Security(commands.Cog, name="🛡️ Security"):
                 }
             }
 
-            guilds.update_one({"id": context.guild.id}, newdata)
+            await CachedDB.update_one(guilds, {"id": context.guild.id}, newdata)
         else:
             newdata = {
                 "$set": {
@@ -1402,7 +1199,7 @@ class Security(commands.Cog, name="🛡️ Security"):
                 }
             }
 
-            guilds.update_one({"id": context.guild.id}, newdata)
+            await CachedDB.update_one(guilds, {"id": context.guild.id}, newdata)
 
         await context.send(f"Set `anti_unauthorized_bot` to `{enabled}`")
 
@@ -1445,18 +1242,8 @@ class Security(commands.Cog, name="🛡️ Security"):
             return
 
         if context.author != context.guild.owner:
-            users = db["users"]
-            user_data = users.find_one({"id": context.author.id, "guild_id": context.guild.id})
-
-            if not user_data:
-                user_data = CONSTANTS.user_data_template(context.author.id, context.guild.id)
-                users.insert_one(user_data)
-
-            if "trusted" in user_data:
-                if not user_data["trusted"]:
-                    await context.send("You must be the guild owner or trusted to use this command!")
-                    return
-            else:
+            if not await Whitelist.is_trusted(context.guild.id, context.author.id):
+                await context.send("You must be the guild owner or trusted to use this command!")
                 return
 
         guilds = db["guilds"]
@@ -1485,27 +1272,12 @@ class Security(commands.Cog, name="🛡️ Security"):
         guild_owner = context.guild.owner
 
         if context.author != guild_owner:
-
-            users = db["users"]
-            user_data = users.find_one({"id": context.author.id, "guild_id": context.guild.id})
-
-            if not user_data:
-                user_data = CONSTANTS.user_data_template(context.author.id, context.guild.id)
-                users.insert_one(user_data)
-
-            if "trusted" in user_data:
-                if not user_data["trusted"]:
-                    await context.send("You must be the guild owner or trusted to use this command!")
-                    return
-            else:
+            if not await Whitelist.is_trusted(context.guild.id, context.author.id):
+                await context.send("You must be the guild owner or trusted to use this command!")
                 return
 
         guilds = db["guilds"]
-        guild = guilds.find_one({"id": context.guild.id})
-
-        if not guild:
-            guild = CONSTANTS.guild_data_template(context.guild.id)
-            guilds.insert_one(guild)
+        guild = await CachedDB.find_or_create(guilds, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         embed = discord.Embed(
             title = "Confirm Action",
@@ -1527,44 +1299,66 @@ class Security(commands.Cog, name="🛡️ Security"):
         await context.send("Starting Unlockdown")
 
         if context.author != guild_owner:
-            users = db["users"]
-            user_data = users.find_one({"id": context.author.id, "guild_id": context.guild.id})
-
-            if not user_data:
-                user_data = CONSTANTS.user_data_template(context.author.id, context.guild.id)
-                users.insert_one(user_data)
-
-            if "trusted" in user_data:
-                if not user_data["trusted"]:
-                    await context.send("You must be the guild owner or trusted to use this command!")
-                    return
-            else:
+            if not await Whitelist.is_trusted(context.guild.id, context.author.id):
+                await context.send("You must be the guild owner or trusted to use this command!")
                 return
 
+        # Both jobs write the same overwrites, running them at once would leave whichever finishes last
+        if BulkOverwrites.is_pending(context.guild, "lockdown") or BulkOverwrites.is_pending(context.guild, "unlockdown"):
+            await context.send("A lockdown or unlockdown is still running, try again once it's done")
+            return
+
         guilds = db["guilds"]
-        guild_data = guilds.find_one({"id": context.guild.id})
+        guild_data = await CachedDB.find_or_create(guilds, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
-        if not guild_data:
-            guild_data = CONSTANTS.guild_data_template(context.guild.id)
-            guilds.insert_one(guild_data)
+        oldperms = guild_data.get("oldperms", {})
+        channels = [channel for channel in context.guild.text_channels if str(channel.id) in oldperms]
 
-        if "oldperms" in guild_data:
-            for channel in context.guild.text_channels:
-                channel_id_str = str(channel.id)
-                if channel_id_str in guild_data["oldperms"]:
-                    # Deserialize the permissions
-                    perms_dict = guild_data["oldperms"][channel_id_str]
-                    overwrite = discord.PermissionOverwrite(**perms_dict)
+        # Deserialize the permissions
+        changes = BulkOverwrites.plan(
+            channels, context.guild.default_role, lambda channel, overwrite: discord.PermissionOverwrite(**oldperms[str(channel.id)])
+        )
 
-                    await channel.set_permissions(context.guild.default_role, overwrite=overwrite)
+        message = await context.send(f"Restoring {len(changes)} channels...")
 
-            # Clear oldperms after restoring
-            guilds.update_one({"id": context.guild.id}, {"$unset": {"oldperms": ""}})
+        async def progress(done, total):
+            await message.edit(content=f"Restoring channels... {done}/{total}")
+
+        # finish_unlockdown clears oldperms and the lockdown flag, also when the job is resumed after a restart
+        _, failed = await BulkOverwrites.run(
+            context.guild, "unlockdown", context.guild.default_role, changes, "Server unlockdown", progress, finish="unlockdown"
+        )
+
+        if failed:
+            await context.send(
+                f"Could not restore {len(failed)} channels: " + ", ".join(channel.mention for channel, _ in failed)
+                + ". The server stays in lockdown, run unlockdown again to retry them."
+            )
+            return
 
-        # Update the guild document to indicate the lockdown is over
-        guilds.update_one({"id": context.guild.id}, {"$set": {"lockdown": False}})
         await context.send("Server unlockdown complete.")
 
+async def finish_lockdown(guild, failed):
+    # Channels that couldn't be locked were never changed, so unlockdown has nothing to restore there
+    if failed:
+        await CachedDB.update_one(db["guilds"], {"id": guild.id}, {"$unset": {f"oldperms.{channel_id}": "" for channel_id in failed}})
+
+async def finish_unlockdown(guild, failed):
+    guilds = db["guilds"]
+
+    if not failed:
+        await CachedDB.update_one(guilds, {"id": guild.id}, {"$unset": {"oldperms": ""}, "$set": {"lockdown": False}})
+        return
+
+    # Only the channels that couldn't be restored keep their saved overwrites, for the next unlockdown
+    guild_data = await CachedDB.find_one(guilds, {"id": guild.id}) or {}
+    restored = [channel_id for channel_id in guild_data.get("oldperms", {}) if channel_id not in failed]
+
+    if restored:
+        await CachedDB.update_one(guilds, {"id": guild.id}, {"$unset": {f"oldperms.{channel_id}": "" for channel_id in restored}})
+
+BulkOverwrites.on_finish("lockdown", finish_lockdown)
+BulkOverwrites.on_finish("unlockdown", finish_unlockdown)
 
 class ConfirmView(discord.ui.View):
     def __init__(self, value: str, author: discord.Member):
@@ -1581,22 +1375,24 @@ class ConfirmView(discord.ui.View):
         await interaction.response.defer()
 
         if self.value == "lockdown":
+            if BulkOverwrites.is_pending(interaction.guild, "lockdown") or BulkOverwrites.is_pending(interaction.guild, "unlockdown"):
+                await interaction.message.edit(content="A lockdown or unlockdown is still running, try again once it's done", view=None, embed=None)
+                return
+
             await interaction.message.edit(content="Locking down the server...", view=None, embed=None)
 
-            oldperms = {}
+            guilds = db["guilds"]
+            guild_data = await CachedDB.find_one(guilds, {"id": interaction.guild.id}) or {}
+            default_role = interaction.guild.default_role
+
+            # Saved before anything is changed and never replaced, so running lockdown again after it was
+            # interrupted doesn't save the locked overwrites as the old ones
+            oldperms = guild_data.get("oldperms", {})
 
             for channel in interaction.guild.text_channels:
-                try:
-                    overwrite = channel.overwrites_for(interaction.guild.default_role)
+                if str(channel.id) not in oldperms:
                     # Serialize the PermissionOverwrite object
-                    perms_dict = {perm: value for perm, value in overwrite}
-
-                    oldperms[str(channel.id)] = perms_dict
-
-                    overwrite.send_messages = False
-                    await channel.set_permissions(interaction.guild.default_role, overwrite=overwrite)
-                except:
-                    pass
+                    oldperms[str(channel.id)] = {perm: value for perm, value in channel.overwrites_for(default_role)}
 
             newdata = {
                 "$set": {
@@ -1605,10 +1401,25 @@ class ConfirmView(discord.ui.View):
                 }
             }
 
-            guilds = db["guilds"]
-            guilds.update_one({"id": interaction.guild.id}, newdata)
+            await CachedDB.update_one(guilds, {"id": interaction.guild.id}, newdata)
+
+            def lock(channel, overwrite):
+                overwrite.send_messages = False
+                return overwrite
+
+            changes = BulkOverwrites.plan(interaction.guild.text_channels, default_role, lock)
+
+            async def progress(done, total):
+                await interaction.message.edit(content=f"Locking down the server... {done}/{total}")
+
+            _, failed = await BulkOverwrites.run(interaction.guild, "lockdown", default_role, changes, "Server lockdown", progress, finish="lockdown")
+
+            content = "Server lockdown complete."
+
+            if failed:
+                content = f"Server lockdown incomplete, could not lock {len(failed)} channels: " + ", ".join(channel.mention for channel, _ in failed)
 
-            await interaction.message.edit(content="Server lockdown complete.", view=None, embed=None)
+            await interaction.message.edit(content=content, view=None, embed=None)
 
 
     @discord.ui.button(label="Cancel", style=discord.ButtonStyle.primary)
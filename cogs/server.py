@@ -48,14 +48,13 @@ class Server(commands.Cog, name="⚙️ Server"):
     @commands.has_permissions(manage_channels=True)
     async def prefix(self, context: commands.Context, prefix: str = "none"):
         if prefix == "none":
-            return await context.send("Current prefix is: `" + self.prefixDB.get(str(context.guild.id)) + "`")
+            return await context.send("Current prefix is: `" + self.prefixDB.get(str(context.guild.id), self.bot.config["prefix"]) + "`")
 
         if prefix == "/":
             return await context.send("Prefix cannot be `/`")
 
         guild_id = str(context.guild.id)
         self.prefixDB.set(guild_id, prefix)
-        self.prefixDB.dump()
         await context.send(f"Prefix set to {prefix}")
 
     @commands.hybrid_command(
@@ -67,11 +66,7 @@ class Server(commands.Cog, name="⚙️ Server"):
     @commands.has_permissions(manage_channels=True)
     async def groq_api_key(self, context: commands.Context, key: str):
         c = db["guilds"]
-        data = c.find_one({"id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.guild_data_template(context.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         cipher_suite = Fernet(os.getenv("HASHING_SECRET"))
         cipher_text = cipher_suite.encrypt(key.encode())
@@ -86,7 +81,7 @@ class Server(commands.Cog, name="⚙️ Server"):
 
         newdata = { "$set": { "groq_api_key": cipher_text } }
 
-        c.update_one({"id": context.guild.id}, newdata)
+        await CachedDB.update_one(c, {"id": context.guild.id}, newdata)
 
         await context.send(f"Set groq api key")
 
@@ -178,11 +173,7 @@ class Server(commands.Cog, name="⚙️ Server"):
     @commands.has_permissions(manage_channels=True)
     async def show(self, context: Context) -> None:
         c = db["guilds"]
-        data = c.find_one({"id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.guild_data_template(context.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         embed = discord.Embed(
             title="Server Settings",
@@ -214,15 +205,11 @@ class Server(commands.Cog, name="⚙️ Server"):
     @commands.has_permissions(manage_roles=True)
     async def should_announce_levelup(self, context: Context, enabled: bool) -> None:
         c = db["guilds"]
-        data = c.find_one({"id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.guild_data_template(context.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         newdata = { "$set": { "should_announce_levelup": enabled } }
 
-        c.update_one({"id": context.guild.id}, newdata)
+        await CachedDB.update_one(c, {"id": context.guild.id}, newdata)
 
         await context.send(f"Set should announce levelup to {enabled}")
 
@@ -236,15 +223,11 @@ class Server(commands.Cog, name="⚙️ Server"):
     async def daily_cash(self, context: Context, amount: int) -> None:
         c = db["guilds"]
 
-        data = c.find_one({"id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.guild_data_template(context.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         newdata = { "$set": { "daily_cash": amount } }
 
-        c.update_one({"id": context.guild.id}, newdata)
+        await CachedDB.update_one(c, {"id": context.guild.id}, newdata)
 
         await context.send(f"Set daily cash to {amount}")
 
@@ -258,15 +241,11 @@ class Server(commands.Cog, name="⚙️ Server"):
     async def tickets_category(self, context: Context, category: discord.CategoryChannel) -> None:
         c = db["guilds"]
 
-        data = c.find_one({"id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.guild_data_template(context.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         newdata = { "$set": { "tickets_category": category.id } }
 
-        c.update_one({"id": context.guild.id}, newdata)
+        await CachedDB.update_one(c, {"id": context.guild.id}, newdata)
 
         await context.send(f"Set tickets category to {category.mention}")
 
@@ -280,15 +259,11 @@ class Server(commands.Cog, name="⚙️ Server"):
     async def level_up_channel(self, context: Context, channel: discord.TextChannel) -> None:
         c = db["guilds"]
 
-        data = c.find_one({"id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.guild_data_template(context.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         newdata = { "$set": { "level_announce_channel": channel.id } }
 
-        c.update_one({"id": context.guild.id}, newdata)
+        await CachedDB.update_one(c, {"id": context.guild.id}, newdata)
 
         await context.send(f"Set level announce channel to {channel.mention}")
 
@@ -302,15 +277,11 @@ class Server(commands.Cog, name="⚙️ Server"):
     async def tickets_support_role(self, context: Context, role: discord.Role) -> None:
         c = db["guilds"]
 
-        data = c.find_one({"id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.guild_data_template(context.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         newdata = { "$set": { "tickets_support_role": role.id } }
 
-        c.update_one({"id": context.guild.id}, newdata)
+        await CachedDB.update_one(c, {"id": context.guild.id}, newdata)
 
         await context.send(f"Set tickets support role to {role.mention}")
 
@@ -324,15 +295,11 @@ class Server(commands.Cog, name="⚙️ Server"):
     async def log_channel(self, context: Context, channel: discord.TextChannel) -> None:
         c = db["guilds"]
 
-        data = c.find_one({"id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.guild_data_template(context.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         newdata = { "$set": { "log_channel": channel.id } }
 
-        c.update_one({"id": context.guild.id}, newdata)
+        await CachedDB.update_one(c, {"id": context.guild.id}, newdata)
 
         await context.send(f"Set log channel to {channel.mention}")
 
@@ -346,11 +313,7 @@ class Server(commands.Cog, name="⚙️ Server"):
     async def default_role(self, context: Context, role: discord.Role) -> None:
         c = db["guilds"]
 
-        data = c.find_one({"id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.guild_data_template(context.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         dangerous_permissions = [
             "administrator",
@@ -371,7 +334,7 @@ class Server(commands.Cog, name="⚙️ Server"):
 
         newdata = { "$set": { "default_role": role.id } }
 
-        c.update_one({"id": context.guild.id}, newdata)
+        await CachedDB.update_one(c, {"id": context.guild.id}, newdata)
 
         await context.send(f"Set default role to {role.name}")
 
@@ -384,11 +347,7 @@ class Server(commands.Cog, name="⚙️ Server"):
     @commands.has_permissions(manage_roles=True)
     async def level_roles(self, context: Context) -> None:
         c = db["guilds"]
-        data = c.find_one({"id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.guild_data_template(context.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         embed = discord.Embed(
             title="Level Roles",
@@ -413,11 +372,7 @@ class Server(commands.Cog, name="⚙️ Server"):
     @commands.has_permissions(manage_roles=True)
     async def show_level_roles(self, context: Context) -> None:
         c = db["guilds"]
-        data = c.find_one({"id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.guild_data_template(context.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         embed = discord.Embed(
             title="Level Roles",
@@ -441,17 +396,13 @@ class Server(commands.Cog, name="⚙️ Server"):
     @commands.has_permissions(manage_roles=True)
     async def set(self, context: Context, level: int, role: discord.Role) -> None:
         c = db["guilds"]
-        data = c.find_one({"id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.guild_data_template(context.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         level_roles = data["level_roles"]
         level_roles[str(level)] = role.id
 
         newdata = { "$set": { "level_roles": level_roles } }
-        c.update_one({"id": context.guild.id}, newdata)
+        await CachedDB.update_one(c, {"id": context.guild.id}, newdata)
 
         await context.send(f"Set level {level} role to {role.name}")
 
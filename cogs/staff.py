@@ -11,7 +11,7 @@ from discord import app_commands
 from discord.ext import commands
 from discord.ext.commands import Context
 
-from utils import DBClient, CONSTANTS, Checks, CachedDB
+from utils import DBClient, CONSTANTS, Checks, CachedDB, EventContext, GuildFeatures, BulkOverwrites, JoinPipeline, Whitelist
 
 client = DBClient.client
 db = client.potatobot
@@ -26,15 +26,14 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
         if message.author == self.bot.user or message.author.bot:
             return
 
+        if not GuildFeatures.enabled(message.guild.id, GuildFeatures.LOG_CHANNEL):
+            return
+
         if message.author.guild_permissions.administrator:
             return
 
         c = db["guilds"]
-        data = await CachedDB.find_one(c, {"id": message.guild.id})
-
-        if not data:
-            data = CONSTANTS.guild_data_template(message.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": message.guild.id}, CONSTANTS.guild_data_template(message.guild.id))
 
         if not data["log_channel"]:
             return
@@ -62,6 +61,9 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
         if before.author == self.bot.user or before.author.bot:
             return
 
+        if not GuildFeatures.enabled(before.guild.id, GuildFeatures.LOG_CHANNEL):
+            return
+
         if before.author.guild_permissions.administrator:
             return
 
@@ -69,11 +71,7 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
             return
 
         c = db["guilds"]
-        data = await CachedDB.find_one(c, {"id": before.guild.id})
-
-        if not data:
-            data = CONSTANTS.guild_data_template(before.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": before.guild.id}, CONSTANTS.guild_data_template(before.guild.id))
 
         if not data["log_channel"]:
             return
@@ -103,14 +101,13 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
 
     @commands.Cog.listener()
     async def on_member_remove(self, user: discord.User) -> None:
+        if not GuildFeatures.enabled(user.guild.id, GuildFeatures.LOG_CHANNEL):
+            return
+
         c = db["guilds"]
         guild = user.guild
 
-        data = await CachedDB.find_one(c, {"id": guild.id})
-
-        if not data:
-            data = CONSTANTS.guild_data_template(guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": guild.id}, CONSTANTS.guild_data_template(guild.id))
 
         if not data["log_channel"]:
             return
@@ -130,13 +127,12 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
 
     @commands.Cog.listener()
     async def on_member_ban(self, guild: discord.Guild, user: discord.User) -> None:
-        c = db["guilds"]
+        if not GuildFeatures.enabled(guild.id, GuildFeatures.LOG_CHANNEL):
+            return
 
-        data = await CachedDB.find_one(c, {"id": guild.id})
+        c = db["guilds"]
 
-        if not data:
-            data = CONSTANTS.guild_data_template(guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": guild.id}, CONSTANTS.guild_data_template(guild.id))
 
         if not data["log_channel"]:
             return
@@ -156,13 +152,12 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
 
     @commands.Cog.listener()
     async def on_member_unban(self, guild: discord.Guild, user: discord.User) -> None:
-        c = db["guilds"]
+        if not GuildFeatures.enabled(guild.id, GuildFeatures.LOG_CHANNEL):
+            return
 
-        data = await CachedDB.find_one(c, {"id": guild.id})
+        c = db["guilds"]
 
-        if not data:
-            data = CONSTANTS.guild_data_template(guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": guild.id}, CONSTANTS.guild_data_template(guild.id))
 
         if not data["log_channel"]:
             return
@@ -182,13 +177,12 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
 
     @commands.Cog.listener()
     async def on_member_kick(self, guild: discord.Guild, user: discord.User) -> None:
-        c = db["guilds"]
+        if not GuildFeatures.enabled(guild.id, GuildFeatures.LOG_CHANNEL):
+            return
 
-        data = await CachedDB.find_one(c, {"id": guild.id})
+        c = db["guilds"]
 
-        if not data:
-            data = CONSTANTS.guild_data_template(guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": guild.id}, CONSTANTS.guild_data_template(guild.id))
 
         if not data["log_channel"]:
             return
@@ -211,43 +205,47 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
         if user.bot:
             return
 
-        users = db["users"]
-        user_data = await CachedDB.find_one(users, {"id": user.id})
+        _, raid_started = JoinPipeline.record_join(user.guild.id)
 
         guilds = db["guilds"]
 
-        data = await CachedDB.find_one(guilds, {"id": user.guild.id})
+        data = await EventContext.for_member_join(user).guild()
+
+        if raid_started:
+            log_channel = user.guild.get_channel(data.get("log_channel", 0))
 
+            if log_channel != None:
+                embed = discord.Embed(
+                    title="Raid Detected",
+                    description=f"More than {JoinPipeline.RAID_JOINS} members joined in {JoinPipeline.JOIN_WINDOW} seconds, default roles will be given once it calms down",
+                    color=0xff6961
+                )
 
-        if not data:
-            data = CONSTANTS.guild_data_template(user.guild.id)
-            guilds.insert_one(data)
+                await log_channel.send(embed=embed)
 
-        if user_data:
-            if "jailed" in user_data:
-                if user_data["jailed"]:
-                    if "jail_role" in data:
-                        role = None
-                        jail_channel = None
+        if await Whitelist.is_jailed(user.guild.id, user.id):
+            if "jail_role" in data:
+                role = None
+                jail_channel = None
 
-                        if data["jail_role"] == 0:
-                            role = await user.guild.create_role(name="Jailed", reason="Jail role created by PotatoBot")
-                            data["jail_role"] = role.id
+                if data["jail_role"] == 0:
+                    role = await user.guild.create_role(name="Jailed", reason="Jail role created by PotatoBot")
+                    data["jail_role"] = role.id
 
-                            newdata = {"$set": {"jail_role": role.id}}
-                            guilds.update_one({"id": user.guild.id}, newdata)
-                        else:
-                            role = user.guild.get_role(data["jail_role"])
+                    newdata = {"$set": {"jail_role": role.id}}
+                    await CachedDB.update_one(guilds, {"id": user.guild.id}, newdata)
+                else:
+                    role = user.guild.get_role(data["jail_role"])
 
-                        for old_role in user.roles:
-                            if old_role == user.guild.default_role:
-                                continue
+                for old_role in user.roles:
+                    if old_role == user.guild.default_role:
+                        continue
 
-                            await user.remove_roles(old_role)
+                    await user.remove_roles(old_role)
 
-                        await user.add_roles(role, reason="User is jailed and tried to rejoin")
+                await user.add_roles(role, reason="User is jailed and tried to rejoin")
 
-                        return
+                return
 
         if not "default_role" in data:
             return
@@ -255,11 +253,14 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
         default_role = user.guild.get_role(data["default_role"])
 
         if default_role:
-            await user.add_roles(default_role)
+            await JoinPipeline.assign_default_role(user, default_role)
 
 
     @commands.Cog.listener()
     async def on_bulk_message_delete(self, messages) -> None:
+        if not GuildFeatures.enabled(messages[0].guild.id, GuildFeatures.LOG_CHANNEL):
+            return
+
         embed = discord.Embed(
             title="Bulk Message Delete",
             description=f"{len(messages)} messages were deleted",
@@ -267,11 +268,7 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
         )
 
         c = db["guilds"]
-        data = await CachedDB.find_one(c, {"id": messages[0].guild.id})
-
-        if not data:
-            data = CONSTANTS.guild_data_template(messages[0].guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": messages[0].guild.id}, CONSTANTS.guild_data_template(messages[0].guild.id))
 
         if not data["log_channel"]:
             return
@@ -285,6 +282,9 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
 
     @commands.Cog.listener()
     async def on_guild_channel_create(self, channel: discord.TextChannel):
+        if not GuildFeatures.enabled(channel.guild.id, GuildFeatures.LOG_CHANNEL):
+            return
+
         embed = discord.Embed(
             title = "Channel Created",
             description = f"Channel {channel.mention} was created",
@@ -292,11 +292,7 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
         )
 
         c = db["guilds"]
-        data = c.find_one({"id": channel.guild.id})
-
-        if not data:
-            data = CONSTANTS.guild_data_template(channel.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": channel.guild.id}, CONSTANTS.guild_data_template(channel.guild.id))
 
         if not data["log_channel"]:
             return
@@ -310,6 +306,9 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
 
     @commands.Cog.listener()
     async def on_guild_channel_delete(self, channel: discord.TextChannel):
+        if not GuildFeatures.enabled(channel.guild.id, GuildFeatures.LOG_CHANNEL):
+            return
+
         embed = discord.Embed(
             title = "Channel Deleted",
             description = f"Channel {channel.mention} ({channel.name}) was deleted",
@@ -317,11 +316,7 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
         )
 
         c = db["guilds"]
-        data = c.find_one({"id": channel.guild.id})
-
-        if not data:
-            data = CONSTANTS.guild_data_template(channel.guild.id)
-            c.insert_one(data)
+        data = await CachedDB.find_or_create(c, {"id": channel.guild.id}, CONSTANTS.guild_data_template(channel.guild.id))
 
         if not data["log_channel"]:
             return
@@ -398,11 +393,7 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
                 await context.send(embed=embed)
 
                 guilds = db["guilds"]
-                data = guilds.find_one({"id": context.guild.id})
-
-                if not data:
-                    data = CONSTANTS.guild_data_template(context.guild.id)
-                    guilds.insert_one(data)
+                data = await CachedDB.find_or_create(guilds, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
                 if "log_channel" in data:
                     log_channel = context.guild.get_channel(data["log_channel"])
@@ -508,11 +499,7 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
                 await context.send(embed=embed)
 
                 guilds = db["guilds"]
-                data = guilds.find_one({"id": context.guild.id})
-
-                if not data:
-                    data = CONSTANTS.guild_data_template(context.guild.id)
-                    guilds.insert_one(data)
+                data = await CachedDB.find_or_create(guilds, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
                 if "log_channel" in data:
                     log_channel = context.guild.get_channel(data["log_channel"])
@@ -562,11 +549,7 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
             embed.add_field(name="Reason:", value=reason)
 
             guilds = db["guilds"]
-            data = guilds.find_one({"id": context.guild.id})
-
-            if not data:
-                data = CONSTANTS.guild_data_template(context.guild.id)
-                guilds.insert_one(data)
+            data = await CachedDB.find_or_create(guilds, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
             if "log_channel" in data:
                 log_channel = context.guild.get_channel(data["log_channel"])
@@ -655,11 +638,7 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
                         pass
 
                     guilds = db["guilds"]
-                    guild = guilds.find_one({"id": context.guild.id})
-
-                    if not guild:
-                        guild = CONSTANTS.guild_data_template(context.guild.id)
-                        guilds.insert_one(guild)
+                    guild = await CachedDB.find_or_create(guilds, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
                     if "log_channel" in guild:
                         log_channel = context.guild.get_channel(guild["log_channel"])
@@ -815,11 +794,12 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
         if not channel:
             channel = context.channel
 
-        overwrite = discord.PermissionOverwrite()
         overwrite = channel.overwrites_for(context.guild.default_role)
         overwrite.send_messages = False
 
-        await channel.set_permissions(context.guild.default_role, overwrite=overwrite)
+        # One request, nothing worth keeping a resumable job for
+        await BulkOverwrites.budget.acquire()
+        await channel.set_permissions(context.guild.default_role, overwrite=overwrite, reason=f"Locked by {context.author}")
 
         await context.send(f"{channel.mention} has been locked down")
 
@@ -837,11 +817,13 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
         if not channel:
             channel = context.channel
 
-        overwrite = discord.PermissionOverwrite()
         overwrite = channel.overwrites_for(context.guild.default_role)
         overwrite.send_messages = None
 
-        await channel.set_permissions(context.guild.default_role, overwrite=overwrite)
+        await BulkOverwrites.budget.acquire()
+        await channel.set_permissions(
+            context.guild.default_role, overwrite=None if overwrite.is_empty() else overwrite, reason=f"Unlocked by {context.author}"
+        )
 
         await context.send(f"{channel.mention} has been unlocked")
 
@@ -858,11 +840,7 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
     async def jail(self, context: Context, user: discord.Member, *, reason: str = "Not specified") -> None:
         await context.send("Jailing user... please wait")
         guilds = db["guilds"]
-        data = await CachedDB.find_one(guilds, {"id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.guild_data_template(context.guild.id)
-            guilds.insert_one(data)
+        data = await CachedDB.find_or_create(guilds, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         role = None
         jail_channel = None
@@ -873,7 +851,7 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
                 data["jail_role"] = role.id
 
                 newdata = {"$set": {"jail_role": role.id}}
-                guilds.update_one({"id": context.guild.id}, newdata)
+                await CachedDB.update_one(guilds, {"id": context.guild.id}, newdata)
             else:
                 role = context.guild.get_role(data["jail_role"])
         else:
@@ -881,7 +859,7 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
             data["jail_role"] = role.id
 
             newdata = {"$set": {"jail_role": role.id}}
-            guilds.update_one({"id": context.guild.id}, newdata)
+            await CachedDB.update_one(guilds, {"id": context.guild.id}, newdata)
 
 
         if "jail_channel" in data:
@@ -890,7 +868,7 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
                 data["jail_channel"] = jail_channel.id
 
                 newdata = {"$set": {"jail_channel": jail_channel.id}}
-                guilds.update_one({"id": context.guild.id}, newdata)
+                await CachedDB.update_one(guilds, {"id": context.guild.id}, newdata)
             else:
                 jail_channel = context.guild.get_channel(data["jail_channel"])
         else:
@@ -898,7 +876,7 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
             data["jail_channel"] = jail_channel.id
 
             newdata = {"$set": {"jail_channel": jail_channel.id}}
-            guilds.update_one({"id": context.guild.id}, newdata)
+            await CachedDB.update_one(guilds, {"id": context.guild.id}, newdata)
 
         for old_role in user.roles:
             if old_role == context.guild.default_role:
@@ -908,34 +886,36 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
 
         await user.add_roles(role, reason=reason)
 
-        for channel in context.guild.channels:
-            if channel == jail_channel:
-                continue
+        def hide(channel, overwrite):
+            overwrite.view_channel = False
+            return overwrite
+
+        # Only channels created since the last jail still need the overwrite
+        changes = BulkOverwrites.plan([channel for channel in context.guild.channels if channel != jail_channel], role, hide)
+        # Per jailed user, so two jails running at once keep their own resume state
+        _, failed = await BulkOverwrites.run(context.guild, f"jail:{user.id}", role, changes, reason)
 
-            await channel.set_permissions(role, view_channel=False)
+        if failed:
+            await context.send(f"Could not hide {len(failed)} channels from the jail role: " + ", ".join(channel.mention for channel, _ in failed))
 
         if not jail_channel:
             jail_channel = await context.guild.create_text_channel(name="jail", reason="Jail channel created by PotatoBot")
             data["jail_channel"] = jail_channel.id
 
             newdata = {"$set": {"jail_channel": jail_channel.id}}
-            guilds.update_one({"id": context.guild.id}, newdata)
+            await CachedDB.update_one(guilds, {"id": context.guild.id}, newdata)
 
         await jail_channel.set_permissions(context.guild.default_role, view_channel=False)
         await jail_channel.set_permissions(role, view_channel=True)
 
         users = db["users"]
-        user_data = await CachedDB.find_one(users, {"id": user.id})
-
-        if not user_data:
-            user_data = CONSTANTS.user_data_template(context.guild.id, user.id)
-            users.insert_one(user_data)
+        user_data = await CachedDB.find_or_create(users, {"id": user.id, "guild_id": context.guild.id}, CONSTANTS.user_data_template(user.id, context.guild.id))
 
         newdata = {
             "$set": { "jailed": True }
         }
 
-        await CachedDB.update_one(users, {"id": user.id}, newdata)
+        await CachedDB.update_one(users, {"id": user.id, "guild_id": context.guild.id}, newdata)
 
         await context.send(f"{user.mention} has been jailed")
 
@@ -955,22 +935,18 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
     @commands.bot_has_permissions(manage_roles=True, manage_channels=True, manage_messages=True)
     async def unjail(self, context: Context, user: discord.Member):
         guilds = db["guilds"]
-        data = guilds.find_one({"id": context.guild.id})
+        data = await guilds.find_one({"id": context.guild.id})
 
         await user.remove_roles(context.guild.get_role(data["jail_role"]))
 
         users = db["users"]
-        user_data = await CachedDB.find_one(users, {"id": user.id})
-
-        if not user_data:
-            user_data = CONSTANTS.user_data_template(context.guild.id, user.id)
-            users.insert_one(user_data)
+        user_data = await CachedDB.find_or_create(users, {"id": user.id, "guild_id": context.guild.id}, CONSTANTS.user_data_template(user.id, context.guild.id))
 
         newdata = {
             "$set": { "jailed": False }
         }
 
-        await CachedDB.update_one(users, {"id": user.id}, newdata)
+        await CachedDB.update_one(users, {"id": user.id, "guild_id": context.guild.id}, newdata)
 
         await context.send(f"{user.mention} has been unjailed")
 
@@ -1008,11 +984,7 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
     @Checks.has_perm(manage_messages=True)
     async def warn(self, context: Context, user: discord.Member, *, reason: str = "Not specified") -> None:
         users = db["users"]
-        data = users.find_one({"id": user.id, "guild_id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.user_data_template(user.id, context.guild.id)
-            users.insert_one(data)
+        data = await CachedDB.find_or_create(users, {"id": user.id, "guild_id": context.guild.id}, CONSTANTS.user_data_template(user.id, context.guild.id))
 
         if not "warnings" in data:
             data["warnings"] = []
@@ -1021,7 +993,7 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
 
         newdata = {"$set": {"warnings": data["warnings"]}}
 
-        users.update_one({"id": user.id, "guild_id": context.guild.id}, newdata)
+        await CachedDB.update_one(users, {"id": user.id, "guild_id": context.guild.id}, newdata)
 
         await context.send(f"{user.mention} has been warned for {reason}")
 
@@ -1034,11 +1006,7 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
     @Checks.has_perm(manage_messages=True)
     async def listwarnings(self, context: Context, user: discord.Member) -> None:
         users = db["users"]
-        data = users.find_one({"id": user.id, "guild_id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.user_data_template(user.id, context.guild.id)
-            users.insert_one(data)
+        data = await CachedDB.find_or_create(users, {"id": user.id, "guild_id": context.guild.id}, CONSTANTS.user_data_template(user.id, context.guild.id))
 
 
         embed = discord.Embed(
@@ -1064,15 +1032,11 @@ class Staff(commands.Cog, name="👮‍♂️ Staff"):
     @Checks.has_perm(manage_messages=True)
     async def clearwarnings(self, context: Context, user: discord.Member) -> None:
         users = db["users"]
-        data = users.find_one({"id": user.id, "guild_id": context.guild.id})
-
-        if not data:
-            data = CONSTANTS.user_data_template(user.id, context.guild.id)
-            users.insert_one(data)
+        data = await CachedDB.find_or_create(users, {"id": user.id, "guild_id": context.guild.id}, CONSTANTS.user_data_template(user.id, context.guild.id))
 
         newdata = {"$set": {"warnings": []}}
 
-        users.update_one({"id": user.id, "guild_id": context.guild.id}, newdata)
+        await CachedDB.update_one(users, {"id": user.id, "guild_id": context.guild.id}, newdata)
 
         await context.send(f"Cleared warnings for {user.mention}")
 
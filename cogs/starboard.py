@@ -3,7 +3,7 @@
 import discord
 from discord.ext import commands
 from discord.ext.commands import Context
-from utils import CONSTANTS, DBClient, Checks, CachedDB
+from utils import CONSTANTS, DBClient, Checks, CachedDB, EventContext, GuildFeatures
 
 client = DBClient.client
 db = client.potatobot
@@ -14,14 +14,16 @@ class Starboard(commands.Cog, name="⭐ Starboard"):
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload) -> None:
+        if not GuildFeatures.enabled(payload.guild_id, GuildFeatures.STARBOARD):
+            return
+
         channel = self.bot.get_channel(payload.channel_id)
         message = await channel.fetch_message(payload.message_id)
 
         if message.author.bot:
             return
 
-        col = db["guilds"]
-        guild = await CachedDB.find_one(col, {"id": payload.guild_id})
+        guild = await EventContext.for_reaction(payload).guild()
 
         if not guild:
             return
@@ -37,7 +39,7 @@ class Starboard(commands.Cog, name="⭐ Starboard"):
                 return
 
         starboard_col = db["starboard"]
-        starboard_message = await CachedDB.find_one(starboard_col, {"message_id": message.id})
+        starboard_message = await CachedDB.find_one(starboard_col, {"message_id": message.id}, cache_missing=True)
         starboard_channel = self.bot.get_channel(guild["starboard"]["channel"])
 
         star_reactions = 0
@@ -68,7 +70,7 @@ class Starboard(commands.Cog, name="⭐ Starboard"):
                         "starboard_id": msg.id
                     }
 
-                    starboard_col.insert_one(newdata)
+                    await CachedDB.insert_one(starboard_col, newdata)
                 else:
                     embed = discord.Embed(
                         description=message.content,
@@ -89,14 +91,16 @@ class Starboard(commands.Cog, name="⭐ Starboard"):
 
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload) -> None:
+        if not GuildFeatures.enabled(payload.guild_id, GuildFeatures.STARBOARD):
+            return
+
         channel = self.bot.get_channel(payload.channel_id)
         message = await channel.fetch_message(payload.message_id)
 
         if message.author.bot:
             return
 
-        col = db["guilds"]
-        guild = await CachedDB.find_one(col, {"id": payload.guild_id})
+        guild = await EventContext.for_reaction(payload).guild()
 
         if not guild:
             return
@@ -117,7 +121,7 @@ class Starboard(commands.Cog, name="⭐ Starboard"):
                 star_reactions = r.count
 
         starboard_col = db["starboard"]
-        starboard_message = await CachedDB.find_one(starboard_col, {"message_id": message.id})
+        starboard_message = await CachedDB.find_one(starboard_col, {"message_id": message.id}, cache_missing=True)
         starboard_channel = self.bot.get_channel(guild["starboard"]["channel"])
 
         if not starboard_channel:
@@ -176,11 +180,7 @@ class Starboard(commands.Cog, name="⭐ Starboard"):
     @commands.has_permissions(manage_channels=True)
     async def set_starboard(self, context: Context, channel: discord.TextChannel) -> None:
         col = db["guilds"]
-        guild = await CachedDB.find_one(col, {"id": context.guild.id})
-
-        if not guild:
-            guild = CONSTANTS.guild_data_template(context.guild.id)
-            await col.insert_one(CONSTANTS.guild_data_template(context.guild.id))
+        guild = await CachedDB.find_or_create(col, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         newdata = {
             "$set": {
@@ -200,11 +200,7 @@ class Starboard(commands.Cog, name="⭐ Starboard"):
     @commands.has_permissions(manage_channels=True)
     async def set_threshold(self, context: Context, threshold: int) -> None:
         col = db["guilds"]
-        guild = await CachedDB.find_one(col, {"id": context.guild.id})
-
-        if not guild:
-            guild = CONSTANTS.guild_data_template(context.guild.id)
-            await col.insert_one(guild)
+        guild = await CachedDB.find_or_create(col, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         newdata = {
             "$set": {
@@ -224,11 +220,7 @@ class Starboard(commands.Cog, name="⭐ Starboard"):
     @commands.has_permissions(manage_channels=True)
     async def disable_starboard(self, context: Context) -> None:
         col = db["guilds"]
-        guild = await CachedDB.find_one(col, {"id": context.guild.id})
-
-        if not guild:
-            guild = CONSTANTS.guild_data_template(context.guild.id)
-            await col.insert_one(guild)
+        guild = await CachedDB.find_or_create(col, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         newdata = {
             "$set": {
@@ -248,11 +240,7 @@ class Starboard(commands.Cog, name="⭐ Starboard"):
     @commands.has_permissions(manage_channels=True)
     async def enable_starboard(self, context: Context) -> None:
         col = db["guilds"]
-        guild = await CachedDB.find_one(col, {"id": context.guild.id})
-
-        if not guild:
-            guild = CONSTANTS.guild_data_template(context.guild.id)
-            await col.insert_one(guild)
+        guild = await CachedDB.find_or_create(col, {"id": context.guild.id}, CONSTANTS.guild_data_template(context.guild.id))
 
         newdata = {
             "$set": {
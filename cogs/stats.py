@@ -6,11 +6,9 @@ from discord.ext import commands, tasks
 from discord.ext.commands import Context
 from datetime import datetime
 from PIL import Image, ImageDraw, ImageFont
-import pickledb
+from utils import Checks, KVStore
 
-from utils import Checks
-
-db = pickledb.load('pickle/charts.db', False)
+db = KVStore.KVStore('pickle/charts.sqlite', legacy_path='pickle/charts.db')
 
 def textangle(draw, text, xy, angle, fill, font):
     img = Image.new('RGBA', font.getsize(text))
@@ -51,7 +49,7 @@ class Stats(commands.Cog, name="📈 Stats"):
             if (current_date - date).days > 30:
                 del guild_data[date_str]
 
-        db.dump()
+        db.set(guild_id, guild_data)
 
     @commands.hybrid_group(
         name="chart",
@@ -22,7 +22,7 @@ class CreateButton(View):
     async def ticket(self, interaction: discord.Interaction, button: Button):
         c = db["guilds"]
 
-        data = c.find_one({"id": interaction.guild.id})
+        data = await c.find_one({"id": interaction.guild.id})
 
         if not data:
             await interaction.channel.send("**Tickets info not found! If you are an admin use `/setting` for more info**")
@@ -87,7 +87,7 @@ class CloseButton(View):
     async def close(self, interaction: discord.Interaction, button: Button):
         c = db["guilds"]
 
-        data = c.find_one({"id": interaction.guild.id})
+        data = await c.find_one({"id": interaction.guild.id})
 
         if not data:
             await interaction.channel.send("**Tickets info not found! If you are an admin use `/setting` for more info**")
@@ -143,7 +143,7 @@ class CloseButton(View):
                 )
 
         guilds = DBClient.client.potatobot["guilds"]
-        data = guilds.find_one({"id": interaction.guild.id})
+        data = await guilds.find_one({"id": interaction.guild.id})
 
         if data["log_channel"]:
             log_channel = interaction.guild.get_channel(data["log_channel"])
@@ -221,7 +221,7 @@ class Ticket(commands.Cog, name="🎫 Ticket"):
     async def open(self, context: Context):
         c = db["guilds"]
 
-        data = c.find_one({"id": context.guild.id})
+        data = await c.find_one({"id": context.guild.id})
 
         if not data:
             await context.send("**Tickets info not found! If you are an admin use `/setting` for more info**")
@@ -314,7 +314,7 @@ class Ticket(commands.Cog, name="🎫 Ticket"):
             return await context.send("This is not a ticket channel.")
 
         c = db["guilds"]
-        guild = c.find_one({"id": context.guild.id})
+        guild = await c.find_one({"id": context.guild.id})
 
         if not guild or not guild.get("tickets_support_role"):
             return await context.send("Support role not configured for this server.")
@@ -347,7 +347,7 @@ class Ticket(commands.Cog, name="🎫 Ticket"):
             return await context.send("This is not a ticket channel.")
 
         c = db["guilds"]
-        guild = c.find_one({"id": context.guild.id})
+        guild = await c.find_one({"id": context.guild.id})
 
         if not guild or not guild.get("tickets_support_role"):
             return await context.send("Support role not configured for this server.")
@@ -441,7 +441,7 @@ class Ticket(commands.Cog, name="🎫 Ticket"):
             return await context.send("This is your ticket.")
 
         guilds = db["guilds"]
-        guild = guilds.find_one({"id": context.guild.id})
+        guild = await guilds.find_one({"id": context.guild.id})
 
         if guild and guild.get("tickets_support_role"):
             support_role = context.guild.get_role(guild["tickets_support_role"])
@@ -479,7 +479,7 @@ class Ticket(commands.Cog, name="🎫 Ticket"):
             return await context.send("This is your ticket.")
 
         guilds = db["guilds"]
-        guild = guilds.find_one({"id": context.guild.id})
+        guild = await guilds.find_one({"id": context.guild.id})
 
         if guild and guild.get("tickets_support_role"):
             support_role = context.guild.get_role(guild["tickets_support_role"])
@@ -533,7 +533,7 @@ class Ticket(commands.Cog, name="🎫 Ticket"):
                 )
 
         guilds = DBClient.client.potatobot["guilds"]
-        data = guilds.find_one({"id": context.guild.id})
+        data = await guilds.find_one({"id": context.guild.id})
 
         if data["log_channel"]:
             log_channel = context.guild.get_channel(data["log_channel"])
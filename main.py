@@ -1,6 +1,7 @@
 # This project is licensed under the terms of the GPL v3.0 license. Copyright 2024 Cyteon
 
 import os
+import asyncio
 import threading
 import uvicorn
 import json
@@ -55,6 +56,10 @@ class JSONEncoder(json.JSONEncoder):
             return None  # Skip binary data
         return json.JSONEncoder.default(self, obj)
 
+# FastAPI runs on its own thread and event loop, but the db clients belong to the bot's loop
+async def run_on_bot_loop(coro):
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, bot.loop))
+
 # Define a simple FastAPI route
 @app.get("/")
 async def read_root():
@@ -111,11 +116,7 @@ async def get_guild(id: int):
         return {"message": "Guild not found.", "status": 404}
 
     guilds = db["guilds"]
-    guild_data = guilds.find_one({"id": guild.id})
-
-    if guild_data is None:
-        guild_data = CONSTANTS.guild_data_template(id)
-        guilds.insert_one(guild_data)
+    guild_data = await run_on_bot_loop(CachedDB.find_or_create(guilds, {"id": guild.id}, CONSTANTS.guild_data_template(id)))
 
     guild = {
         "name": guild.name,
@@ -137,11 +138,7 @@ async def get_user(id: int):
         return {"message": "User not found.", "status": 404}
 
     users = db["global_users"]
-    user_data = await CachedDB.find_one(users, {"id": user.id})
-
-    if user_data is None:
-        user_data = CONSTANTS.user_global_data_template(id)
-        users.insert_one(user_data)
+    user_data = await run_on_bot_loop(CachedDB.find_or_create(users, {"id": user.id}, CONSTANTS.user_global_data_template(id)))
 
     if user_data["blacklisted"]:
         return {"message": "User is blacklisted.", "status": 403, "reason": user_data["blacklist_reason"]}
@@ -48,7 +48,7 @@ class FarmModal(Modal, title = "Buy Saplings (5$ per sapling)"):
         await interaction.response.send_message(f"Bought {value} sapling(s) for ${price}", ephemeral=True)
 
         c = db["users"]
-        data = c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
+        data = await c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
 
         farmData = data["farm"]
 
@@ -106,7 +106,7 @@ class FarmButton(View):
             return await interaction.response.send_message("You can't plant someone else's crops", ephemeral=True)
 
         c = db["users"]
-        data = c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
+        data = await c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
 
 
         farmData = data["farm"]
@@ -130,8 +130,8 @@ class FarmButton(View):
                 "farm.ready_in": farmData["ready_in"],
                 }
         }
-        c.update_one(
-            {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata
+        await CachedDB.update_one(
+            c, {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata
         )
 
         await interaction.response.send_message("You planted your crops", ephemeral=True)
@@ -178,7 +178,7 @@ class FarmButton(View):
             return await interaction.response.send_message("You can't harvest someone else's crops", ephemeral=True)
 
         c = db["users"]
-        data = c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
+        data = await c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
 
         farmData = data["farm"]
 
@@ -201,8 +201,8 @@ class FarmButton(View):
                 "farm.ready_in": farmData["ready_in"],
                 }
         }
-        c.update_one(
-            {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata
+        await CachedDB.update_one(
+            c, {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata
         )
 
 
@@ -91,7 +91,7 @@ class BlackjackView(View):
             return await interaction.response.send_message("The game is over", ephemeral=True)
 
         c = db["users"]
-        user = c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
+        user = await c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
 
         self.player_hand.append(self.deck.pop())
         self.player_score = self.calculate_score(self.player_hand)
@@ -101,7 +101,7 @@ class BlackjackView(View):
             user["wallet"] -= self.amount
 
             newdata = {"$set": {"wallet": user["wallet"]}}
-            c.update_one({"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata)
+            await CachedDB.update_one(c, {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata)
 
             embed = self.update_embed()
             return await interaction.response.edit_message(content="You went over 21! You lost", embed=embed, view=self)
@@ -111,7 +111,7 @@ class BlackjackView(View):
             user["wallet"] += self.amount
 
             newdata = {"$set": {"wallet": user["wallet"]}}
-            c.update_one({"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata)
+            await CachedDB.update_one(c, {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata)
 
             embed = self.update_embed()
             return await interaction.response.edit_message(content="You got 21! You won", embed=embed, view=self)
@@ -128,7 +128,7 @@ class BlackjackView(View):
             return await interaction.response.send_message("The game is over", ephemeral=True)
 
         c = db["users"]
-        user = c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
+        user = await c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
 
         while self.dealer_score < 17:
             self.dealer_hand.append(self.deck.pop())
@@ -139,7 +139,7 @@ class BlackjackView(View):
             user["wallet"] += self.amount
 
             newdata = {"$set": {"wallet": user["wallet"]}}
-            c.update_one({"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata)
+            await CachedDB.update_one(c, {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata)
 
             embed = self.update_embed()
             return await interaction.response.edit_message(content="Dealer went over 21! You won", embed=embed, view=self)
@@ -149,7 +149,7 @@ class BlackjackView(View):
             user["wallet"] -= self.amount
 
             newdata = {"$set": {"wallet": user["wallet"]}}
-            c.update_one({"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata)
+            await CachedDB.update_one(c, {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata)
 
             embed = self.update_embed()
             return await interaction.response.edit_message(content="Dealer won", embed=embed, view=self)
@@ -191,7 +191,7 @@ class HeadsOrTailsButton(View):
         coin = random.choice(["heads", "tails"])
 
         c = db["users"]
-        data = c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
+        data = await c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
 
         if coin == "heads":
             await interaction.message.edit(content=f"The coin landed on {coin}! You won {self.amount * 2}$")
@@ -205,8 +205,8 @@ class HeadsOrTailsButton(View):
         newdata = {
             "$set": {"wallet": data["wallet"]}
         }
-        c.update_one(
-            {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata
+        await CachedDB.update_one(
+            c, {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata
         )
 
     @button(label="Tails", style=discord.ButtonStyle.primary, custom_id="tails",emoji="🪙")
@@ -220,7 +220,7 @@ class HeadsOrTailsButton(View):
         coin = random.choice(["heads", "tails"])
 
         c = db["users"]
-        data = c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
+        data = await c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
 
         if coin == "tails":
             await interaction.message.edit(content=f"The coin landed on {coin}! You won {self.amount * 2}$")
@@ -234,8 +234,8 @@ class HeadsOrTailsButton(View):
         newdata = {
             "$set": {"wallet": data["wallet"]}
         }
-        c.update_one(
-            {"id": interaction.user .id, "guild_id": interaction.guild.id}, newdata
+        await CachedDB.update_one(
+            c, {"id": interaction.user .id, "guild_id": interaction.guild.id}, newdata
         )
 
 # roll 1 - 6
@@ -255,7 +255,7 @@ class RollButton(View):
         number = random.randrange(1, 6)
 
         c = db["users"]
-        data = c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
+        data = await c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
 
         if number == 1:
             await interaction.message.edit(content=f"The dice landed on {number}! You won {self.amount * 5}$")
@@ -269,8 +269,8 @@ class RollButton(View):
         newdata = {
             "$set": {"wallet": data["wallet"]}
         }
-        c.update_one(
-            {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata
+        await CachedDB.update_one(
+            c, {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata
         )
 
     @button(label="", style=discord.ButtonStyle.primary, custom_id="roll_2",emoji="2️⃣")
@@ -283,7 +283,7 @@ class RollButton(View):
         number = random.randrange(1, 6)
 
         c = db["users"]
-        data = c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
+        data = await c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
 
         if number == 2:
             await interaction.message.edit(content=f"The dice landed on {number}! You won {self.amount * 5}$")
@@ -297,8 +297,8 @@ class RollButton(View):
         newdata = {
             "$set": {"wallet": data["wallet"]}
         }
-        c.update_one(
-            {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata
+        await CachedDB.update_one(
+            c, {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata
         )
 
     @button(label="", style=discord.ButtonStyle.primary, custom_id="roll_3",emoji="3️⃣")
@@ -311,7 +311,7 @@ class RollButton(View):
         number = random.randrange(1, 6)
 
         c = db["users"]
-        data = c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
+        data = await c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
 
         if number == 3:
             await interaction.message.edit(content=f"The dice landed on {number}! You won {self.amount * 5}$")
@@ -326,8 +326,8 @@ class RollButton(View):
             "$set": {"wallet": data["wallet"]}
         }
 
-        c.update_one(
-            {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata
+        await CachedDB.update_one(
+            c, {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata
         )
 
     @button(label="", style=discord.ButtonStyle.primary, custom_id="roll_4",emoji="4️⃣")
@@ -340,7 +340,7 @@ class RollButton(View):
         number = random.randrange(1, 6)
 
         c = db["users"]
-        data = c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
+        data = await c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
 
         if number == 4:
             await interaction.message.edit(content=f"The dice landed on {number}! You won {self.amount * 5}$")
@@ -355,8 +355,8 @@ class RollButton(View):
             "$set": {"wallet": data["wallet"]}
         }
 
-        c.update_one(
-            {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata
+        await CachedDB.update_one(
+            c, {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata
         )
 
     @button(label="", style=discord.ButtonStyle.primary, custom_id="roll_5",emoji="5️⃣")
@@ -369,7 +369,7 @@ class RollButton(View):
         number = random.randrange(1, 6)
 
         c = db["users"]
-        data = c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
+        data = await c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
 
         if number == 5:
             await interaction.message.edit(content=f"The dice landed on {number}! You won {self.amount * 5}$")
@@ -383,8 +383,8 @@ class RollButton(View):
         newdata = {
             "$set": {"wallet": data["wallet"]}
         }
-        c.update_one(
-            {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata
+        await CachedDB.update_one(
+            c, {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata
         )
 
     @button(label="", style=discord.ButtonStyle.primary, custom_id="roll_6",emoji="6️⃣")
@@ -398,7 +398,7 @@ class RollButton(View):
         number = random.randrange(1, 6)
 
         c = db["users"]
-        data = c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
+        data = await c.find_one({"id": interaction.user.id, "guild_id": interaction.guild.id})
 
         if number == 6:
             await interaction.message.edit(content=f"The dice landed on {number}! You won {self.amount * 5}$")
@@ -412,6 +412,6 @@ class RollButton(View):
         newdata = {
             "$set": {"wallet": data["wallet"]}
         }
-        c.update_one(
-            {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata
+        await CachedDB.update_one(
+            c, {"id": interaction.user.id, "guild_id": interaction.guild.id}, newdata
         )
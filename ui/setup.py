@@ -1,6 +1,6 @@
 import discord
 import asyncio
-from utils import CONSTANTS, DBClient, Checks
+from utils import CONSTANTS, DBClient, Checks, CachedDB
 
 db = DBClient.db
 
@@ -65,7 +65,7 @@ class TicketCategorySelect(discord.ui.Select):
             return
 
         category_id = self.values[0]
-        db.guilds.update_one({"id": self.server_id}, {"$set": {"tickets_category": int(category_id)}})
+        await CachedDB.update_one(db.guilds, {"id": self.server_id}, {"$set": {"tickets_category": int(category_id)}})
 
         embed = discord.Embed(
             title="What role should be given access to the tickets and pinged?",
@@ -94,7 +94,7 @@ class TicketCategorySelect(discord.ui.Select):
                 await interaction.followup.send("You must mention a role.", ephemeral=True)
 
         await message.delete()
-        db.guilds.update_one({"id": self.server_id}, {"$set": {"tickets_support_role": role_id}})
+        await CachedDB.update_one(db.guilds, {"id": self.server_id}, {"$set": {"tickets_support_role": role_id}})
 
         embed = discord.Embed(
             title="Change leveling system settings",
@@ -123,7 +123,7 @@ class TicketSupportRoleSelect(discord.ui.Select):
             return
 
         role_id = self.values[0]
-        db.guilds.update_one({"id": self.server_id}, {"$set": {"tickets_support_role": role_id}})
+        await CachedDB.update_one(db.guilds, {"id": self.server_id}, {"$set": {"tickets_support_role": role_id}})
 
         embed = discord.Embed(
             title="Change leveling system settings",
@@ -161,7 +161,7 @@ class LevelingSetupView(discord.ui.View):
 
     @discord.ui.button(label="No", style=discord.ButtonStyle.secondary)
     async def no(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
-        db.guilds.update_one({"id": self.server_id}, {"$set": {"should_announce_levelup": False}})
+        await CachedDB.update_one(db.guilds, {"id": self.server_id}, {"$set": {"should_announce_levelup": False}})
 
         embed = discord.Embed(
             title="Setup starboard?",
@@ -182,7 +182,7 @@ class LevelingShouldAnnounceLevelUp(discord.ui.View):
             await interaction.response.send_message("You can't interact with this :D", ephemeral=True)
             return
 
-        db.guilds.update_one({"id": self.server_id}, {"$set": {"should_announce_levelup": True}})
+        await CachedDB.update_one(db.guilds, {"id": self.server_id}, {"$set": {"should_announce_levelup": True}})
 
         embed = discord.Embed(
             title="Would you like to set a channel for levelups?",
@@ -196,7 +196,7 @@ class LevelingShouldAnnounceLevelUp(discord.ui.View):
 
     @discord.ui.button(label="No", style=discord.ButtonStyle.secondary)
     async def no(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
-        db.guilds.update_one({"id": self.server_id}, {"$set": {"should_announce_levelup": False}})
+        await CachedDB.update_one(db.guilds, {"id": self.server_id}, {"$set": {"should_announce_levelup": False}})
 
         embed = discord.Embed(
             title="Setup starboard?",
@@ -244,7 +244,7 @@ class LevelingChannelSelectView(discord.ui.View):
                 await interaction.followup.send("You must mention a channel.", ephemeral=True)
 
         await message.delete()
-        db.guilds.update_one({"id": self.server_id}, {"$set": {"level_announce_channel": channel_id}})
+        await CachedDB.update_one(db.guilds, {"id": self.server_id}, {"$set": {"level_announce_channel": channel_id}})
 
         embed = discord.Embed(
             title="Setup starboard?",
@@ -275,7 +275,7 @@ class StarboardSetupView(discord.ui.View):
             await interaction.response.send_message("You can't interact with this :D", ephemeral=True)
             return
 
-        db.guilds.update_one({"id": self.server_id}, {"$set": {"starboard.enabled": True}})
+        await CachedDB.update_one(db.guilds, {"id": self.server_id}, {"$set": {"starboard.enabled": True}})
 
         embed = discord.Embed(
             title="Mention the channel for the starboard",
@@ -304,7 +304,7 @@ class StarboardSetupView(discord.ui.View):
                 await interaction.followup.send("You must mention a channel.", ephemeral=True)
 
         await message.delete()
-        db.guilds.update_one({"id": self.server_id}, {"$set": {"starboard.channel": channel_id}})
+        await CachedDB.update_one(db.guilds, {"id": self.server_id}, {"$set": {"starboard.channel": channel_id}})
 
         embed = discord.Embed(
             title="Select the starboard threshold",
@@ -330,7 +330,7 @@ class StarboardSetupView(discord.ui.View):
         threshold = int(message.content)
 
         await message.delete()
-        db.guilds.update_one({"id": self.server_id}, {"$set": {"starboard.threshold": threshold}})
+        await CachedDB.update_one(db.guilds, {"id": self.server_id}, {"$set": {"starboard.threshold": threshold}})
 
         embed = discord.Embed(
             title = "Do you want to set a logging channel?",
@@ -342,7 +342,7 @@ class StarboardSetupView(discord.ui.View):
 
     @discord.ui.button(label="No", style=discord.ButtonStyle.secondary)
     async def no(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
-        db.guilds.update_one({"id": self.server_id}, {"$set": {"starboard.enabled": False}})
+        await CachedDB.update_one(db.guilds, {"id": self.server_id}, {"$set": {"starboard.enabled": False}})
 
         embed = discord.Embed(
             title = "Do you want to set a logging channel?",
@@ -390,7 +390,7 @@ class LoggingSetupView(discord.ui.View):
                 await interaction.followup.send("You must mention a channel.", ephemeral=True)
 
         await message.delete()
-        db.guilds.update_one({"id": self.server_id}, {"$set": {"log_channel": channel_id}})
+        await CachedDB.update_one(db.guilds, {"id": self.server_id}, {"$set": {"log_channel": channel_id}})
 
         embed = discord.Embed(
             title="Setup complete!",
@@ -0,0 +1,78 @@
+# This project is licensed under the terms of the GPL v3.0 license. Copyright 2024 Cyteon
+
+import asyncio
+import time
+
+from collections import OrderedDict
+
+# How long an entry can still be matched to the event it belongs to
+ENTRY_TTL = 60
+# The audit log entry and the event it explains arrive separately, in either order
+WAIT_TIMEOUT = 3
+MAX_ENTRIES_PER_GUILD = 500
+
+# guild_id -> (action, target_id) -> (entry, when it arrived), oldest first
+entries = {}
+# (guild_id, action, target_id) -> futures of handlers whose event arrived before its entry
+waiters = {}
+
+def record(entry):
+    # Fed from on_audit_log_entry_create
+    now = time.monotonic()
+    key = (entry.action, getattr(entry.target, "id", None))
+
+    guild_entries = entries.setdefault(entry.guild.id, OrderedDict())
+    guild_entries[key] = (entry, now)
+    guild_entries.move_to_end(key)
+
+    while guild_entries:
+        _, (_, arrived) = next(iter(guild_entries.items()))
+
+        if len(guild_entries) <= MAX_ENTRIES_PER_GUILD and now - arrived < ENTRY_TTL:
+            break
+
+        guild_entries.popitem(last=False)
+
+    for future in waiters.pop((entry.guild.id, *key), []):
+        if not future.done():
+            future.set_result(entry)
+
+def lookup(guild_id, action, target_id):
+    found = entries.get(guild_id, {}).get((action, target_id))
+
+    if found and time.monotonic() - found[1] < ENTRY_TTL:
+        return found[0]
+
+    return None
+
+async def wait_for(guild_id, action, target_id, timeout=WAIT_TIMEOUT):
+    entry = lookup(guild_id, action, target_id)
+
+    if entry:
+        return entry
+
+    key = (guild_id, action, target_id)
+    future = asyncio.get_running_loop().create_future()
+    waiters.setdefault(key, []).append(future)
+
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        pending = waiters.get(key)
+
+        if pending and future in pending:
+            pending.remove(future)
+
+            if not pending:
+                del waiters[key]
+
+async def actor(guild, action, target_id, timeout=WAIT_TIMEOUT):
+    # Who did `action` to `target_id`, or None if no entry showed up (e.g. a member leaving on their own)
+    entry = await wait_for(guild.id, action, target_id, timeout)
+
+    if entry is None:
+        return None
+
+    return entry.user or guild.get_member(entry.user_id)
@@ -0,0 +1,178 @@
+# This project is licensed under the terms of the GPL v3.0 license. Copyright 2024 Cyteon
+
+import asyncio
+import logging
+import time
+
+import discord
+
+from utils import KVStore
+
+logger = logging.getLogger("discord_bot")
+
+# Every channel is its own route for overwrite edits, so what runs out first is the global limit (50/s)
+REQUESTS_PER_SECOND = 40
+CONCURRENCY = 10
+
+# "{guild_id}:{name}" -> the overwrites still to apply, so a job cut short by a restart picks up where it stopped
+jobs = KVStore.KVStore("pickle/overwrite_jobs.sqlite")
+# Jobs executing in this process, on_ready fires again on every reconnect
+running = set()
+# Progress is saved every this many channels, a resumed job redoes at most that many edits
+CHECKPOINT_EVERY = 25
+
+# What a job does once all of its channels are done, by name so it survives a restart along with the job
+finishers = {}
+
+class RateBudget:
+    # Token bucket shared by every job in the process
+    def __init__(self, rate, per=1):
+        self.rate = rate
+        self.per = per
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.per)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) * self.per / self.rate)
+
+budget = RateBudget(REQUESTS_PER_SECOND)
+
+def to_pair(overwrite):
+    allow, deny = overwrite.pair()
+    return [allow.value, deny.value]
+
+def from_pair(pair):
+    if pair is None:
+        return None
+
+    return discord.PermissionOverwrite.from_pair(discord.Permissions(pair[0]), discord.Permissions(pair[1]))
+
+def plan(channels, target, transform):
+    # channel id -> [allow, deny] (None removes the overwrite) for every channel where transform(channel, overwrite)
+    # asks for something else than what is there, channels that are already right are left out
+    changes = {}
+
+    for channel in channels:
+        current = channel.overwrites_for(target)
+        wanted = transform(channel, channel.overwrites_for(target))
+
+        if wanted.is_empty():
+            if target in channel.overwrites:
+                changes[str(channel.id)] = None
+        elif target not in channel.overwrites or to_pair(wanted) != to_pair(current):
+            changes[str(channel.id)] = to_pair(wanted)
+
+    return changes
+
+def on_finish(name, callback):
+    # callback(guild, failed channel ids) is awaited when a job started with finish=name is done, resumed ones too
+    finishers[name] = callback
+
+def is_pending(guild, name):
+    # Running here, or left unfinished by a restart and not resumed yet
+    return jobs.exists(f"{guild.id}:{name}")
+
+async def run(guild, name, target, changes, reason, progress=None, finish=None):
+    # Applies plan() output, returns (channels changed, [(channel, error)])
+    key = f"{guild.id}:{name}"
+    job = {
+        "target": target.id,
+        "is_role": isinstance(target, discord.Role),
+        "reason": reason,
+        "pending": changes,
+        "failed": [],
+        "finish": finish
+    }
+
+    jobs.set(key, job)
+
+    return await execute(guild, key, job, progress)
+
+async def execute(guild, key, job, progress=None):
+    if job["is_role"]:
+        target = guild.get_role(job["target"])
+    else:
+        target = guild.get_member(job["target"])
+
+    pending = job["pending"]
+    total = len(pending)
+    # Report about ten times over the whole job, a progress message edit costs a request too
+    step = max(1, total // 10)
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    done = 0
+    failed = []
+
+    if target is None:
+        jobs.delete(key)
+        return 0, failed
+
+    running.add(key)
+
+    async def apply(channel_id, pair):
+        nonlocal done
+
+        channel = guild.get_channel(int(channel_id))
+
+        if channel is not None:
+            async with semaphore:
+                await budget.acquire()
+
+                try:
+                    await channel.set_permissions(target, overwrite=from_pair(pair), reason=job["reason"])
+                except discord.HTTPException as e:
+                    failed.append((channel, e))
+                    job.setdefault("failed", []).append(channel_id)
+
+        pending.pop(channel_id, None)
+        done += 1
+
+        if done % CHECKPOINT_EVERY == 0:
+            jobs.set(key, job)
+
+        if progress and (done % step == 0 or done == total):
+            try:
+                await progress(done, total)
+            except discord.HTTPException:
+                pass
+
+    try:
+        await asyncio.gather(*(apply(channel_id, pair) for channel_id, pair in list(pending.items())))
+
+        jobs.set(key, job)
+
+        finish = finishers.get(job.get("finish"))
+
+        # Before the job is dropped, a restart in between runs it again on resume
+        if finish:
+            await finish(guild, job.get("failed", []))
+    finally:
+        running.discard(key)
+
+    jobs.delete(key)
+
+    return done - len(failed), failed
+
+async def resume_all(bot):
+    for key, job in jobs.items():
+        if key in running:
+            continue
+
+        guild = bot.get_guild(int(key.split(":")[0]))
+
+        if guild is None:
+            jobs.delete(key)
+            continue
+
+        logger.info(f"Resuming overwrite job {key} with {len(job['pending'])} channels left")
+        bot.loop.create_task(execute(guild, key, job))
@@ -1,82 +1,646 @@
 # This project is licensed under the terms of the GPL v3.0 license. Copyright 2024 Cyteon
 
-import pymongo
 import redis
+import redis.asyncio
+import asyncio
+import concurrent.futures
+import threading
 import json
 import logging
 import time
 import os
+import uuid
 from bson import ObjectId
+from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from utils import DBClient
+from utils.LocalCache import LRUCache
 
 logger = logging.getLogger("discord_bot")
 
-mongo_client_pool = pymongo.MongoClient(os.getenv("MONGODB_URL"), maxPoolSize=50)
-mongo_db = mongo_client_pool.potatobot
+redis_pool = redis.asyncio.ConnectionPool.from_url(os.getenv("REDIS_URL"), max_connections=100)
+redis_client = redis.asyncio.Redis(connection_pool=redis_pool)
+
+# Blocking client for the sync_ functions, which only run in executor threads
+sync_redis_pool = redis.ConnectionPool.from_url(os.getenv("REDIS_URL"), max_connections=20)
+sync_redis_client = redis.Redis(connection_pool=sync_redis_pool)
+
+INVALIDATION_CHANNEL = "cachedb:invalidate"
+# Lets the listener skip invalidations this process published itself
+PROCESS_ID = uuid.uuid4().hex
+
+# Cached "no such document" for find_one(..., cache_missing=True), kept short since inserts that
+# bypass CachedDB.insert_one can't clear it
+MISSING = b"null"
+MISSING_TTL = 10
+
+# Every cached filter variant of a document is tracked in tag:{collection}:{_id}, kept at least this long
+TAG_TTL = 3600
+
+# Write-through for the key the update used, then drop every other variant tagged with the same
+# document, all in one round trip. Returns the dropped keys so the caller can evict them locally
+INVALIDATE_SCRIPT = """
+if ARGV[1] ~= "" then
+    redis.call("SET", KEYS[1], ARGV[1], "XX", "KEEPTTL")
+else
+    redis.call("DEL", KEYS[1])
+end
+
+redis.call("PUBLISH", ARGV[2], ARGV[3] .. " " .. KEYS[1])
+
+local evicted = {}
+
+if KEYS[2] then
+    for _, key in ipairs(redis.call("SMEMBERS", KEYS[2])) do
+        if key ~= KEYS[1] then
+            redis.call("DEL", key)
+            redis.call("PUBLISH", ARGV[2], ARGV[3] .. " " .. key)
+            table.insert(evicted, key)
+        end
+    end
+
+    if #evicted > 0 then
+        redis.call("SREM", KEYS[2], unpack(evicted))
+    end
+end
+
+return evicted
+"""
 
-redis_pool = redis.ConnectionPool.from_url(os.getenv("REDIS_URL"), max_connections=100)
-redis_client = redis.Redis(connection_pool=redis_pool)
+invalidate_script = redis_client.register_script(INVALIDATE_SCRIPT)
+sync_invalidate_script = sync_redis_client.register_script(INVALIDATE_SCRIPT)
 
-print("Connected to MongoDB at: ", mongo_client_pool.host)
-print("Connected to Redis at: ", redis_client.connection_pool.connection_kwargs["host"])
+# L1 in front of redis, holds the raw JSON so every caller still gets its own copy to mutate
+local_cache = LRUCache(max_size=10_000)
+invalidation_listener = None
+
+# Callbacks by collection name, run after every write that goes through here with
+# (filter, new document or None, the update or None for inserts)
+write_listeners = {}
+# Callbacks by collection name, run when another process invalidates one of its keys with (filter), or (None) when
+# invalidations may have been missed and everything has to be treated as changed
+invalidation_listeners = {}
+
+# Cache misses currently being fetched, keyed by cache key, so concurrent misses share one fetch
+in_flight = {}
+sync_in_flight = {}
+sync_in_flight_lock = threading.Lock()
+
+print("Connected to MongoDB at: ", DBClient.sync_client.host)
+print("Connected to Redis at: ", redis_pool.connection_kwargs["host"])
 
 class JSONEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, ObjectId):
             return str(obj)
+        elif isinstance(obj, datetime):
+            return obj.isoformat()
         elif isinstance(obj, bytes):
             return None  # Skip binary data
         return json.JSONEncoder.default(self, obj)
 
-async def find_one(collection, query, ex=30):
+def cache_key_for(collection, query):
+    # Sorted so {"id", "guild_id"} and {"guild_id", "id"} share one entry
+    return f"{collection.name}:{json.dumps(query, sort_keys=True, separators=(',', ':'), cls=JSONEncoder)}"
+
+def tag_key_for(collection, document_id):
+    return f"tag:{collection.name}:{document_id}"
+
+def missing_shapes_key_for(collection):
+    # Field sets of the filters that have missing entries cached, so an insert knows which keys to clear
+    return f"missing:{collection.name}"
+
+def is_equality_filter(query):
+    # Plain top-level equality, the only filters a fetched or inserted document can be matched back to
+    return bool(query) and all(
+        not field.startswith("$") and "." not in field and not isinstance(value, (dict, list))
+        for field, value in query.items()
+    )
+
+def batch_filter(queries):
+    # {"id": {"$in": [...]}, "guild_id": x} when the filters only differ in one field, $or otherwise
+    fields = set(queries[0])
+
+    if all(set(query) == fields for query in queries):
+        varying = [field for field in fields if len({query[field] for query in queries}) > 1]
+
+        if len(varying) <= 1:
+            combined = dict(queries[0])
+
+            if varying:
+                combined[varying[0]] = {"$in": [query[varying[0]] for query in queries]}
+
+            return combined
+
+    return {"$or": queries}
+
+def matches(document, query):
+    return all(field in document and document[field] == value for field, value in query.items())
+
+def insert_defaults(query, template):
+    # The upsert already copies the query's fields into the new document, repeating them in $setOnInsert conflicts
+    return {field: value for field, value in template.items() if field not in query and field != "_id"}
+
+def on_write(collection_name, callback):
+    write_listeners.setdefault(collection_name, []).append(callback)
+
+def notify_write(collection, filter, payload, update=None):
+    for callback in write_listeners.get(collection.name, ()):
+        try:
+            callback(filter, json.loads(payload) if payload else None, update)
+        except Exception as e:
+            logger.error(f"Write listener for {collection.name} failed: {e}")
+
+def on_remote_invalidate(collection_name, callback):
+    invalidation_listeners.setdefault(collection_name, []).append(callback)
+
+def notify_invalidate(cache_key):
+    collection_name, _, query = cache_key.partition(":")
+    callbacks = invalidation_listeners.get(collection_name)
+
+    if not callbacks:
+        return
+
+    try:
+        filter = json.loads(query)
+    except ValueError:
+        return
+
+    for callback in callbacks:
+        try:
+            callback(filter)
+        except Exception as e:
+            logger.error(f"Invalidation listener for {collection_name} failed: {e}")
+
+def notify_invalidate_all():
+    for collection_name, callbacks in invalidation_listeners.items():
+        for callback in callbacks:
+            try:
+                callback(None)
+            except Exception as e:
+                logger.error(f"Invalidation listener for {collection_name} failed: {e}")
+
+def evict_local(cache_keys):
+    for cache_key in cache_keys:
+        if isinstance(cache_key, bytes):
+            cache_key = cache_key.decode()
+
+        local_cache.delete(cache_key)
+        in_flight.pop(cache_key, None)
+
+        with sync_in_flight_lock:
+            sync_in_flight.pop(cache_key, None)
+
+def encode(document):
+    try:
+        return JSONEncoder().encode(document)
+    except TypeError:
+        return None
+
+async def listen_for_invalidations():
+    while True:
+        try:
+            async with redis_client.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+
+                    origin, cache_key = message["data"].decode().split(" ", 1)
+
+                    if origin != PROCESS_ID:
+                        local_cache.delete(cache_key)
+                        notify_invalidate(cache_key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Anything could have changed while we were not listening
+            logger.error(f"Cache invalidation listener failed, clearing local cache: {e}")
+            local_cache.clear()
+            notify_invalidate_all()
+            await asyncio.sleep(1)
+
+def ensure_invalidation_listener():
+    global invalidation_listener
+
+    if invalidation_listener is None or invalidation_listener.done():
+        invalidation_listener = asyncio.get_running_loop().create_task(listen_for_invalidations())
+
+async def load(collection, query, cache_key, ex, cache_missing, template):
     start_time = time.time() * 1000
 
-    cache_key = f"{collection.name}:{json.dumps(query, cls=JSONEncoder)}"
-    cached_result = redis_client.get(cache_key)
+    cached_result = await redis_client.get(cache_key)
+
+    # A cached miss is no answer for find_or_create, it has to go create the document
+    if cached_result and not (template and cached_result == MISSING):
+        local_cache.set(cache_key, cached_result, MISSING_TTL if cached_result == MISSING else ex)
 
-    if cached_result:
         logger.info(f"Cache hit for query {cache_key} - took {time.time() * 1000 - start_time:.2f}ms")
-        return json.loads(cached_result)
+        return cached_result
+
+    if template is None:
+        result = await collection.find_one(query)
     else:
-        result = collection.find_one(query)
+        try:
+            result = await collection.find_one_and_update(
+                query,
+                {"$setOnInsert": insert_defaults(query, template)},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another process inserted it between our lookup and insert, the unique index stopped the second copy
+            result = await collection.find_one(query)
+
+    payload = None
+
+    # A write while we were fetching detaches us from in_flight, don't cache what may now be stale
+    if result:
+        payload = JSONEncoder().encode(result)
+
+        if in_flight.get(cache_key) is asyncio.current_task():
+            local_cache.set(cache_key, payload, ex)
+
+            tag_key = tag_key_for(collection, result["_id"])
+
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.set(cache_key, payload, ex=ex)
+                pipe.sadd(tag_key, cache_key)
+                pipe.expire(tag_key, max(ex, TAG_TTL))
+                await pipe.execute()
+    elif cache_missing and is_equality_filter(query) and in_flight.get(cache_key) is asyncio.current_task():
+        payload = MISSING
+        local_cache.set(cache_key, MISSING, MISSING_TTL)
+
+        shapes_key = missing_shapes_key_for(collection)
+
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.set(cache_key, MISSING, ex=MISSING_TTL)
+            pipe.sadd(shapes_key, json.dumps(sorted(query)))
+            pipe.expire(shapes_key, TAG_TTL)
+            await pipe.execute()
+
+    logger.info(f"Cache miss for query {cache_key} - took {time.time() * 1000 - start_time:.2f}ms")
+    return payload
+
+def shared_fetch(collection, query, cache_key, ex, cache_missing=False, template=None):
+    fetch = in_flight.get(cache_key)
+
+    if fetch is None:
+        fetch = asyncio.ensure_future(load(collection, query, cache_key, ex, cache_missing, template))
+        in_flight[cache_key] = fetch
+
+        def done(_):
+            if in_flight.get(cache_key) is fetch:
+                del in_flight[cache_key]
+
+        fetch.add_done_callback(done)
+
+    return fetch
+
+async def find_one(collection, query, ex=30, cache_missing=False):
+    ensure_invalidation_listener()
+
+    cache_key = cache_key_for(collection, query)
+    cached_result = local_cache.get(cache_key)
+
+    if cached_result:
+        return json.loads(cached_result)
+
+    # Shielded so one cancelled caller doesn't cancel the fetch for everyone else waiting on it
+    payload = await asyncio.shield(shared_fetch(collection, query, cache_key, ex, cache_missing))
+
+    return json.loads(payload) if payload else None
+
+async def find_or_create(collection, query, template, ex=30):
+    # find_one that atomically inserts the template when nothing matches, instead of find_one + insert_one
+    ensure_invalidation_listener()
+
+    cache_key = cache_key_for(collection, query)
+    cached_result = local_cache.get(cache_key)
+
+    if cached_result and cached_result != MISSING:
+        return json.loads(cached_result)
+
+    payload = None
+
+    # Joining a plain find_one that found nothing leaves us without a document, so go again with our upsert
+    while not payload or payload == MISSING:
+        payload = await asyncio.shield(shared_fetch(collection, query, cache_key, ex, template=template))
+
+    return json.loads(payload)
+
+async def find_many(collection, queries, ex=30):
+    # Results line up with queries: local cache, then one MGET, then one Mongo query for what's left
+    if not queries:
+        return []
+
+    if not all(is_equality_filter(query) for query in queries):
+        return await asyncio.gather(*(find_one(collection, query, ex) for query in queries))
+
+    ensure_invalidation_listener()
+
+    start_time = time.time() * 1000
+
+    cache_keys = [cache_key_for(collection, query) for query in queries]
+    payloads = {}
+
+    for cache_key in cache_keys:
+        cached_result = local_cache.get(cache_key)
 
-        if result:
-            result = json.loads(JSONEncoder().encode(result))
-            redis_client.set(cache_key, json.dumps(result), ex=ex)
+        if cached_result:
+            payloads[cache_key] = cached_result
 
-        logger.info(f"Cache miss for query {cache_key} - took {time.time() * 1000 - start_time:.2f}ms")
-        return result
+    missed = [cache_key for cache_key in dict.fromkeys(cache_keys) if cache_key not in payloads]
+
+    if missed:
+        for cache_key, cached_result in zip(missed, await redis_client.mget(missed)):
+            if cached_result:
+                local_cache.set(cache_key, cached_result, MISSING_TTL if cached_result == MISSING else ex)
+                payloads[cache_key] = cached_result
+
+    waiting = {}
+    to_fetch = {}
+
+    for cache_key, query in zip(cache_keys, queries):
+        if cache_key in payloads or cache_key in waiting or cache_key in to_fetch:
+            continue
+
+        if cache_key in in_flight:
+            waiting[cache_key] = in_flight[cache_key]
+        else:
+            to_fetch[cache_key] = query
+
+    if to_fetch:
+        # Registered like find_one's fetches, so concurrent find_one calls join and writes can detach them
+        loop = asyncio.get_running_loop()
+        fetches = {cache_key: loop.create_future() for cache_key in to_fetch}
+        in_flight.update(fetches)
+
+        try:
+            results = await collection.find(batch_filter(list(to_fetch.values()))).to_list(length=None)
+        except BaseException as e:
+            for cache_key, fetch in fetches.items():
+                if in_flight.get(cache_key) is fetch:
+                    del in_flight[cache_key]
+
+                if isinstance(e, asyncio.CancelledError):
+                    fetch.cancel()
+                else:
+                    fetch.set_exception(e)
+                    fetch.exception()
+
+            raise
+
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for cache_key, query in to_fetch.items():
+                result = next((result for result in results if matches(result, query)), None)
+                payload = JSONEncoder().encode(result) if result else None
+                fetch = fetches[cache_key]
+
+                if payload and in_flight.get(cache_key) is fetch:
+                    tag_key = tag_key_for(collection, result["_id"])
+
+                    local_cache.set(cache_key, payload, ex)
+                    pipe.set(cache_key, payload, ex=ex)
+                    pipe.sadd(tag_key, cache_key)
+                    pipe.expire(tag_key, max(ex, TAG_TTL))
+
+                if in_flight.get(cache_key) is fetch:
+                    del in_flight[cache_key]
+
+                fetch.set_result(payload)
+                payloads[cache_key] = payload
+
+            await pipe.execute()
+
+    for cache_key, fetch in waiting.items():
+        payloads[cache_key] = await asyncio.shield(fetch)
+
+    logger.info(f"Batch lookup of {len(queries)} queries on {collection.name} ({len(to_fetch)} from Mongo) - took {time.time() * 1000 - start_time:.2f}ms")
+
+    return [json.loads(payloads[cache_key]) if payloads[cache_key] else None for cache_key in cache_keys]
 
 async def update_one(collection, filter, update, upsert=False):
-    result = collection.update_one(filter, update, upsert=upsert)
+    # Returns the document as it is after the update, None when nothing matched
+    result = await collection.find_one_and_update(filter, update, upsert=upsert, return_document=ReturnDocument.AFTER)
+
+    cache_key = cache_key_for(collection, filter)
+    in_flight.pop(cache_key, None)
+
+    # Write-through with what mongo has now, patching our cached copy could undo a write that landed since we read it
+    payload = encode(result) if result else None
+
+    if not payload or not local_cache.replace(cache_key, payload):
+        local_cache.delete(cache_key)
+
+    keys = [cache_key]
 
-    cache_key = f"{collection.name}:{json.dumps(filter, cls=JSONEncoder)}"
-    redis_client.delete(cache_key)
+    if result:
+        keys.append(tag_key_for(collection, result["_id"]))
+
+    evicted = await invalidate_script(keys=keys, args=[payload or "", INVALIDATION_CHANNEL, PROCESS_ID])
+    evict_local(evicted)
+
+    notify_write(collection, filter, payload, update)
 
     return result
 
-def sync_find_one(collection, query, ex=30):
+async def current_documents(collection, filters):
+    # cache key -> document as it is now, for every equality filter that matches one, in one query
+    filters = [filter for filter in filters if is_equality_filter(filter)]
+
+    if not filters:
+        return {}
+
+    shapes = {tuple(filter) for filter in filters}
+    documents = {}
+
+    async for document in collection.find(batch_filter(filters)):
+        for shape in shapes:
+            if all(field in document for field in shape):
+                documents[cache_key_for(collection, {field: document[field] for field in shape})] = document
+
+    return documents
+
+async def bulk_update(collection, updates):
+    # (filter, update) pairs as one unordered bulk_write, then the same write-through as update_one in one pipeline
+    if not updates:
+        return None
+
+    result = await collection.bulk_write([UpdateOne(filter, update) for filter, update in updates], ordered=False)
+
+    # Read back instead of patching what was cached, that could undo an update_one that landed in between
+    cache_keys = {cache_key_for(collection, filter): filter for filter, _ in updates}
+    try:
+        documents = await current_documents(collection, list(cache_keys.values()))
+    except PyMongoError as e:
+        # The write went through, so callers must not retry it. Dropping the cached copies is enough
+        logger.error(f"Could not read back {len(cache_keys)} documents after a bulk write on {collection.name}: {e}")
+        documents = {}
+    payloads = {}
+
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for cache_key in cache_keys:
+            in_flight.pop(cache_key, None)
+
+            document = documents.get(cache_key)
+            payload = encode(document) if document else None
+            keys = [cache_key]
+
+            if payload:
+                payloads[cache_key] = payload
+                keys.append(tag_key_for(collection, document["_id"]))
+
+            if not payload or not local_cache.replace(cache_key, payload):
+                local_cache.delete(cache_key)
+
+            await invalidate_script(keys=keys, args=[payload or "", INVALIDATION_CHANNEL, PROCESS_ID], client=pipe)
+
+        for evicted in await pipe.execute():
+            evict_local(evicted)
+
+    for filter, update in updates:
+        notify_write(collection, filter, payloads.get(cache_key_for(collection, filter)), update)
+
+    return result
+
+async def invalidate(collection, filters):
+    # Drops the cached copies for filters in every process, for writes whose filter isn't the one reads use
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for filter in filters:
+            cache_key = cache_key_for(collection, filter)
+
+            in_flight.pop(cache_key, None)
+            local_cache.delete(cache_key)
+
+            await invalidate_script(keys=[cache_key], args=["", INVALIDATION_CHANNEL, PROCESS_ID], client=pipe)
+
+        await pipe.execute()
+
+async def insert_one(collection, document):
+    result = await collection.insert_one(document)
+
+    notify_write(collection, document, JSONEncoder().encode(document))
+
+    # Clear any missing entries the new document would now match
+    shapes = await redis_client.smembers(missing_shapes_key_for(collection))
+    cache_keys = []
+
+    for shape in shapes:
+        fields = json.loads(shape)
+
+        if all(field in document for field in fields):
+            cache_keys.append(cache_key_for(collection, {field: document[field] for field in fields}))
+
+    if cache_keys:
+        evict_local(cache_keys)
+
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.delete(*cache_keys)
+
+            for cache_key in cache_keys:
+                pipe.publish(INVALIDATION_CHANNEL, f"{PROCESS_ID} {cache_key}")
+
+            await pipe.execute()
+
+    return result
+
+async def find(collection, query, sort=None, limit=0):
+    cursor = collection.find(query)
+
+    if sort:
+        cursor = cursor.sort(sort)
+
+    if limit:
+        cursor = cursor.limit(limit)
+
+    return await cursor.to_list(length=limit or None)
+
+# The sync_ variants take a pymongo collection from DBClient.sync_db and are meant for executor threads
+def sync_load(collection, query, cache_key, ex):
     start_time = time.time() * 1000
 
-    cache_key = f"{collection.name}:{json.dumps(query, cls=JSONEncoder)}"
-    cached_result = redis_client.get(cache_key)
+    cached_result = sync_redis_client.get(cache_key)
 
     if cached_result:
+        local_cache.set(cache_key, cached_result, MISSING_TTL if cached_result == MISSING else ex)
+
         logger.info(f"Cache hit for query {cache_key} - took {time.time() * 1000 - start_time:.2f}ms")
+        return cached_result
+
+    result = collection.find_one(query)
+    payload = None
+
+    if result:
+        payload = JSONEncoder().encode(result)
+
+        local_cache.set(cache_key, payload, ex)
+
+        tag_key = tag_key_for(collection, result["_id"])
+
+        pipe = sync_redis_client.pipeline(transaction=False)
+        pipe.set(cache_key, payload, ex=ex)
+        pipe.sadd(tag_key, cache_key)
+        pipe.expire(tag_key, max(ex, TAG_TTL))
+        pipe.execute()
+
+    logger.info(f"Cache miss for query {cache_key} - took {time.time() * 1000 - start_time:.2f}ms")
+    return payload
+
+def sync_find_one(collection, query, ex=30):
+    cache_key = cache_key_for(collection, query)
+    cached_result = local_cache.get(cache_key)
+
+    if cached_result:
         return json.loads(cached_result)
-    else:
-        result = collection.find_one(query)
 
-        if result:
-            result = json.loads(JSONEncoder().encode(result))
-            redis_client.set(cache_key, json.dumps(result), ex=ex)
+    with sync_in_flight_lock:
+        fetch = sync_in_flight.get(cache_key)
+        leader = fetch is None
 
-        logger.info(f"Cache miss for query {cache_key} - took {time.time() * 1000 - start_time:.2f}ms")
-        return result
+        if leader:
+            fetch = concurrent.futures.Future()
+            sync_in_flight[cache_key] = fetch
+
+    if leader:
+        try:
+            fetch.set_result(sync_load(collection, query, cache_key, ex))
+        except Exception as e:
+            fetch.set_exception(e)
+        finally:
+            with sync_in_flight_lock:
+                if sync_in_flight.get(cache_key) is fetch:
+                    del sync_in_flight[cache_key]
+
+    payload = fetch.result()
+
+    return json.loads(payload) if payload else None
 
 def sync_update_one(collection, filter, update, upsert=False):
-    result = collection.update_one(filter, update, upsert=upsert)
+    result = collection.find_one_and_update(filter, update, upsert=upsert, return_document=ReturnDocument.AFTER)
+
+    cache_key = cache_key_for(collection, filter)
+
+    with sync_in_flight_lock:
+        sync_in_flight.pop(cache_key, None)
+
+    payload = encode(result) if result else None
+
+    if not payload or not local_cache.replace(cache_key, payload):
+        local_cache.delete(cache_key)
+
+    keys = [cache_key]
+
+    if result:
+        keys.append(tag_key_for(collection, result["_id"]))
+
+    evicted = sync_invalidate_script(keys=keys, args=[payload or "", INVALIDATION_CHANNEL, PROCESS_ID])
+    evict_local(evicted)
 
-    cache_key = f"{collection.name}:{json.dumps(filter, cls=JSONEncoder)}"
-    redis_client.delete(cache_key)
+    notify_write(collection, filter, payload, update)
 
     return result
@@ -0,0 +1,155 @@
+# This project is licensed under the terms of the GPL v3.0 license. Copyright 2024 Cyteon
+
+import asyncio
+import logging
+import time
+
+import discord
+
+from collections import deque
+
+logger = logging.getLogger("discord_bot")
+
+# Channels created at once during a restore, discord.py still waits out any 429 itself
+RESTORE_CONCURRENCY = 5
+# How long a deleted channel can still be restored
+DELETED_TTL = 600
+MAX_DELETED_PER_GUILD = 500
+
+# guild_id -> channel_id -> compact snapshot, built the first time a guild is looked at
+layouts = {}
+# guild_id -> (snapshot, when it was deleted), oldest first
+deleted = {}
+
+def snapshot(channel):
+    return {
+        "id": channel.id,
+        "type": channel.type.value,
+        "name": channel.name,
+        "position": channel.position,
+        "category_id": channel.category_id,
+        "topic": getattr(channel, "topic", None),
+        "nsfw": getattr(channel, "nsfw", False),
+        "slowmode_delay": getattr(channel, "slowmode_delay", 0),
+        "bitrate": getattr(channel, "bitrate", None),
+        "user_limit": getattr(channel, "user_limit", None),
+        # (target id, is role, allow, deny)
+        "overwrites": [
+            (target.id, isinstance(target, discord.Role), *(permissions.value for permissions in overwrite.pair()))
+            for target, overwrite in channel.overwrites.items()
+        ],
+    }
+
+def layout(guild):
+    channels = layouts.get(guild.id)
+
+    if channels is None:
+        channels = {channel.id: snapshot(channel) for channel in guild.channels}
+        layouts[guild.id] = channels
+
+    return channels
+
+def update(channel):
+    # Fed from channel create/update, only guilds that already have a layout need keeping up to date
+    channels = layouts.get(channel.guild.id)
+
+    if channels is not None:
+        channels[channel.id] = snapshot(channel)
+
+def mark_deleted(channel):
+    # The snapshot from before the delete, falling back to the object the event carries
+    stored = layout(channel.guild).pop(channel.id, None) or snapshot(channel)
+    now = time.monotonic()
+
+    guild_deleted = deleted.setdefault(channel.guild.id, deque(maxlen=MAX_DELETED_PER_GUILD))
+    guild_deleted.append((stored, now))
+
+    while guild_deleted and now - guild_deleted[0][1] > DELETED_TTL:
+        guild_deleted.popleft()
+
+def take_deleted(guild_id):
+    # Every recently deleted channel of the guild, each handed out once so overlapping restores don't duplicate
+    guild_deleted = deleted.pop(guild_id, ())
+    now = time.monotonic()
+
+    return [stored for stored, when in guild_deleted if now - when <= DELETED_TTL]
+
+def forget_guild(guild_id):
+    layouts.pop(guild_id, None)
+    deleted.pop(guild_id, None)
+
+def overwrites_for(guild, stored):
+    overwrites = {}
+
+    for target_id, is_role, allow, deny in stored["overwrites"]:
+        if is_role:
+            target = guild.get_role(target_id) or discord.Object(id=target_id, type=discord.Role)
+        else:
+            target = guild.get_member(target_id) or discord.Object(id=target_id, type=discord.Member)
+
+        overwrites[target] = discord.PermissionOverwrite.from_pair(discord.Permissions(allow), discord.Permissions(deny))
+
+    return overwrites
+
+async def create(guild, stored, category, reason):
+    kwargs = {"name": stored["name"], "overwrites": overwrites_for(guild, stored), "reason": reason}
+    channel_type = discord.ChannelType(stored["type"])
+
+    if channel_type == discord.ChannelType.category:
+        return await guild.create_category(**kwargs)
+
+    kwargs["category"] = category
+
+    if channel_type == discord.ChannelType.voice:
+        return await guild.create_voice_channel(bitrate=stored["bitrate"] or 64000, user_limit=stored["user_limit"] or 0, **kwargs)
+
+    if channel_type == discord.ChannelType.stage_voice:
+        return await guild.create_stage_channel(**kwargs)
+
+    if channel_type == discord.ChannelType.forum:
+        return await guild.create_forum(topic=stored["topic"], nsfw=stored["nsfw"], **kwargs)
+
+    return await guild.create_text_channel(
+        topic=stored["topic"], nsfw=stored["nsfw"], slowmode_delay=stored["slowmode_delay"] or 0, **kwargs
+    )
+
+async def restore(bot, guild, snapshots, reason):
+    # Recreates snapshots concurrently, categories first so the channels can go back into them, then puts
+    # every restored channel back in place with one bulk position update. Returns [(snapshot, channel or exception)]
+    semaphore = asyncio.Semaphore(RESTORE_CONCURRENCY)
+    restored = {}
+    results = []
+
+    async def restore_one(stored):
+        category_id = stored["category_id"]
+        category = restored.get(category_id) or (guild.get_channel(category_id) if category_id else None)
+
+        async with semaphore:
+            try:
+                channel = await create(guild, stored, category, reason)
+            except Exception as e:
+                results.append((stored, e))
+                return
+
+        restored[stored["id"]] = channel
+        results.append((stored, channel))
+        update(channel)
+
+    categories = [stored for stored in snapshots if stored["type"] == discord.ChannelType.category.value]
+    others = [stored for stored in snapshots if stored["type"] != discord.ChannelType.category.value]
+
+    await asyncio.gather(*(restore_one(stored) for stored in categories))
+    await asyncio.gather(*(restore_one(stored) for stored in others))
+
+    positions = [
+        {"id": restored[stored["id"]].id, "position": stored["position"]}
+        for stored in snapshots if stored["id"] in restored
+    ]
+
+    if positions:
+        try:
+            await bot.http.bulk_channel_update(guild.id, positions, reason=reason)
+        except discord.HTTPException as e:
+            logger.error(f"Failed to restore channel positions in guild {guild.id}: {e}")
+
+    return results
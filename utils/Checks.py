@@ -5,7 +5,7 @@ import os
 import sys
 import json
 
-from utils import DBClient, CONSTANTS, CachedDB
+from utils import DBClient, CONSTANTS, CachedDB, EventContext
 
 from discord.ext import commands
 from discord.ext.commands import Context
@@ -13,12 +13,7 @@ from discord.ext.commands import Context
 db = DBClient.db
 
 async def is_not_blacklisted(context: Context):
-    users_global = db["users_global"]
-    user = await CachedDB.find_one(users_global, {"id": context.author.id}, ex=120)
-
-    if user is None:
-        user = CONSTANTS.user_global_data_template(context.author.id)
-        users_global.insert_one(user)
+    user = await EventContext.for_message(context.message).global_user()
 
     if user["blacklisted"]:
         raise discord.ext.commands.CommandError("You are blacklisted from using the bot, reason: **" + (user["blacklist_reason"] if user["blacklist_reason"] else "Not Specified") + "**")
@@ -1,7 +1,12 @@
 # This project is licensed under the terms of the GPL v3.0 license. Copyright 2024 Cyteon
 
+import motor.motor_asyncio
 import pymongo
 import os
 
-client = pymongo.MongoClient(os.getenv("MONGODB_URL"))
+client = motor.motor_asyncio.AsyncIOMotorClient(os.getenv("MONGODB_URL"), maxPoolSize=50)
 db = client.potatobot
+
+# Only for code that already runs off the event loop (executor threads), never await-able handlers
+sync_client = pymongo.MongoClient(os.getenv("MONGODB_URL"))
+sync_db = sync_client.potatobot
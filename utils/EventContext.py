@@ -0,0 +1,79 @@
+# This project is licensed under the terms of the GPL v3.0 license. Copyright 2024 Cyteon
+
+import asyncio
+import copy
+
+from utils import CONSTANTS, CachedDB, DBClient
+from utils.LocalCache import LRUCache
+
+db = DBClient.db
+
+# Live contexts by event, only needs to outlast the listeners of one event
+contexts = LRUCache(max_size=5_000)
+CONTEXT_TTL = 10
+
+class EventContext:
+    # The documents every listener of one message/join/reaction needs, each fetched at most once for all of them
+    def __init__(self, guild_id, user_id):
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.loaded = {}
+
+    async def load(self, name, loader):
+        fetch = self.loaded.get(name)
+
+        if fetch is None:
+            fetch = asyncio.ensure_future(loader())
+            self.loaded[name] = fetch
+
+        # Listeners mutate what they get, so each one gets its own copy
+        return copy.deepcopy(await asyncio.shield(fetch))
+
+    async def guild(self):
+        # DMs and other guildless events get None, not a {"id": None} document
+        if self.guild_id is None:
+            return None
+
+        return await self.load("guild", lambda: CachedDB.find_or_create(
+            db["guilds"], {"id": self.guild_id}, CONSTANTS.guild_data_template(self.guild_id)
+        ))
+
+    async def user(self):
+        if self.guild_id is None:
+            return None
+
+        return await self.load("user", lambda: CachedDB.find_or_create(
+            db["users"], {"id": self.user_id, "guild_id": self.guild_id}, CONSTANTS.user_data_template(self.user_id, self.guild_id)
+        ))
+
+    async def global_user(self):
+        return await self.load("global_user", lambda: CachedDB.find_or_create(
+            db["users_global"], {"id": self.user_id}, CONSTANTS.user_global_data_template(self.user_id), ex=120
+        ))
+
+def for_event(key, guild_id, user_id):
+    context = contexts.get(key)
+
+    if context is None:
+        context = EventContext(guild_id, user_id)
+        contexts.set(key, context, CONTEXT_TTL)
+
+    return context
+
+def forget_guild(guild_id):
+    # Listeners that haven't started yet load the guild and its users again, for changes they must not miss
+    for key in contexts.keys():
+        context = contexts.get(key)
+
+        if context is not None and context.guild_id == guild_id:
+            contexts.delete(key)
+
+def for_message(message):
+    # Commands share it too, through context.message
+    return for_event(f"message:{message.id}", message.guild.id if message.guild else None, message.author.id)
+
+def for_member_join(member):
+    return for_event(f"join:{member.guild.id}:{member.id}", member.guild.id, member.id)
+
+def for_reaction(payload):
+    return for_event(f"reaction:{payload.message_id}:{payload.user_id}:{payload.emoji}", payload.guild_id, payload.user_id)
@@ -0,0 +1,129 @@
+# This project is licensed under the terms of the GPL v3.0 license. Copyright 2024 Cyteon
+
+import asyncio
+import logging
+
+from utils import CachedDB, DBClient
+
+logger = logging.getLogger("discord_bot")
+
+ANTI_DANGER_PERMS = 1 << 0
+ANTI_MASSBAN = 1 << 1
+ANTI_MASSKICK = 1 << 2
+ANTI_MASSDELETE = 1 << 3
+ANTI_MASSPING = 1 << 4
+ANTI_WEBHOOK_SPAM = 1 << 5
+ANTI_UNAUTHORIZED_BOT = 1 << 6
+STARBOARD = 1 << 7
+LOG_CHANNEL = 1 << 9
+LOCKDOWN = 1 << 10
+
+ANTINUKE_FLAGS = {
+    "anti_danger_perms": ANTI_DANGER_PERMS,
+    "anti_massban": ANTI_MASSBAN,
+    "anti_masskick": ANTI_MASSKICK,
+    "anti_massdelete": ANTI_MASSDELETE,
+    "anti_massping": ANTI_MASSPING,
+    "anti_webhook_spam": ANTI_WEBHOOK_SPAM,
+    "anti_unauthorized_bot": ANTI_UNAUTHORIZED_BOT,
+}
+
+# Only the fields from_guild_data looks at, for the startup bulk load
+PROJECTION = {"id": True, "security.antinuke": True, "starboard": True, "log_channel": True, "lockdown": True}
+
+# guild_id -> bitmap built from the guild document, a guild that isn't in here just hasn't been loaded yet
+features = {}
+# Guilds being loaded in the background after enabled() found them missing
+refreshing = set()
+
+def from_guild_data(data):
+    bitmap = 0
+
+    antinuke = data.get("security", {}).get("antinuke", {})
+
+    for field, flag in ANTINUKE_FLAGS.items():
+        if antinuke.get(field, False):
+            bitmap |= flag
+
+    starboard = data.get("starboard", {})
+
+    if starboard.get("enabled", True) and starboard.get("channel", 0):
+        bitmap |= STARBOARD
+
+    if data.get("log_channel", 0):
+        bitmap |= LOG_CHANNEL
+
+    if data.get("lockdown", False):
+        bitmap |= LOCKDOWN
+
+    return bitmap
+
+def update(guild_id, data):
+    features[guild_id] = from_guild_data(data)
+
+def enabled(guild_id, flags):
+    # True if any of flags is on, or if the guild isn't known yet and the caller has to look it up
+    if guild_id is None:
+        # DMs have no guild features
+        return False
+
+    bitmap = features.get(guild_id)
+
+    if bitmap is None:
+        if guild_id not in refreshing:
+            refreshing.add(guild_id)
+            asyncio.get_running_loop().create_task(refresh(guild_id))
+
+        return True
+
+    return bitmap & flags != 0
+
+def on_guild_write(filter, document, update):
+    guild_id = filter.get("id")
+
+    if guild_id is None:
+        return
+
+    if document is None:
+        # Nothing to rebuild from, the next event that needs it reloads it
+        features.pop(guild_id, None)
+    else:
+        update(guild_id, document)
+
+def on_guild_invalidated(filter):
+    # Another process wrote the guild, its document here may be stale, so it's reloaded on the next event
+    if filter is None:
+        features.clear()
+        return
+
+    guild_id = filter.get("id")
+
+    if guild_id is not None:
+        features.pop(guild_id, None)
+
+async def refresh(guild_id):
+    try:
+        data = await CachedDB.find_one(DBClient.db["guilds"], {"id": guild_id})
+
+        # A guild without a document has every feature off, remembered so it isn't looked up on every event.
+        # Creating the document only writes the defaults, later changes come through on_guild_write
+        update(guild_id, data or {})
+    except Exception as e:
+        logger.error(f"Failed to load feature flags for guild {guild_id}: {e}")
+    finally:
+        refreshing.discard(guild_id)
+
+async def load_all():
+    # Writes from other processes have to reach us from the start, not from the first cached read
+    CachedDB.ensure_invalidation_listener()
+
+    count = 0
+
+    async for data in DBClient.db["guilds"].find({}, PROJECTION):
+        update(data["id"], data)
+        count += 1
+
+    logger.info(f"Loaded feature flags for {count} guilds")
+
+CachedDB.on_write("guilds", on_guild_write)
+CachedDB.on_remote_invalidate("guilds", on_guild_invalidated)
@@ -0,0 +1,141 @@
+# This project is licensed under the terms of the GPL v3.0 license. Copyright 2024 Cyteon
+
+import logging
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger("discord_bot")
+
+# Indexes every hot query relies on, created at startup when missing.
+# The unique ones are what makes CachedDB.find_or_create safe across processes
+INDEXES = {
+    "users": [
+        IndexModel([("id", ASCENDING), ("guild_id", ASCENDING)], name="id_guild_id", unique=True),
+        IndexModel([("guild_id", ASCENDING), ("level", DESCENDING), ("xp", DESCENDING)], name="guild_id_level_xp"),
+        IndexModel([("guild_id", ASCENDING), ("wallet", DESCENDING)], name="guild_id_wallet"),
+    ],
+    "users_global": [
+        IndexModel([("id", ASCENDING)], name="id", unique=True),
+    ],
+    "guilds": [
+        IndexModel([("id", ASCENDING)], name="id", unique=True),
+    ],
+    "starboard": [
+        IndexModel([("message_id", ASCENDING)], name="message_id"),
+    ],
+    "reactionroles": [
+        IndexModel([("message_id", ASCENDING)], name="message_id"),
+    ],
+    "ai_convos": [
+        IndexModel([("id", ASCENDING), ("isChannel", ASCENDING)], name="id_isChannel"),
+        # Mongo drops conversations itself once expiresAt (a date) has passed
+        IndexModel([("expiresAt", ASCENDING)], name="expiresAt_ttl", expireAfterSeconds=0),
+    ],
+}
+
+# (collection, filter, sort) of the queries the bot runs all the time, checked with explain() after provisioning
+QUERY_SHAPES = [
+    ("users", {"id": 0, "guild_id": 0}, None),
+    # Leaderboard rebuilds, the boards themselves are served from redis
+    ("users", {"guild_id": 0}, None),
+    ("users", {"guild_id": 0, "$or": [{"whitelisted": True}, {"trusted": True}, {"jailed": True}]}, None),
+    ("users_global", {"id": 0}, None),
+    ("guilds", {"id": 0}, None),
+    ("starboard", {"message_id": 0}, None),
+    ("reactionroles", {"message_id": 0}, None),
+    ("ai_convos", {"isChannel": True, "id": 0}, None),
+]
+
+def plan_stages(plan):
+    yield plan.get("stage")
+
+    for child in plan.get("inputStages", []) + ([plan["inputStage"]] if "inputStage" in plan else []):
+        yield from plan_stages(child)
+
+async def migrate_ai_convos(db):
+    # expiresAt used to be a unix timestamp, which a TTL index ignores
+    result = await db["ai_convos"].update_many(
+        {"expiresAt": {"$type": ["double", "int", "long"]}},
+        [{"$set": {"expiresAt": {"$toDate": {"$multiply": ["$expiresAt", 1000]}}}}]
+    )
+
+    if result.modified_count:
+        logger.info(f"Converted expiresAt of {result.modified_count} AI conversations to dates")
+
+async def report_duplicates(collection, keys):
+    # True when documents share a value of keys, which keeps a unique index from being built
+    fields = [field for field, _ in keys]
+
+    duplicates = await collection.aggregate([
+        {"$group": {"_id": {field: f"${field}" for field in fields}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": 10},
+    ], allowDiskUse=True).to_list(None)
+
+    for duplicate in duplicates:
+        logger.error(f"{duplicate['count']} documents in {collection.name} share {duplicate['_id']}, remove the extras so the unique index can be built")
+
+    return bool(duplicates)
+
+async def create_missing_indexes(db):
+    for collection_name, indexes in INDEXES.items():
+        collection = db[collection_name]
+        existing = {tuple(info["key"]): info for info in (await collection.index_information()).values()}
+        missing = []
+
+        for index in indexes:
+            keys = tuple(index.document["key"].items())
+            info = existing.get(keys)
+
+            if info is None:
+                if index.document.get("unique") and await report_duplicates(collection, keys):
+                    continue
+
+                missing.append(index)
+            elif index.document.get("unique") and not info.get("unique"):
+                # Made unique after the fact, the old index goes once nothing stands in the new one's way
+                if await report_duplicates(collection, keys):
+                    continue
+
+                try:
+                    await collection.drop_index(list(keys))
+                except OperationFailure as e:
+                    logger.error(f"Failed to drop the non-unique {index.document['name']} index on {collection_name}: {e}")
+                    continue
+
+                missing.append(index)
+
+        if not missing:
+            continue
+
+        try:
+            created = await collection.create_indexes(missing)
+            logger.info(f"Created indexes on {collection_name}: {', '.join(created)}")
+        except OperationFailure as e:
+            logger.error(f"Failed to create indexes on {collection_name}: {e}")
+
+async def report_uncovered_queries(db):
+    for collection_name, filter, sort in QUERY_SHAPES:
+        cursor = db[collection_name].find(filter)
+
+        if sort:
+            cursor = cursor.sort(sort)
+
+        try:
+            explain = await cursor.explain()
+        except OperationFailure as e:
+            logger.error(f"Could not explain {collection_name} {filter}: {e}")
+            continue
+
+        winning_plan = explain["queryPlanner"]["winningPlan"]
+        # Newer servers wrap the plan when the slot based engine runs it
+        stages = set(plan_stages(winning_plan.get("queryPlan", winning_plan)))
+
+        if "COLLSCAN" in stages or "SORT" in stages:
+            logger.warning(f"Query on {collection_name} {list(filter)} sorted by {sort} is not covered by an index ({', '.join(sorted(s for s in stages if s))})")
+
+async def ensure_indexes(db):
+    await migrate_ai_convos(db)
+    await create_missing_indexes(db)
+    await report_uncovered_queries(db)
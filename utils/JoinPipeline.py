@@ -0,0 +1,104 @@
+# This project is licensed under the terms of the GPL v3.0 license. Copyright 2024 Cyteon
+
+import asyncio
+import logging
+import time
+
+import discord
+
+from utils import BulkOverwrites, SlidingWindow
+
+logger = logging.getLogger("discord_bot")
+
+JOIN_WINDOW = 10
+# Joins within JOIN_WINDOW seconds that put a guild in raid mode
+RAID_JOINS = 15
+# Raid mode ends once the guild has gone this long without a raid-level join rate
+RAID_COOLDOWN = 60
+# Default roles handed out at once when a deferred queue drains
+ROLE_CONCURRENCY = 5
+
+join_counter = SlidingWindow.SlidingWindowCounter(window=JOIN_WINDOW, buckets=10)
+# guild_id -> last time the join rate was at raid level
+raids = {}
+# guild_id -> (role_id, [member_id, ...]) waiting for the raid to end
+deferred = {}
+workers = {}
+
+def record_join(guild_id):
+    # Returns (in raid mode, raid mode just started)
+    now = time.monotonic()
+
+    if join_counter.add(guild_id) >= RAID_JOINS:
+        started = guild_id not in raids
+        raids[guild_id] = now
+
+        if started:
+            logger.warning(f"Guild {guild_id} entered raid mode")
+
+        return True, started
+
+    return raiding(guild_id, now), False
+
+def raiding(guild_id, now=None):
+    last = raids.get(guild_id)
+
+    if last is None:
+        return False
+
+    if (now or time.monotonic()) - last > RAID_COOLDOWN:
+        del raids[guild_id]
+        logger.info(f"Guild {guild_id} left raid mode")
+        return False
+
+    return True
+
+async def add_role(member, role, reason):
+    # Shares the process wide request budget with the overwrite jobs
+    await BulkOverwrites.budget.acquire()
+
+    try:
+        await member.add_roles(role, reason=reason)
+    except discord.HTTPException as e:
+        logger.error(f"Failed to give {member.id} the default role in guild {member.guild.id}: {e}")
+
+async def assign_default_role(member, role):
+    # Right away normally, queued until the raid is over in raid mode so raiders that get removed never cost a request
+    if not raiding(member.guild.id):
+        await add_role(member, role, "Default role")
+        return
+
+    _, queued = deferred.setdefault(member.guild.id, (role.id, []))
+    queued.append(member.id)
+
+    if member.guild.id not in workers:
+        workers[member.guild.id] = asyncio.get_running_loop().create_task(drain(member.guild))
+
+async def drain(guild):
+    try:
+        while raiding(guild.id):
+            await asyncio.sleep(RAID_COOLDOWN / 4)
+
+        role_id, queued = deferred.pop(guild.id, (0, []))
+        role = guild.get_role(role_id)
+
+        if role is None:
+            return
+
+        # Whoever left or was removed during the raid is skipped
+        members = [member for member in map(guild.get_member, dict.fromkeys(queued)) if member and role not in member.roles]
+        semaphore = asyncio.Semaphore(ROLE_CONCURRENCY)
+
+        async def assign(member):
+            async with semaphore:
+                await add_role(member, role, "Default role, deferred during a raid")
+
+        await asyncio.gather(*(assign(member) for member in members))
+
+        logger.info(f"Gave {len(members)} members the default role in guild {guild.id} after a raid")
+    finally:
+        workers.pop(guild.id, None)
+
+        # Queued by a raid that started while this one was draining
+        if guild.id in deferred:
+            workers[guild.id] = asyncio.get_running_loop().create_task(drain(guild))
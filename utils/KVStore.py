@@ -0,0 +1,107 @@
+# This project is licensed under the terms of the GPL v3.0 license. Copyright 2024 Cyteon
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger("discord_bot")
+
+# Every open store, so the bot can flush them all on a timer and on shutdown
+stores = []
+
+class KVStore:
+    # Drop-in for the pickledb stores: reads and writes hit memory, only changed keys go to disk on flush()
+    def __init__(self, path, legacy_path=None):
+        self.path = path
+        self.dirty = set()
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+        self.data = {key: json.loads(value) for key, value in self.connection.execute("SELECT key, value FROM kv")}
+
+        if not self.data and legacy_path and os.path.isfile(legacy_path):
+            self.import_legacy(legacy_path)
+
+        stores.append(self)
+
+    def import_legacy(self, legacy_path):
+        # pickledb files are plain JSON
+        try:
+            with open(legacy_path) as file:
+                self.data = json.load(file)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not import {legacy_path} into {self.path}: {e}")
+            return
+
+        self.dirty.update(self.data)
+        self.flush()
+
+        logger.info(f"Imported {len(self.data)} keys from {legacy_path} into {self.path}")
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def exists(self, key):
+        return key in self.data
+
+    def items(self):
+        return list(self.data.items())
+
+    def set(self, key, value):
+        # Also how callers mark a value they mutated in place as changed
+        with self.lock:
+            self.data[key] = value
+            self.dirty.add(key)
+
+    def incr(self, key, amount=1):
+        with self.lock:
+            self.data[key] = self.data.get(key, 0) + amount
+            self.dirty.add(key)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+            self.dirty.add(key)
+
+    def take_dirty(self):
+        # Serialised here, on the caller's thread, since callers mutate values in place between flushes
+        with self.lock:
+            dirty, self.dirty = self.dirty, set()
+
+            rows = [(key, json.dumps(self.data[key])) for key in dirty if key in self.data]
+            deleted = [(key,) for key in dirty if key not in self.data]
+
+        return rows, deleted
+
+    def write(self, rows, deleted):
+        with self.write_lock, self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", rows)
+            self.connection.executemany("DELETE FROM kv WHERE key = ?", deleted)
+
+    def flush(self):
+        self.write(*self.take_dirty())
+
+async def flush_all():
+    for store in stores:
+        rows, deleted = store.take_dirty()
+
+        if not rows and not deleted:
+            continue
+
+        try:
+            # Off the event loop, sqlite still fsyncs on checkpoints
+            await asyncio.to_thread(store.write, rows, deleted)
+        except Exception as e:
+            logger.error(f"Failed to flush {store.path}: {e}")
+
+            with store.lock:
+                store.dirty.update(key for key, _ in rows)
+                store.dirty.update(key for key, in deleted)
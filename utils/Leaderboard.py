@@ -0,0 +1,230 @@
+# This project is licensed under the terms of the GPL v3.0 license. Copyright 2024 Cyteon
+
+import asyncio
+import logging
+import uuid
+
+from redis.exceptions import RedisError
+
+from utils import CachedDB, DBClient
+
+logger = logging.getLogger("discord_bot")
+
+LEVELS = "levels"
+WALLET = "wallet"
+
+# (level, xp) ranks as one score, level * LEVEL_SCALE + xp, xp never gets near it
+LEVEL_SCALE = 10 ** 8
+# Boards are rebuilt from mongo at least this often, anything a write path missed is fixed then
+BOARD_TTL = 86400
+REBUILD_BATCH = 1000
+# A rebuild that died halfway stops collecting writes and holding the lock after this long
+REBUILD_TIMEOUT = 300
+REBUILD_POLL = 0.25
+
+# Only touches boards that have been built, a board made of just the users written since would rank wrong.
+# During a rebuild the user is noted instead, the rebuild may have read them before this write
+UPDATE_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 1 then
+    redis.call("ZADD", KEYS[1], ARGV[1], ARGV[2])
+end
+
+if redis.call("EXISTS", KEYS[2]) == 1 then
+    redis.call("SADD", KEYS[3], ARGV[2])
+    redis.call("EXPIRE", KEYS[3], ARGV[3])
+end
+"""
+
+update_script = CachedDB.redis_client.register_script(UPDATE_SCRIPT)
+
+rebuilding = {}
+# (guild_id, user_id) -> user document or None, written since the last flush
+pending = {}
+flush_task = None
+
+def board_key(guild_id, board):
+    return f"leaderboard:{guild_id}:{board}"
+
+def rebuild_keys(key):
+    # (marker that a rebuild is running, users written while it runs)
+    return f"{key}:rebuilding", f"{key}:dirty"
+
+def score(board, user):
+    if board == LEVELS:
+        return user.get("level", 0) * LEVEL_SCALE + user.get("xp", 0)
+
+    return user.get(WALLET, 0)
+
+def decode(board, value):
+    value = int(value)
+
+    if board == LEVELS:
+        return {"level": value // LEVEL_SCALE, "xp": value % LEVEL_SCALE}
+
+    return {WALLET: value}
+
+async def wait_for_rebuild(key, marker):
+    # Another process holds the rebuild, True once its board is there
+    while await CachedDB.redis_client.exists(marker):
+        await asyncio.sleep(REBUILD_POLL)
+
+    return bool(await CachedDB.redis_client.exists(key))
+
+async def rebuild(guild_id, board):
+    key = board_key(guild_id, board)
+    marker, dirty = rebuild_keys(key)
+
+    # The marker doubles as a lock, one process rebuilds a board while the others wait for it
+    if not await CachedDB.redis_client.set(marker, 1, nx=True, ex=REBUILD_TIMEOUT):
+        if await wait_for_rebuild(key, marker):
+            return
+
+        # The other rebuild died before finishing
+        if not await CachedDB.redis_client.set(marker, 1, nx=True, ex=REBUILD_TIMEOUT):
+            await wait_for_rebuild(key, marker)
+            return
+
+    building = f"{key}:building:{uuid.uuid4().hex}"
+    projection = {"id": True, "level": True, "xp": True} if board == LEVELS else {"id": True, WALLET: True}
+
+    await CachedDB.redis_client.delete(dirty)
+
+    batch = {}
+
+    async def write_batch():
+        await CachedDB.redis_client.zadd(building, batch)
+        batch.clear()
+
+    try:
+        async for user in DBClient.db["users"].find({"guild_id": guild_id}, projection):
+            batch[user["id"]] = score(board, user)
+
+            if len(batch) >= REBUILD_BATCH:
+                await write_batch()
+
+        if batch:
+            await write_batch()
+
+        async with CachedDB.redis_client.pipeline(transaction=True) as pipe:
+            # A guild without users still gets a board, so it isn't rebuilt on every lookup
+            pipe.zadd(building, {0: float("-inf")})
+            pipe.rename(building, key)
+            pipe.expire(key, BOARD_TTL)
+            # From here on writes go straight to the board
+            pipe.smembers(dirty)
+            pipe.delete(marker, dirty)
+            written = (await pipe.execute())[-2]
+    except BaseException:
+        await CachedDB.redis_client.delete(building, marker, dirty)
+        raise
+
+    if written:
+        # Re-read so users the cursor saw before they were written get their current score
+        user_ids = [int(user_id) for user_id in written]
+        users = DBClient.db["users"].find({"guild_id": guild_id, "id": {"$in": user_ids}}, projection)
+        scores = {user["id"]: score(board, user) async for user in users}
+
+        if scores:
+            await CachedDB.redis_client.zadd(key, scores)
+
+async def ensure_built(guild_id, board):
+    key = board_key(guild_id, board)
+
+    if await CachedDB.redis_client.exists(key):
+        return
+
+    build = rebuilding.get(key)
+
+    if build is None:
+        build = asyncio.ensure_future(rebuild(guild_id, board))
+        rebuilding[key] = build
+        build.add_done_callback(lambda _: rebuilding.pop(key, None))
+
+    await asyncio.shield(build)
+
+def entries(board, members):
+    # [(user_id, {"level", "xp"} or {"wallet"})] without the placeholder that keeps an empty board around
+    return [(int(user_id), decode(board, value)) for user_id, value in members if int(user_id) != 0]
+
+async def top(guild_id, board, count=10, offset=0):
+    await ensure_built(guild_id, board)
+
+    members = await CachedDB.redis_client.zrevrange(board_key(guild_id, board), offset, offset + count - 1, withscores=True)
+
+    return entries(board, members)
+
+async def rank(guild_id, board, user_id):
+    # 1 for the top user, None if they aren't on the board
+    await ensure_built(guild_id, board)
+
+    position = await CachedDB.redis_client.zrevrank(board_key(guild_id, board), user_id)
+
+    return None if position is None else position + 1
+
+async def around(guild_id, board, user_id, radius=5):
+    # (rank of the first entry, entries) for the users ranked just above and below user_id
+    position = await rank(guild_id, board, user_id)
+
+    if position is None:
+        return None, []
+
+    start = max(0, position - 1 - radius)
+
+    return start + 1, await top(guild_id, board, radius * 2 + 1, start)
+
+async def flush():
+    global flush_task, pending
+
+    # Lets the rest of a bulk update queue up first
+    await asyncio.sleep(0)
+
+    batch, pending = pending, {}
+    flush_task = None
+
+    missing = [key for key, user in batch.items() if user is None]
+
+    try:
+        if missing:
+            users = await CachedDB.find_many(
+                DBClient.db["users"], [{"id": user_id, "guild_id": guild_id} for guild_id, user_id in missing]
+            )
+
+            batch.update(zip(missing, users))
+
+        async with CachedDB.redis_client.pipeline(transaction=False) as pipe:
+            for (guild_id, user_id), user in batch.items():
+                if not user:
+                    continue
+
+                for board in (LEVELS, WALLET):
+                    key = board_key(guild_id, board)
+
+                    await update_script(
+                        keys=[key, *rebuild_keys(key)], args=[score(board, user), user_id, REBUILD_TIMEOUT], client=pipe
+                    )
+
+            await pipe.execute()
+    except RedisError as e:
+        logger.error(f"Failed to update leaderboards for {len(batch)} users: {e}")
+
+def on_user_write(filter, document, update):
+    global flush_task
+
+    guild_id = filter.get("guild_id")
+    user_id = filter.get("id")
+
+    if not isinstance(guild_id, int) or not isinstance(user_id, int):
+        return
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # A sync_ write from an executor thread, the next rebuild picks it up
+        return
+
+    pending[(guild_id, user_id)] = document
+
+    if flush_task is None:
+        flush_task = loop.create_task(flush())
+
+CachedDB.on_write("users", on_user_write)
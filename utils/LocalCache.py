@@ -0,0 +1,63 @@
+# This project is licensed under the terms of the GPL v3.0 license. Copyright 2024 Cyteon
+
+import threading
+import time
+
+from collections import OrderedDict
+
+class LRUCache:
+    def __init__(self, max_size=10_000):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        # CachedDB.sync_* touch the cache from executor threads
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def replace(self, key, value):
+        # Swap the value of a live entry without touching its expiry
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None or entry[1] < time.monotonic():
+                return False
+
+            self.entries[key] = (value, entry[1])
+            return True
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def keys(self):
+        with self.lock:
+            return list(self.entries)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,172 @@
+# This project is licensed under the terms of the GPL v3.0 license. Copyright 2024 Cyteon
+
+import functools
+import logging
+import os
+
+import better_profanity
+
+logger = logging.getLogger("discord_bot")
+
+MASS_MENTION = "mass_mention"
+BLACKLIST = "blacklist"
+FILTER = "filter"
+PROFANITY = "profanity"
+
+MASS_MENTIONS = ["@everyone", "@here"]
+FILTER_LIST = ["@everyone", "@here", "<@&", "discord.gg", "discord.com/invite", "ERROR_404_LOVE_FOUND"]
+WORD_BLACKLIST = ["Nigger", "Nigga"]
+
+# Look-alike characters folded the way better_profanity matches them, for the categories added with leet=True
+LEET = str.maketrans({"@": "a", "4": "a", "1": "i", "l": "i", "0": "o", "3": "e", "$": "s", "5": "s", "7": "t", "v": "u"})
+
+class Automaton:
+    # Aho-Corasick over one character stream
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        # node -> [(category, pattern length)] of every pattern ending there
+        self.output = [[]]
+
+    def add(self, pattern, category):
+        node = 0
+
+        for char in pattern:
+            next_node = self.goto[node].get(char)
+
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto[node][char] = next_node
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+
+            node = next_node
+
+        self.output[node].append((category, len(pattern)))
+
+    def build(self):
+        queue = list(self.goto[0].values())
+
+        for node in queue:
+            for char, child in self.goto[node].items():
+                fallback = self.fail[node]
+
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+                queue.append(child)
+
+    def step(self, node, char):
+        while node and char not in self.goto[node]:
+            node = self.fail[node]
+
+        return self.goto[node].get(char, 0)
+
+class Scanner:
+    def __init__(self):
+        self.plain = Automaton()
+        self.leet = Automaton()
+        self.whole_word = set()
+
+    def add(self, category, patterns, leet=False, whole_word=False):
+        automaton = self.leet if leet else self.plain
+
+        for pattern in patterns:
+            pattern = pattern.lower()
+            automaton.add(pattern.translate(LEET) if leet else pattern, category)
+
+        if whole_word:
+            self.whole_word.add(category)
+
+    def build(self):
+        self.plain.build()
+        self.leet.build()
+
+    def find(self, text):
+        # [(category, start, end)] of every match in text, case insensitive, in one pass over it
+        lowered = text.lower()
+
+        if len(lowered) != len(text):
+            # A few characters lowercase to more than one, positions have to line up with text
+            lowered = "".join(char.lower()[0] for char in text)
+
+        folded = lowered.translate(LEET)
+        matches = []
+        plain_node = leet_node = 0
+
+        for end, (char, folded_char) in enumerate(zip(lowered, folded), 1):
+            plain_node = self.plain.step(plain_node, char)
+            leet_node = self.leet.step(leet_node, folded_char)
+
+            for category, length in self.plain.output[plain_node]:
+                matches.append((category, end - length, end))
+
+            for category, length in self.leet.output[leet_node]:
+                matches.append((category, end - length, end))
+
+        if self.whole_word:
+            matches = [
+                (category, start, end) for category, start, end in matches
+                if category not in self.whole_word or (
+                    (start == 0 or not folded[start - 1].isalnum()) and (end == len(folded) or not folded[end].isalnum())
+                )
+            ]
+
+        return matches
+
+    def categories(self, text):
+        return {category for category, _, _ in self.find(text)}
+
+    @functools.lru_cache(maxsize=1024)
+    def cached_categories(self, text):
+        # For text several consumers scan, like a message every cog's on_message looks at, or a guild's system prompt
+        return frozenset(self.categories(text))
+
+def profanity_wordlist():
+    path = os.path.join(os.path.dirname(better_profanity.__file__), "profanity_wordlist.txt")
+
+    try:
+        with open(path) as file:
+            return [line.strip() for line in file if line.strip()]
+    except OSError as e:
+        logger.error(f"Could not load the profanity wordlist: {e}")
+        return []
+
+scanner = Scanner()
+scanner.add(MASS_MENTION, MASS_MENTIONS)
+scanner.add(FILTER, FILTER_LIST)
+scanner.add(BLACKLIST, WORD_BLACKLIST)
+scanner.add(PROFANITY, profanity_wordlist(), leet=True, whole_word=True)
+scanner.build()
+
+def find(text):
+    return scanner.find(text)
+
+def categories(text):
+    return scanner.categories(text)
+
+def cached_categories(text):
+    return scanner.cached_categories(text)
+
+def replace(text, spans, replacement):
+    # Replaces (start, end) spans from find(), overlapping ones are merged into the first
+    parts = []
+    position = 0
+
+    for start, end in sorted(spans):
+        if start < position:
+            start = position
+
+        if start >= end:
+            continue
+
+        parts.append(text[position:start])
+        parts.append(replacement)
+        position = end
+
+    parts.append(text[position:])
+
+    return "".join(parts)
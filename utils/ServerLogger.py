@@ -9,7 +9,7 @@ db = client.potatobot
 async def send_log(title: str, guild: discord.Guild, description: str, color: discord.Color, channel: discord.TextChannel) -> None:
     c = db["guilds"]
 
-    g = c.find_one({"id": guild.id})
+    g = await c.find_one({"id": guild.id})
 
     if not g:
         await channel.send("**Log channel not found! If you are an admin use `/setting log_channel #channel`**")
@@ -0,0 +1,81 @@
+# This project is licensed under the terms of the GPL v3.0 license. Copyright 2024 Cyteon
+
+import asyncio
+import logging
+import time
+
+from redis.exceptions import RedisError
+
+from utils import CachedDB, SlidingWindow
+
+logger = logging.getLogger("discord_bot")
+
+# Adds to the current slice of a hash of slice -> count, drops slices that left the window and
+# returns what is left, so every process sees the same rolling total
+ADD_SCRIPT = """
+redis.call("HINCRBY", KEYS[1], ARGV[1], ARGV[2])
+
+local oldest = tonumber(ARGV[1]) - tonumber(ARGV[3]) + 1
+local total = 0
+local counts = redis.call("HGETALL", KEYS[1])
+
+for i = 1, #counts, 2 do
+    if tonumber(counts[i]) < oldest then
+        redis.call("HDEL", KEYS[1], counts[i])
+    else
+        total = total + tonumber(counts[i + 1])
+    end
+end
+
+redis.call("EXPIRE", KEYS[1], ARGV[4])
+
+return total
+"""
+
+add_script = CachedDB.redis_client.register_script(ADD_SCRIPT)
+
+class SharedCounter:
+    # A SlidingWindowCounter mirrored in Redis, so counts survive cog reloads and add up across processes
+    def __init__(self, name, window=600, buckets=10):
+        self.name = name
+        self.window = window
+        self.buckets = buckets
+        self.bucket_width = window / buckets
+        self.local = SlidingWindow.SlidingWindowCounter(window=window, buckets=buckets)
+
+    def redis_key(self, key):
+        return f"counter:{self.name}:" + ":".join(str(part) for part in key)
+
+    async def add_remote(self, key, amount):
+        # Wall clock slices, monotonic time isn't shared between processes
+        slice = int(time.time() // self.bucket_width)
+
+        return await add_script(keys=[self.redis_key(key)], args=[slice, amount, self.buckets, int(self.window) + 1])
+
+    async def add_in_background(self, key, amount):
+        try:
+            await self.add_remote(key, amount)
+        except RedisError as e:
+            logger.error(f"Failed to add to counter {self.name}: {e}")
+
+    async def add(self, key, amount=1, threshold=None):
+        local = self.local.add(key, amount)
+
+        if threshold is not None and local > threshold:
+            # Over the limit on our own count already, other processes still need to see it
+            asyncio.get_running_loop().create_task(self.add_in_background(key, amount))
+            return local
+
+        try:
+            return max(local, await self.add_remote(key, amount))
+        except RedisError as e:
+            logger.error(f"Failed to add to counter {self.name}, using the local count: {e}")
+            return local
+
+    async def reset(self, key):
+        self.local.reset(key)
+
+        try:
+            await CachedDB.redis_client.delete(self.redis_key(key))
+        except RedisError as e:
+            logger.error(f"Failed to reset counter {self.name}: {e}")
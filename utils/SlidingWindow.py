@@ -0,0 +1,69 @@
+# This project is licensed under the terms of the GPL v3.0 license. Copyright 2024 Cyteon
+
+import time
+
+from collections import OrderedDict
+
+class SlidingWindowCounter:
+    # Counts per key over the last `window` seconds, in a ring of `buckets` time slices per key
+    def __init__(self, window=600, buckets=10, max_keys=100_000):
+        self.window = window
+        self.buckets = buckets
+        self.bucket_width = window / buckets
+        self.max_keys = max_keys
+        # key -> (counts, slice number each count belongs to), least recently touched first
+        self.entries = OrderedDict()
+
+    def current_slice(self):
+        return int(time.monotonic() // self.bucket_width)
+
+    def total(self, entry, now):
+        counts, slices = entry
+        return sum(count for count, slice in zip(counts, slices) if now - slice < self.buckets)
+
+    def add(self, key, amount=1):
+        now = self.current_slice()
+        entry = self.entries.get(key)
+
+        if entry is None:
+            entry = ([0] * self.buckets, [now] * self.buckets)
+            self.entries[key] = entry
+        else:
+            self.entries.move_to_end(key)
+
+        counts, slices = entry
+        index = now % self.buckets
+
+        if slices[index] != now:
+            counts[index] = 0
+            slices[index] = now
+
+        counts[index] += amount
+
+        self.expire(now)
+
+        return self.total(entry, now)
+
+    def count(self, key):
+        entry = self.entries.get(key)
+
+        if entry is None:
+            return 0
+
+        return self.total(entry, self.current_slice())
+
+    def reset(self, key):
+        self.entries.pop(key, None)
+
+    def expire(self, now):
+        # The oldest entries go once their newest slice has left the window, or when over max_keys
+        while self.entries:
+            key, (_, slices) = next(iter(self.entries.items()))
+
+            if len(self.entries) <= self.max_keys and now - max(slices) < self.buckets:
+                break
+
+            del self.entries[key]
+
+    def __len__(self):
+        return len(self.entries)
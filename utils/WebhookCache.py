@@ -0,0 +1,83 @@
+# This project is licensed under the terms of the GPL v3.0 license. Copyright 2024 Cyteon
+
+import asyncio
+import logging
+
+import discord
+
+from utils.LocalCache import LRUCache
+
+logger = logging.getLogger("discord_bot")
+
+WEBHOOK_TTL = 600
+# Also what application (interaction) webhooks and ones we may not fetch end up as, fetch_webhook can't see those either
+DELETED = object()
+DELETED_TTL = 3600
+
+# webhook_id -> discord.Webhook or DELETED
+webhooks = LRUCache(max_size=10_000)
+# channel_id -> ids of the webhooks cached for it, so a webhooks update can tell which ones are gone
+by_channel = {}
+in_flight = {}
+
+def store(webhook):
+    webhooks.set(webhook.id, webhook, WEBHOOK_TTL)
+    by_channel.setdefault(webhook.channel_id, set()).add(webhook.id)
+
+def mark_deleted(webhook_id):
+    webhooks.set(webhook_id, DELETED, DELETED_TTL)
+
+async def fetch(bot, webhook_id):
+    try:
+        webhook = await bot.fetch_webhook(webhook_id)
+    except (discord.NotFound, discord.Forbidden):
+        # Without manage_webhooks every fetch is a 403, asking again each message won't change that
+        mark_deleted(webhook_id)
+        return None
+
+    store(webhook)
+    return webhook
+
+async def get(bot, webhook_id):
+    # The webhook, or None if it no longer exists, only goes to the API the first time an id is seen
+    cached = webhooks.get(webhook_id)
+
+    if cached is DELETED:
+        return None
+
+    if cached is not None:
+        return cached
+
+    # A spamming webhook sends many messages before the first fetch returns
+    fetching = in_flight.get(webhook_id)
+
+    if fetching is None:
+        fetching = asyncio.ensure_future(fetch(bot, webhook_id))
+        in_flight[webhook_id] = fetching
+        fetching.add_done_callback(lambda _: in_flight.pop(webhook_id, None))
+
+    return await asyncio.shield(fetching)
+
+async def refresh_channel(channel):
+    # Fed from on_webhooks_update, which only says that something changed in the channel
+    try:
+        current = await channel.webhooks()
+    except discord.HTTPException as e:
+        # No manage_webhooks, drop what we have so the next message fetches it again
+        for webhook_id in by_channel.pop(channel.id, set()):
+            webhooks.delete(webhook_id)
+
+        logger.debug(f"Could not list webhooks of channel {channel.id}: {e}")
+        return
+
+    known = by_channel.pop(channel.id, set())
+
+    for webhook in current:
+        store(webhook)
+
+    for webhook_id in known - {webhook.id for webhook in current}:
+        mark_deleted(webhook_id)
+
+def forget_channel(channel_id):
+    for webhook_id in by_channel.pop(channel_id, set()):
+        mark_deleted(webhook_id)
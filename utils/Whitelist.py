@@ -0,0 +1,196 @@
+# This project is licensed under the terms of the GPL v3.0 license. Copyright 2024 Cyteon
+
+import asyncio
+import logging
+
+from utils import CachedDB, DBClient
+from utils.LocalCache import LRUCache
+
+logger = logging.getLogger("discord_bot")
+
+FLAGS = ("whitelisted", "trusted", "jailed")
+# Changes are pushed to every process, this only bounds how long a missed one can last
+INDEX_TTL = 600
+# Other processes tell us about flag changes here, with "{process id} {guild_id} {user_id}"
+CHANGES_CHANNEL = "whitelist:changed"
+
+# guild_id -> {"whitelisted": {user_id, ...}, "trusted": {user_id, ...}, "jailed": {user_id, ...}}
+index = LRUCache(max_size=10_000)
+loading = {}
+# guild_id -> {user_id: document or None} written while the guild was loading, applied once the load is done
+written_during_load = {}
+# Users whose flags changed without us getting their document, reloaded in the background
+refreshing = set()
+changes_listener = None
+
+def apply(members, user_id, document):
+    for flag in FLAGS:
+        if document and document.get(flag, False):
+            members[flag].add(user_id)
+        else:
+            members[flag].discard(user_id)
+
+async def read_users(guild_id, user_ids):
+    # Current flags of user_ids, users that no longer exist come back as None
+    documents = dict.fromkeys(user_ids)
+
+    cursor = DBClient.db["users"].find(
+        {"guild_id": guild_id, "id": {"$in": list(user_ids)}},
+        {"id": True, **{flag: True for flag in FLAGS}}
+    )
+
+    async for user in cursor:
+        documents[user["id"]] = user
+
+    return documents
+
+async def load(guild_id):
+    ensure_changes_listener()
+
+    members = {flag: set() for flag in FLAGS}
+    written = written_during_load[guild_id] = {}
+
+    try:
+        cursor = DBClient.db["users"].find(
+            {"guild_id": guild_id, "$or": [{flag: True} for flag in FLAGS]},
+            {"id": True, **{flag: True for flag in FLAGS}}
+        )
+
+        async for user in cursor:
+            apply(members, user["id"], user)
+
+        # The cursor may have read these users before they were written
+        while written:
+            batch = dict(written)
+            written.clear()
+
+            unknown = [user_id for user_id, document in batch.items() if document is None]
+
+            if unknown:
+                batch.update(await read_users(guild_id, unknown))
+
+            for user_id, document in batch.items():
+                apply(members, user_id, document)
+    finally:
+        written_during_load.pop(guild_id, None)
+
+    index.set(guild_id, members, INDEX_TTL)
+
+    return members
+
+async def members_of(guild_id):
+    members = index.get(guild_id)
+
+    if members is not None:
+        return members
+
+    fetch = loading.get(guild_id)
+
+    if fetch is None:
+        fetch = asyncio.ensure_future(load(guild_id))
+        loading[guild_id] = fetch
+        fetch.add_done_callback(lambda _: loading.pop(guild_id, None))
+
+    return await asyncio.shield(fetch)
+
+async def is_whitelisted(guild_id, user_id):
+    return user_id in (await members_of(guild_id))["whitelisted"]
+
+async def is_trusted(guild_id, user_id):
+    return user_id in (await members_of(guild_id))["trusted"]
+
+async def is_jailed(guild_id, user_id):
+    return user_id in (await members_of(guild_id))["jailed"]
+
+def changed(guild_id, user_id, document):
+    # document is the user as written, None when only mongo knows
+    if guild_id in written_during_load:
+        written_during_load[guild_id][user_id] = document
+        return
+
+    members = index.get(guild_id)
+
+    if members is None:
+        return
+
+    if document is not None:
+        apply(members, user_id, document)
+    elif (guild_id, user_id) not in refreshing:
+        refreshing.add((guild_id, user_id))
+        asyncio.get_running_loop().create_task(refresh(guild_id, user_id))
+
+async def refresh(guild_id, user_id):
+    try:
+        documents = await read_users(guild_id, [user_id])
+        changed(guild_id, user_id, documents[user_id])
+    except Exception as e:
+        # Dropped instead, the next check reloads the whole guild
+        index.delete(guild_id)
+        logger.error(f"Failed to reload whitelist flags of {user_id} in guild {guild_id}: {e}")
+    finally:
+        refreshing.discard((guild_id, user_id))
+
+def touches_flags(update):
+    # Inserts (update is None) always count, their document has every flag
+    if update is None:
+        return True
+
+    return any(
+        field.split(".", 1)[0] in FLAGS
+        for fields in update.values() if isinstance(fields, dict)
+        for field in fields
+    )
+
+def on_user_write(filter, document, update):
+    guild_id = filter.get("guild_id")
+    user_id = filter.get("id")
+
+    if not isinstance(guild_id, int) or not isinstance(user_id, int) or not touches_flags(update):
+        return
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # A sync_ write from an executor thread, the guild is reloaded on the next check instead
+        index.delete(guild_id)
+        return
+
+    changed(guild_id, user_id, document)
+
+    loop.create_task(publish(guild_id, user_id))
+
+async def publish(guild_id, user_id):
+    try:
+        await CachedDB.redis_client.publish(CHANGES_CHANNEL, f"{CachedDB.PROCESS_ID} {guild_id} {user_id}")
+    except Exception as e:
+        logger.error(f"Failed to announce whitelist change of {user_id} in guild {guild_id}: {e}")
+
+async def listen_for_changes():
+    while True:
+        try:
+            async with CachedDB.redis_client.pubsub() as pubsub:
+                await pubsub.subscribe(CHANGES_CHANNEL)
+
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+
+                    origin, guild_id, user_id = message["data"].decode().split(" ")
+
+                    if origin != CachedDB.PROCESS_ID:
+                        changed(int(guild_id), int(user_id), None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Anything could have changed while we were not listening
+            logger.error(f"Whitelist change listener failed, clearing loaded guilds: {e}")
+            index.clear()
+            await asyncio.sleep(1)
+
+def ensure_changes_listener():
+    global changes_listener
+
+    if changes_listener is None or changes_listener.done():
+        changes_listener = asyncio.get_running_loop().create_task(listen_for_changes())
+
+CachedDB.on_write("users", on_user_write)
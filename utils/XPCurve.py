@@ -0,0 +1,112 @@
+# This project is licensed under the terms of the GPL v3.0 license. Copyright 2024 Cyteon
+
+import bisect
+import itertools
+
+import numpy as np
+
+from utils import CONSTANTS, CachedDB, DBClient
+
+# How far a guild can stretch or shrink the default curve
+MIN_SCALE = 0.25
+MAX_SCALE = 4
+# Passes over users whose xp changed while their new level was being written
+RECOMPUTE_ATTEMPTS = 3
+
+class XPCurve:
+    # Users are stored as (level, xp into that level), the curve turns that into total xp and back
+    def __init__(self, requirements):
+        # requirements[level] = xp needed at level to reach level + 1
+        self.requirements = list(requirements)
+        self.max_level = len(self.requirements)
+        # cumulative[level] = total xp at the start of level
+        self.cumulative = [0, *itertools.accumulate(self.requirements)]
+        self.cumulative_array = np.array(self.cumulative, dtype=np.int64)
+
+    def needed(self, level):
+        # xp needed to leave level, None at the max level
+        return self.requirements[level] if level < self.max_level else None
+
+    def total(self, level, xp):
+        return self.cumulative[min(level, self.max_level)] + xp
+
+    def resolve(self, total):
+        level = min(bisect.bisect_right(self.cumulative, total) - 1, self.max_level)
+        return level, total - self.cumulative[level]
+
+    def add(self, level, xp, gained):
+        return self.resolve(self.total(level, xp) + gained)
+
+    def totals(self, levels, xps):
+        return self.cumulative_array[np.minimum(levels, self.max_level)] + xps
+
+    def resolve_many(self, totals):
+        levels = np.minimum(np.searchsorted(self.cumulative_array, totals, side="right") - 1, self.max_level)
+        return levels, totals - self.cumulative_array[levels]
+
+# Level n needs LEVELS_AND_XP[n + 1] xp, counted from 0 again after every level up
+DEFAULT_REQUIREMENTS = [CONSTANTS.LEVELS_AND_XP[level + 1] for level in range(CONSTANTS.MAX_LEVEL)]
+
+default = XPCurve(DEFAULT_REQUIREMENTS)
+curves = {1: default}
+
+def scaled(scale):
+    curve = curves.get(scale)
+
+    if curve is None:
+        curve = XPCurve(max(1, round(requirement * scale)) for requirement in DEFAULT_REQUIREMENTS)
+        curves[scale] = curve
+
+    return curve
+
+def for_guild(guild_data):
+    return scaled(guild_data.get("xp_curve_scale", 1) if guild_data else 1)
+
+async def recompute_guild(guild_id, old_curve, new_curve):
+    # Moves every user of the guild from old_curve to new_curve keeping their total xp, returns how many changed
+    users = [
+        user async for user in DBClient.db["users"].find({"guild_id": guild_id}, {"id": True, "level": True, "xp": True})
+    ]
+    changed = 0
+
+    for _ in range(RECOMPUTE_ATTEMPTS):
+        if not users:
+            break
+
+        levels = np.array([user.get("level", 0) for user in users], dtype=np.int64)
+        xps = np.array([user.get("xp", 0) for user in users], dtype=np.int64)
+
+        new_levels, new_xps = new_curve.resolve_many(old_curve.totals(levels, xps))
+        indexes = np.flatnonzero((new_levels != levels) | (new_xps != xps))
+
+        if not len(indexes):
+            break
+
+        # Only applies to users still at the level and xp this pass read, anyone written to since is read again
+        updates = [
+            (
+                {"id": users[index]["id"], "guild_id": guild_id, "level": int(levels[index]), "xp": int(xps[index])},
+                {"$set": {"level": int(new_levels[index]), "xp": int(new_xps[index])}}
+            )
+            for index in indexes
+        ]
+
+        result = await CachedDB.bulk_update(DBClient.db["users"], updates)
+        changed += result.matched_count
+
+        # Cached under {"id", "guild_id"}, which the conditional filters above don't hit
+        await CachedDB.invalidate(DBClient.db["users"], [{"id": filter["id"], "guild_id": guild_id} for filter, _ in updates])
+
+        if result.matched_count == len(updates):
+            break
+
+        expected = {filter["id"]: update["$set"] for filter, update in updates}
+
+        users = [
+            user async for user in DBClient.db["users"].find(
+                {"guild_id": guild_id, "id": {"$in": list(expected)}}, {"id": True, "level": True, "xp": True}
+            )
+            if (user.get("level", 0), user.get("xp", 0)) != (expected[user["id"]]["level"], expected[user["id"]]["xp"])
+        ]
+
+    return changed